@@ -0,0 +1,230 @@
+"""
+Daily analytics rollup (DailyMetrics) behind the admin dashboard.
+
+One row per closed local day holds that day's counts: registrations by role,
+appointments by status (by appointment date) and booked (by created_at), new
+medications, vitals, symptom logs and lab results. sync() recomputes a range
+of days with one grouped query per source table and writes only the rows that
+are missing or differ, so later edits to past rows (a completed appointment, a
+deleted user) are picked up by the next sync that covers their day. The
+rollup_daily_metrics command rechecks the last week by default and the whole
+history with --all: schedule the former hourly and the latter nightly, as
+nothing else notices an older day whose rows were deleted or moved. Rows are
+only ever written by sync(), never from a request.
+
+All-time totals (users by role, rows per source) and the appointments by
+status are exact: live_totals() reads them with one query of grouped COUNTs,
+as a sum of stored days would drift when old rows are deleted or change role
+or status. Per-day figures (trends, rolling, week and month windows) are
+sums over the stored days plus a live delta read through date/created_at
+indexes (live_counts, appointments_from): the rows after the last stored day
+(normally just today's, every row when the rollup is empty) and, for rolling
+windows such as "the last 7 days", the window's partial first day, as in
+medications.rollup. A past day edited after the last sync shows its old
+counts until the next sync covering it.
+"""
+from datetime import datetime, timedelta
+
+from django.db.models import Avg, Count, F, IntegerField, Max, Min, Q, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from appointments.models import Appointment
+from health.models import LabResult, SymptomLog, VitalReading
+from medications.models import Medication
+from medications.rollup import day_start
+
+from .models import DailyMetrics, User
+
+ROLE_FIELDS = {
+    'patient': 'new_patients', 'doctor': 'new_doctors', 'caregiver': 'new_caregivers', 'admin': 'new_admins',
+}
+STATUS_FIELDS = {
+    'scheduled': 'appointments_scheduled', 'in-progress': 'appointments_in_progress',
+    'cancelled': 'appointments_cancelled', 'completed': 'appointments_completed',
+}
+# Rollup columns counting the rows created on each day
+CREATED_SOURCES = (
+    (Appointment, 'appointments_booked'),
+    (Medication, 'new_medications'),
+    (VitalReading, 'vitals_recorded'),
+    (SymptomLog, 'symptoms_logged'),
+    (LabResult, 'labs_recorded'),
+)
+COUNT_FIELDS = (
+    'new_users', *ROLE_FIELDS.values(), 'appointments', *STATUS_FIELDS.values(),
+    *(column for _, column in CREATED_SOURCES),
+)
+
+
+def on_days(field, first, last) -> Q:
+    """Q for a datetime field falling on local dates first..last, as a plain (indexable) range."""
+    return Q(**{f'{field}__gte': day_start(first), f'{field}__lt': day_start(last + timedelta(days=1))})
+
+
+def compute(first, last) -> dict:
+    """``{date: {column: count}}`` for every date in first..last, read from the source tables."""
+    days = {first + timedelta(days=i): dict.fromkeys(COUNT_FIELDS, 0) for i in range((last - first).days + 1)}
+    users = (
+        User.objects.filter(on_days('date_joined', first, last)).annotate(day=TruncDate('date_joined'))
+        .values_list('day', 'role').annotate(n=Count('id')).order_by()
+    )
+    for day, role, n in users:
+        days[day]['new_users'] += n
+        if role in ROLE_FIELDS:
+            days[day][ROLE_FIELDS[role]] += n
+    appointments = (
+        Appointment.objects.filter(date__gte=first, date__lte=last)
+        .values_list('date', 'status').annotate(n=Count('id')).order_by()
+    )
+    for day, status, n in appointments:
+        days[day]['appointments'] += n
+        if status in STATUS_FIELDS:
+            days[day][STATUS_FIELDS[status]] += n
+    for model, column in CREATED_SOURCES:
+        rows = (
+            model.objects.filter(on_days('created_at', first, last)).annotate(day=TruncDate('created_at'))
+            .values_list('day').annotate(n=Count('id')).order_by()
+        )
+        for day, n in rows:
+            days[day][column] = n
+    return days
+
+
+def earliest_day():
+    """Local date of the oldest source row, or None without any."""
+    firsts = [
+        User.objects.aggregate(first=Min('date_joined'))['first'],
+        Appointment.objects.aggregate(first=Min('date'))['first'],
+        *(model.objects.aggregate(first=Min('created_at'))['first'] for model, _ in CREATED_SOURCES),
+    ]
+    days = [timezone.localdate(value) if isinstance(value, datetime) else value for value in firsts if value]
+    return min(days, default=None)
+
+
+def sync(first=None) -> int:
+    """
+    Recompute the days first..yesterday (default: the whole history; today
+    and later are never stored) and write the rows that are missing or
+    changed. Missing days before first are filled too, so the rollup always
+    runs without gaps from the oldest source row. Returns the rows written.
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    earliest = earliest_day()
+    if earliest is None or earliest > yesterday:
+        return 0
+    if first and first > earliest:
+        stored = DailyMetrics.objects.filter(date__gte=earliest, date__lt=first).count()
+        first = first if stored == (first - earliest).days else earliest
+    first = min(max(first or earliest, earliest), yesterday)
+    computed = compute(first, yesterday)
+    stored = {
+        row['date']: row for row in
+        DailyMetrics.objects.filter(date__gte=first, date__lte=yesterday).values('date', 'avg_compliance', *COUNT_FIELDS)
+    }
+    changed = [
+        DailyMetrics(date=day, **counts) for day, counts in computed.items()
+        if day not in stored or any(stored[day][column] != n for column, n in counts.items())
+    ]
+    DailyMetrics.objects.bulk_create(
+        changed, batch_size=500,
+        update_conflicts=True, unique_fields=['date'], update_fields=[*COUNT_FIELDS, 'computed_at'],
+    )
+    # Compliance is a point-in-time figure: snapshot it when the day that just closed is first rolled up
+    if stored.get(yesterday, {}).get('avg_compliance') is None:
+        DailyMetrics.objects.filter(date=yesterday).update(
+            avg_compliance=Medication.objects.aggregate(avg=Avg('compliance'))['avg'],
+        )
+    return len(changed)
+
+
+def last_rolled_up():
+    """The last stored day (or None), after which live_counts and appointments_from take over."""
+    return DailyMetrics.objects.aggregate(last=Max('date'))['last']
+
+
+def live_totals(appointments=Q()) -> dict:
+    """
+    Exact counts in one UNION ALL query: ``{column: count}`` of every user
+    (new_users and the role columns), every row of the CREATED_SOURCES and the
+    appointments matching the appointments filter ('appointments' and the
+    STATUS_FIELDS columns).
+    """
+    def grouped(queryset, source, key):
+        return (
+            queryset.order_by().values(source=Value(source), key=key)
+            .annotate(n=Count('id')).values_list('source', 'key', 'n')
+        )
+
+    queries = [
+        grouped(User.objects, 'users', F('role')),
+        grouped(Appointment.objects.filter(appointments), 'appointments', F('status')),
+        *(grouped(model.objects, column, Value('')) for model, column in CREATED_SOURCES),
+    ]
+    totals = dict.fromkeys(['new_users', *ROLE_FIELDS.values(), 'appointments', *STATUS_FIELDS.values(),
+                            *(column for _, column in CREATED_SOURCES)], 0)
+    for source, key, n in queries[0].union(*queries[1:], all=True):
+        if source == 'users':
+            targets = ['new_users'] + ([ROLE_FIELDS[key]] if key in ROLE_FIELDS else [])
+        elif source == 'appointments':
+            targets = ['appointments'] + ([STATUS_FIELDS[key]] if key in STATUS_FIELDS else [])
+        else:
+            targets = [source]
+        for column in targets:
+            totals[column] += n
+    return totals
+
+
+def live_counts(since, rolling):
+    """
+    Counts of the rows the rollup does not cover, for new_users, the role
+    columns and CREATED_SOURCES, in one UNION ALL query:
+
+    - ``{column: {date: count}}`` of rows created on since (a date, None for
+      every row) and later;
+    - ``{column: count}`` for the columns in rolling ({column: days}), of the
+      rows in the partial first day of the window [now - days, now).
+    """
+    now = timezone.now()
+    def counts(queryset, field, source, key, column):
+        fresh = Q(**{f'{field}__gte': day_start(since)}) if since else Q(**{f'{field}__isnull': False})
+        rows, partial = queryset.filter(fresh), Value(0, output_field=IntegerField())
+        if column in rolling:
+            start = now - timedelta(days=rolling[column])
+            in_partial_day = Q(**{f'{field}__gte': start,
+                                  f'{field}__lt': day_start(timezone.localdate(start) + timedelta(days=1))})
+            rows = queryset.filter(fresh | in_partial_day)
+            partial = Count('id', filter=in_partial_day)
+        return (
+            rows.order_by().values(source=Value(source), key=key, day=TruncDate(field))
+            .annotate(fresh=Count('id', filter=fresh) if column in rolling else Count('id'), partial=partial)
+            .values_list('source', 'key', 'day', 'fresh', 'partial')
+        )
+
+    queries = [counts(User.objects, 'date_joined', 'users', F('role'), 'new_users')] + [
+        counts(model.objects, 'created_at', column, Value(''), column) for model, column in CREATED_SOURCES
+    ]
+    columns = ['new_users', *ROLE_FIELDS.values(), *(column for _, column in CREATED_SOURCES)]
+    by_day, partials = {column: {} for column in columns}, dict.fromkeys(columns, 0)
+    for source, key, day, n_fresh, n_partial in queries[0].union(*queries[1:], all=True):
+        targets = [source]
+        if source == 'users':
+            targets = ['new_users'] + ([ROLE_FIELDS[key]] if key in ROLE_FIELDS else [])
+        for column in targets:
+            if n_fresh:
+                by_day[column][day] = by_day[column].get(day, 0) + n_fresh
+            partials[column] += n_partial
+    return by_day, partials
+
+
+def appointments_from(day) -> dict:
+    """
+    ``{column: {date: count}}`` of the appointments on day (None for all) and
+    later, for 'appointments' and the STATUS_FIELDS columns.
+    """
+    by_day = {column: {} for column in ['appointments', *STATUS_FIELDS.values()]}
+    rows = Appointment.objects.filter(date__gte=day) if day else Appointment.objects.all()
+    for date, status, n in rows.values_list('date', 'status').annotate(n=Count('id')).order_by():
+        for column in ['appointments'] + ([STATUS_FIELDS[status]] if status in STATUS_FIELDS else []):
+            by_day[column][date] = by_day[column].get(date, 0) + n
+    return by_day
@@ -0,0 +1,230 @@
+"""
+Geohash spatial index for proximity search.
+
+User.geohash holds the geohash of the user's latitude/longitude (kept in sync
+by User.save). A radius search picks the finest geohash precision whose cells
+are at least the radius wide, so the circle lies inside the 3x3 block of cells
+around the centre; each cell is an index range scan on (role, geohash). Exact
+haversine distances are then computed only for those candidates.
+
+Larger candidate sets are ranked with NumPy: (pk, lat, lon) arrays, one
+vectorised haversine pass and argpartition for top-k. Rows within a hair of a
+radius or top-k cut-off are re-checked with haversine_m, and the distances
+handed out are always haversine_m's, so results match the scalar path.
+"""
+import math
+from collections.abc import Sequence
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - proximity search falls back to the scalar path
+    np = None
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Sorts after every base32 character: prefix <= geohash < prefix + _PREFIX_END
+_PREFIX_END = '{'
+
+# k-nearest search starts at this radius and widens it until k caregivers are found
+KNN_START_RADIUS_M = 5000.0
+KNN_GROWTH = 4
+
+# Below this many candidates the scalar loop beats building arrays
+VECTORISE_MIN_ROWS = 64
+# Vectorised distances this close (meters) to a cut-off are re-checked with haversine_m
+_EXACT_MARGIN_M = 1e-3
+_ROW_DTYPE = [('pk', 'i8'), ('lat', 'f8'), ('lon', 'f8')]
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> float:
+    """Return distance in meters between two lat/lon points."""
+    rlat1, rlon1, rlat2, rlon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlon = rlon2 - rlon1
+    dlat = rlat2 - rlat1
+    a = math.sin(dlat / 2) ** 2 + math.cos(rlat1) * math.cos(rlat2) * math.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_M * 2 * math.asin(math.sqrt(a))
+
+
+def haversine_m_array(lat, lon, lats, lons):
+    """haversine_m from one point to arrays of points (NumPy)."""
+    rlat1, rlon1 = math.radians(lat), math.radians(lon)
+    rlat2, rlon2 = np.radians(lats), np.radians(lons)
+    dlon = rlon2 - rlon1
+    dlat = rlat2 - rlat1
+    a = np.sin(dlat / 2) ** 2 + math.cos(rlat1) * np.cos(rlat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arcsin(np.sqrt(a))
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION) -> str:
+    """Standard base32 geohash of a point."""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    value = bits = 0
+    even = True  # bits alternate longitude, latitude, ...
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            value = value * 2 + (lon >= mid)
+            lon_lo, lon_hi = (mid, lon_hi) if lon >= mid else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            value = value * 2 + (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value = bits = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision) -> tuple:
+    """(latitude, longitude) extent in degrees of a geohash cell at this precision."""
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision - lon_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(lat, lon, radius_m):
+    """
+    Geohash prefixes (the centre cell and its neighbours) whose union contains
+    every point within radius_m of (lat, lon), or None if the radius is too
+    large for a useful prefilter.
+    """
+    radius_lat = radius_m / METERS_PER_DEGREE
+    if abs(lat) + radius_lat >= 89.0:
+        return None
+    # Longitude degrees shrink with latitude; size cells for the circle's poleward edge
+    lon_scale = math.cos(math.radians(abs(lat) + radius_lat))
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lon = cell_size_degrees(precision)
+        if cell_lat >= radius_lat and cell_lon * lon_scale * METERS_PER_DEGREE >= radius_m:
+            break
+    else:
+        return None
+    cells = set()
+    for dlat in (-cell_lat, 0.0, cell_lat):
+        for dlon in (-cell_lon, 0.0, cell_lon):
+            neighbour_lon = (lon + dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(max(-90.0, min(90.0, lat + dlat)), neighbour_lon, precision))
+    return sorted(cells)
+
+
+def within_radius_filter(lat, lon, radius_m) -> Q:
+    """
+    Index-friendly prefilter for points within radius_m: geohash prefix ranges of
+    the covering cells plus a latitude/longitude bounding box. Matches a
+    superset of the circle; an empty Q (no filtering) for very large radii.
+    """
+    cells = covering_cells(lat, lon, radius_m)
+    if cells is None:
+        return Q()
+    prefilter = reduce(or_, (Q(geohash__gte=cell, geohash__lt=cell + _PREFIX_END) for cell in cells))
+    radius_lat = radius_m / METERS_PER_DEGREE
+    radius_lon = radius_m / (METERS_PER_DEGREE * math.cos(math.radians(abs(lat) + radius_lat)))
+    prefilter &= Q(latitude__gte=lat - radius_lat, latitude__lte=lat + radius_lat)
+    if -180.0 <= lon - radius_lon and lon + radius_lon <= 180.0:
+        prefilter &= Q(longitude__gte=lon - radius_lon, longitude__lte=lon + radius_lon)
+    return prefilter
+
+
+class RankedRows(Sequence):
+    """
+    Nearest-first ``(pk, distance_m)`` pairs over NumPy rows. Distances are
+    computed with haversine_m as items are read, so paginating a large result
+    only pays for the rows on the page.
+    """
+
+    def __init__(self, lat, lon, rows):
+        self.lat, self.lon, self.rows = lat, lon, rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        pk, row_lat, row_lon = self.rows[index].tolist()
+        return pk, haversine_m(self.lat, self.lon, row_lat, row_lon)
+
+
+def _rank_rows(rows, lat, lon, radius_m=None, k=None) -> list:
+    """Scalar ranking of (pk, lat, lon) rows: (pk, distance) within radius_m, nearest first."""
+    ranked = []
+    for pk, row_lat, row_lon in rows:
+        distance = haversine_m(lat, lon, row_lat, row_lon)
+        if radius_m is None or distance <= radius_m:
+            ranked.append((pk, distance))
+    ranked.sort(key=lambda row: (row[1], row[0]))
+    return ranked if k is None else ranked[:k]
+
+
+def _rank_rows_vectorised(rows, lat, lon, radius_m=None, k=None):
+    """_rank_rows with NumPy: one haversine pass, argpartition for top-k."""
+    table = np.array(rows, dtype=_ROW_DTYPE)
+    distances = haversine_m_array(lat, lon, table['lat'], table['lon'])
+    keep = np.ones(len(table), dtype=bool)
+    if radius_m is not None:
+        keep = distances <= radius_m + _EXACT_MARGIN_M
+    candidates = np.flatnonzero(keep)
+    if k is not None and k < len(candidates):
+        top = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        cut = distances[top].max()
+        # The k nearest plus anything tied with the k-th within the margin, ranked exactly
+        return _rank_rows(table[keep & (distances <= cut + _EXACT_MARGIN_M)].tolist(), lat, lon, radius_m, k)
+    if radius_m is not None:
+        for i in candidates[distances[candidates] > radius_m - _EXACT_MARGIN_M]:
+            keep[i] = haversine_m(lat, lon, table['lat'][i], table['lon'][i]) <= radius_m
+        candidates = np.flatnonzero(keep)
+    order = candidates[np.lexsort((table['pk'][candidates], distances[candidates]))]
+    return RankedRows(lat, lon, table[order])
+
+
+def _ranked(queryset, lat, lon, radius_m=None, k=None, moved=None):
+    """
+    (pk, distance) of queryset rows within radius_m (all located rows if None),
+    nearest first, at most k. Rows in moved ({pk: (lat, lon)}, all in queryset)
+    are ranked at those positions instead of their stored ones.
+    """
+    if radius_m is not None:
+        queryset = queryset.filter(within_radius_filter(lat, lon, radius_m))
+    rows = list(queryset.values_list('pk', 'latitude', 'longitude'))
+    if moved:
+        rows = [row for row in rows if row[0] not in moved]
+        rows.extend((pk, *position) for pk, position in moved.items())
+    if np is None or len(rows) < VECTORISE_MIN_ROWS:
+        return _rank_rows(rows, lat, lon, radius_m, k)
+    return _rank_rows_vectorised(rows, lat, lon, radius_m, k)
+
+
+def nearest(queryset, lat, lon, max_distance=None, k=None, moved=None):
+    """
+    ``[(pk, distance_m), ...]`` for located rows of queryset, nearest first.
+
+    With max_distance, only rows within that many meters. With k, only the k
+    nearest: the search radius starts at KNN_START_RADIUS_M and grows until it
+    holds k rows (every row outside the radius is farther than those inside).
+    Without either, every located row is ranked.
+
+    moved maps pks to newer (lat, lon) positions than the stored ones (the
+    location write-behind buffer); those rows are ranked where they are now.
+    """
+    if moved:
+        moved = {pk: moved[pk] for pk in queryset.filter(pk__in=list(moved)).values_list('pk', flat=True)}
+    queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+    if k is None:
+        return _ranked(queryset, lat, lon, max_distance, moved=moved)
+    radius = KNN_START_RADIUS_M
+    while True:
+        if (max_distance is not None and radius >= max_distance) or covering_cells(lat, lon, radius) is None:
+            return _ranked(queryset, lat, lon, max_distance, k, moved)
+        ranked = _ranked(queryset, lat, lon, radius, k, moved)
+        if len(ranked) >= k:
+            return ranked
+        radius *= KNN_GROWTH
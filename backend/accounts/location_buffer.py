@@ -0,0 +1,155 @@
+"""
+Write-behind buffer for high-frequency location updates.
+
+With settings.LOCATION_WRITE_BEHIND, PATCH /api/accounts/me/location/ does not
+save the user. It stores the fix in the LOCATION_BUFFER_CACHE cache (Redis in
+deployment when AZURE_REDIS_CONNECTIONSTRING is set, locmem otherwise), one
+key per user, so only the latest fix is kept. Every update also takes a slot
+number from an atomic counter (cache.incr) and records the ping under it,
+flagged with whether it belongs in the location history (caregivers only).
+flush() reads the slots written since the previous flush, persists their
+users' latest fixes in one bulk UPDATE per batch and appends the flagged pings
+to the location history (accounts.location_history) with bulk_create.
+
+Flushing happens at most once per LOCATION_BUFFER_FLUSH_SECONDS, from the
+request that finds the interval elapsed, and from the flush_location_buffer
+command (schedule it, or run it with --loop). The locmem fallback is per
+process, so there only the inline flush applies.
+
+Readers see unflushed fixes through pending(); caregiver proximity search
+ranks users at their buffered positions.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, CharField, DateTimeField, FloatField, Value, When
+from django.utils import timezone
+
+from .geo import encode_geohash
+from .location_history import build_ping
+from .models import LocationPing, User
+
+SEQ_KEY = 'location-buffer:seq'
+CURSOR_KEY = 'location-buffer:flushed'
+GAP_KEY = 'location-buffer:gap'
+FLUSH_LOCK_KEY = 'location-buffer:flush-lock'
+FLUSHING_KEY = 'location-buffer:flushing'
+# A crashed flush holds FLUSHING_KEY at most this long
+FLUSHING_TIMEOUT = 300
+# Fixes and slots nobody flushes expire after a day
+ENTRY_TIMEOUT = 24 * 3600
+
+
+def enabled() -> bool:
+    return getattr(settings, 'LOCATION_WRITE_BEHIND', False)
+
+
+def _cache():
+    return caches[getattr(settings, 'LOCATION_BUFFER_CACHE', 'default')]
+
+
+def _fix_key(user_id):
+    return f'location-buffer:fix:{user_id}'
+
+
+def _slot_key(seq):
+    return f'location-buffer:slot:{seq}'
+
+
+def push(user_id, latitude, longitude, at=None, track=False):
+    """
+    Buffer a location fix for user_id, replacing any unflushed one; flushes
+    when the interval is due. With track, the flush also appends the fix to
+    the user's location history.
+    """
+    cache = _cache()
+    fix = (latitude, longitude, at or timezone.now())
+    cache.set(_fix_key(user_id), fix, ENTRY_TIMEOUT)
+    cache.add(SEQ_KEY, 0, timeout=None)
+    cache.set(_slot_key(cache.incr(SEQ_KEY)), (user_id, *fix, track), ENTRY_TIMEOUT)
+    interval = getattr(settings, 'LOCATION_BUFFER_FLUSH_SECONDS', 5)
+    # add() succeeds for one caller per interval, across workers sharing the cache
+    if interval and cache.add(FLUSH_LOCK_KEY, 1, timeout=interval):
+        flush()
+
+
+def _dirty(cache):
+    """
+    ({seq: (user_id, latitude, longitude, recorded_at, track)} of the unflushed slots,
+    slot a flush may advance to, first missing slot or None).
+
+    A slot missing from the range was taken but not written yet; a flush stops
+    before it. If the same slot is still missing on the next flush it was lost
+    (evicted) and is skipped.
+    """
+    state = cache.get_many([SEQ_KEY, CURSOR_KEY, GAP_KEY])
+    cursor, head = state.get(CURSOR_KEY, 0), state.get(SEQ_KEY, 0)
+    if head < cursor:  # the counter was evicted and restarted
+        cursor = 0
+    seqs = range(cursor + 1, head + 1)
+    found = cache.get_many([_slot_key(seq) for seq in seqs])
+    slots, gap = {}, None
+    for seq in seqs:
+        ping = found.get(_slot_key(seq))
+        if ping is not None:
+            slots[seq] = ping
+        elif gap is None and seq != state.get(GAP_KEY):
+            gap = seq
+        if gap is None:
+            cursor = seq
+    return slots, cursor, gap
+
+
+def _fixes(cache, slots) -> dict:
+    user_ids = {ping[0] for ping in slots.values()}
+    found = cache.get_many([_fix_key(user_id) for user_id in user_ids])
+    return {user_id: found[_fix_key(user_id)] for user_id in user_ids if _fix_key(user_id) in found}
+
+
+def pending() -> dict:
+    """Unflushed fixes, ``{user_id: (latitude, longitude, updated_at)}``."""
+    cache = _cache()
+    slots, _, _ = _dirty(cache)
+    return _fixes(cache, slots)
+
+
+def _case(batch, column, field):
+    return Case(*[When(pk=pk, then=Value(row[column])) for pk, row in batch], output_field=field)
+
+
+def _write(fixes, batch_size):
+    rows = sorted((pk, (lat, lon, at, encode_geohash(lat, lon))) for pk, (lat, lon, at) in fixes.items())
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        User.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            latitude=_case(batch, 0, FloatField()),
+            longitude=_case(batch, 1, FloatField()),
+            location_updated_at=_case(batch, 2, DateTimeField()),
+            geohash=_case(batch, 3, CharField()),
+        )
+
+
+def flush(batch_size=500) -> int:
+    """
+    Persist the buffered fixes (bulk UPDATE, User.save is not called) and
+    their pings' history; returns how many users were updated. Returns 0
+    without flushing while another flush runs.
+    """
+    cache = _cache()
+    if not cache.add(FLUSHING_KEY, 1, timeout=FLUSHING_TIMEOUT):
+        return 0
+    try:
+        start = cache.get(CURSOR_KEY, 0)
+        slots, cursor, gap = _dirty(cache)
+        fixes = _fixes(cache, slots)
+        # Slots past a gap are flushed again later: their fixes are idempotent, their pings wait
+        pings = [build_ping(*ping[:4]) for seq, ping in sorted(slots.items()) if seq <= cursor and ping[4]]
+        with transaction.atomic():
+            if fixes:
+                _write(fixes, batch_size)
+            LocationPing.objects.bulk_create(pings, batch_size=batch_size)
+        cache.set_many({CURSOR_KEY: cursor, GAP_KEY: gap}, timeout=None)
+        cache.delete_many([_slot_key(seq) for seq in range(start + 1, cursor + 1)])
+    finally:
+        cache.delete(FLUSHING_KEY)
+    return len(fixes)
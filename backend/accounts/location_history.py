@@ -0,0 +1,72 @@
+"""
+Caregiver location history (LocationPing).
+
+MeLocationView appends a ping per caregiver update (other roles' fixes only
+move the user): directly, or with the write-behind buffer
+(accounts.location_buffer) in batches when the buffer is flushed. Each
+ping carries its UTC day, so prune() drops whole days through the day index
+and retention stays cheap as the table grows. track() reads one user's pings
+over a time range, downsampled in the database to one row per day and
+resolution window, so months of one-minute pings come back as a bounded number
+of points without loading the pings themselves.
+"""
+import math
+from datetime import timezone as dt_timezone
+
+from django.db.models import Count, F, IntegerField, Value, Window
+from django.db.models.functions import Cast, ExtractHour, ExtractMinute, ExtractSecond, RowNumber
+
+from .models import LocationPing
+
+# Most points a track may hold; a finer resolution is coarsened to fit
+MAX_TRACK_POINTS = 2000
+
+
+def build_ping(user_id, latitude, longitude, recorded_at) -> LocationPing:
+    """Unsaved ping with its day bucket set (bulk_create skips save())."""
+    return LocationPing(
+        user_id=user_id, recorded_at=recorded_at, day=LocationPing.bucket(recorded_at),
+        latitude=latitude, longitude=longitude,
+    )
+
+
+def min_resolution(start, end) -> int:
+    """Smallest resolution (seconds) that keeps a track over [start, end) within MAX_TRACK_POINTS."""
+    # Windows restart at each UTC midnight, so every day spanned may add one partial window
+    days = (LocationPing.bucket(end) - LocationPing.bucket(start)).days + 1
+    return max(1, math.ceil((end - start).total_seconds() / max(1, MAX_TRACK_POINTS - days)))
+
+
+def track(user_id, start, end, resolution) -> list:
+    """
+    Pings of user_id with start <= recorded_at < end, downsampled in SQL to
+    the first ping of each `resolution`-second window of its UTC day (windows
+    start at midnight; a resolution of a day or more gives one point per
+    day). Each point is a dict of recorded_at, latitude, longitude and
+    samples (pings in its window).
+    """
+    def part(extract):
+        return extract('recorded_at', tzinfo=dt_timezone.utc)
+
+    second_of_day = Cast(part(ExtractHour) * 3600 + part(ExtractMinute) * 60 + part(ExtractSecond), IntegerField())
+    window = [F('day'), F('window')]
+    rows = (
+        LocationPing.objects.filter(user_id=user_id, recorded_at__gte=start, recorded_at__lt=end)
+        .annotate(window=second_of_day / Value(resolution))
+        .annotate(
+            rank=Window(RowNumber(), partition_by=window, order_by=F('recorded_at').asc()),
+            samples=Window(Count('id'), partition_by=window),
+        )
+        .filter(rank=1)
+        .order_by('recorded_at')
+        .values('recorded_at', 'latitude', 'longitude', 'samples')
+    )
+    return list(rows)
+
+
+def prune(before) -> int:
+    """Delete the day buckets before `before` (a date), one DELETE per day; returns the rows deleted."""
+    days = list(
+        LocationPing.objects.filter(day__lt=before).order_by('day').values_list('day', flat=True).distinct()
+    )
+    return sum(LocationPing.objects.filter(day=day).delete()[0] for day in days)
@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from accounts.synthetic import SyntheticSeeder
+from telemed.benchmarks import BENCHMARKS, compare, pick_actors, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot API endpoints in-process against a seed_synthetic data set: p50/p95 latency and '
+        'query counts. --output writes a JSON baseline, --compare flags regressions against one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='synthetic', help='seed_synthetic prefix of the data set (default: synthetic)')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per endpoint (default: 30)')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint first (default: 2)')
+        parser.add_argument('--only', action='append', choices=[b.name for b in BENCHMARKS],
+                            help='Run only this benchmark (repeatable)')
+        parser.add_argument('--output', help='Write the report (a baseline) to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to compare against; exits non-zero on regressions')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Latency growth (fraction) that counts as a regression (default: 0.25)')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Ignore latency changes smaller than this (default: 2.0)')
+        parser.add_argument('--fresh', action='store_true',
+                            help='Seed a throwaway test database instead of using the configured one')
+        parser.add_argument('--patients', type=int, default=2000, help='Patients to seed with --fresh (default: 2000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for --fresh (default: 42)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options.get('compare'):
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        benchmarks = [b for b in BENCHMARKS if not options.get('only') or b.name in options['only']]
+
+        setup_test_environment()
+        old_databases = None
+        try:
+            if options['fresh']:
+                old_databases = setup_databases(verbosity=0, interactive=False)
+                patients = options['patients']
+                SyntheticSeeder(prefix=options['prefix'], seed=options['seed'], log=self.stdout.write).run(
+                    patients=patients, doctors=max(1, patients // 40), caregivers=max(1, patients // 7),
+                )
+            try:
+                actors = pick_actors(options['prefix'])
+                report = run_benchmarks(actors, benchmarks, options['iterations'], options['warmup'])
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        finally:
+            if old_databases is not None:
+                teardown_databases(old_databases, verbosity=0)
+            teardown_test_environment()
+
+        regressions = []
+        if baseline is not None:
+            regressions = compare(baseline, report, options['threshold'], options['min_delta_ms'])
+        self._print(report, baseline, regressions)
+        if options.get('output'):
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+
+    def _print(self, report, baseline, regressions):
+        self.stdout.write(f"{report['database']}, {report['iterations']} iterations, dataset {report['dataset']}")
+        flagged = {(r['endpoint'], r['metric']) for r in regressions}
+        before = (baseline or {}).get('endpoints', {})
+        for name, row in report['endpoints'].items():
+            line = f"{name:<22} p50 {row['p50_ms']:>9.2f}ms  p95 {row['p95_ms']:>9.2f}ms  " \
+                   f"queries {row['queries']:>4} ({row['duplicate_queries']} dup)"
+            if name in before:
+                old = before[name]
+                line += f"  | baseline p50 {old['p50_ms']:.2f}ms p95 {old['p95_ms']:.2f}ms queries {old['queries']}"
+            marks = [metric for (endpoint, metric) in flagged if endpoint == name]
+            if marks:
+                self.stdout.write(self.style.ERROR(f"{line}  REGRESSED: {', '.join(sorted(marks))}"))
+            else:
+                self.stdout.write(line)
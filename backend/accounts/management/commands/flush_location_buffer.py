@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from accounts import location_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        'Persist buffered location updates (LOCATION_WRITE_BEHIND) in bulk. Run it periodically, '
+        'or keep it running with --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep flushing every --interval seconds')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between flushes with --loop (default: 5)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users per bulk UPDATE (default: 500)')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = location_buffer.flush(batch_size=options['batch_size'])
+            if flushed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Flushed locations for {flushed} users.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.location_history import prune
+
+
+class Command(BaseCommand):
+    help = 'Drop location history older than the retention period, one day bucket at a time. Run daily.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days of history to keep (default: settings.LOCATION_HISTORY_DAYS)')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.LOCATION_HISTORY_DAYS
+        cutoff = timezone.now().date() - timedelta(days=days)
+        deleted = prune(cutoff)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} location pings recorded before {cutoff}.'))
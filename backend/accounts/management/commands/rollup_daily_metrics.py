@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.analytics import sync
+
+
+# Days rechecked for changes by default, so an hourly run stays bounded; a
+# nightly --all run catches deletions and edits of rows on older days
+RECHECK_DAYS = 7
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the admin dashboard daily rollup (DailyMetrics) for the days that are missing or changed. '
+        'Run after migrating, then hourly, and nightly with --all.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=RECHECK_DAYS,
+                            help='Recheck the last N days for changes; missing days are always filled '
+                                 f'(default: {RECHECK_DAYS})')
+        parser.add_argument('--all', action='store_true',
+                            help='Recheck the whole history for deleted or edited rows on older days '
+                                 '(schedule nightly)')
+
+    def handle(self, *args, **options):
+        first = None
+        if not options['all']:
+            first = timezone.localdate() - timedelta(days=options['days'])
+        written = sync(first)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily metrics rows.'))
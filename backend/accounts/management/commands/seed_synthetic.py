@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.synthetic import DEFAULT_VOLUMES, SyntheticSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic population (users, appointments, vitals, medications and logs, care notes, '
+        'care requests, timesheets, payouts) for load testing. Never run against production.'
+    )
+
+    def add_arguments(self, parser):
+        d = DEFAULT_VOLUMES
+        parser.add_argument('--admins', type=int, help=f"Number of admins (default: {d['admins']})")
+        parser.add_argument('--doctors', type=int, help=f"Number of doctors (default: {d['doctors']})")
+        parser.add_argument('--patients', type=int, help=f"Number of patients (default: {d['patients']})")
+        parser.add_argument('--caregivers', type=int, help=f"Number of caregivers (default: {d['caregivers']})")
+        parser.add_argument('--appointments', type=float, help=f"Mean appointments per patient (default: {d['appointments']})")
+        parser.add_argument('--vitals-years', type=float, help=f"Longest vitals history in years (default: {d['vitals_years']})")
+        parser.add_argument('--vitals-per-month', type=float, help=f"Mean vitals readings per patient per month (default: {d['vitals_per_month']})")
+        parser.add_argument('--medications', type=float, help=f"Mean medications per patient (default: {d['medications']})")
+        parser.add_argument('--history-days', type=int, help=f"Medication courses start within this many days (default: {d['history_days']})")
+        parser.add_argument('--notes', type=float, help=f"Mean care notes per patient (default: {d['notes']})")
+        parser.add_argument('--comments', type=float, help=f"Mean comments per care note (default: {d['comments']})")
+        parser.add_argument('--care-requests', type=float, help=f"Mean care requests per patient (default: {d['care_requests']})")
+        parser.add_argument('--timesheets', type=float, help=f"Mean timesheet entries per caregiver (default: {d['timesheets']})")
+        parser.add_argument('--payouts', type=float, help=f"Mean payouts per caregiver (default: {d['payouts']})")
+        parser.add_argument('--prefix', default='synthetic', help='Username prefix marking this data set (default: synthetic)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk_create (default: 5000)')
+        parser.add_argument('--password', default='Pass12345!', help='Password for every generated user')
+        parser.add_argument('--flush', action='store_true', help='Delete an existing data set with this prefix first')
+
+    def handle(self, *args, **options):
+        seeder = SyntheticSeeder(
+            prefix=options['prefix'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            password=options['password'],
+            log=self.stdout.write,
+        )
+        if seeder.exists():
+            if not options['flush']:
+                raise CommandError(f"Synthetic users with prefix '{options['prefix']}' exist; pass --flush to replace them.")
+            self.stdout.write(f'Flushed {seeder.flush()} rows.')
+
+        counts = seeder.run(**{key: options.get(key) for key in DEFAULT_VOLUMES})
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(counts.values())} rows: ' + ', '.join(f'{n} {name}' for name, n in counts.items())
+        ))
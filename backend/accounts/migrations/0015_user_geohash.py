@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-17 05:36
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    """Index the coordinates users already have (historical models skip User.save)."""
+    from accounts.geo import encode_geohash
+    User = apps.get_model('accounts', 'User')
+    located = User.objects.filter(latitude__isnull=False, longitude__isnull=False).only('latitude', 'longitude')
+    batch = []
+    for user in located.iterator(chunk_size=1000):
+        user.geohash = encode_geohash(user.latitude, user.longitude)
+        batch.append(user)
+        if len(batch) >= 1000:
+            User.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    User.objects.bulk_update(batch, ['geohash'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_user_is_verified'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'geohash'], name='accounts_us_role_56dba5_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-17 06:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_user_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationPing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField()),
+                ('day', models.DateField(editable=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_pings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'recorded_at'], name='accounts_lo_user_id_155eeb_idx'), models.Index(fields=['day'], name='accounts_lo_day_1a6226_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.7 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_locationping'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_users', models.IntegerField(default=0)),
+                ('new_patients', models.IntegerField(default=0)),
+                ('new_doctors', models.IntegerField(default=0)),
+                ('new_caregivers', models.IntegerField(default=0)),
+                ('new_admins', models.IntegerField(default=0)),
+                ('appointments', models.IntegerField(default=0)),
+                ('appointments_scheduled', models.IntegerField(default=0)),
+                ('appointments_in_progress', models.IntegerField(default=0)),
+                ('appointments_cancelled', models.IntegerField(default=0)),
+                ('appointments_completed', models.IntegerField(default=0)),
+                ('appointments_booked', models.IntegerField(default=0)),
+                ('new_medications', models.IntegerField(default=0)),
+                ('vitals_recorded', models.IntegerField(default=0)),
+                ('symptoms_logged', models.IntegerField(default=0)),
+                ('labs_recorded', models.IntegerField(default=0)),
+                ('avg_compliance', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined'], name='accounts_us_date_jo_ff39bb_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+
+def backfill_search_name(apps, schema_editor):
+    """Fill the search column for existing users (historical models skip User.save)."""
+    from accounts.search import search_name
+    User = apps.get_model('accounts', 'User')
+    batch = []
+    for user in User.objects.only('first_name', 'last_name', 'email').iterator(chunk_size=1000):
+        user.search_name = search_name(user.first_name, user.last_name, user.email)
+        batch.append(user)
+        if len(batch) >= 1000:
+            User.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    User.objects.bulk_update(batch, ['search_name'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_dailymetrics_user_accounts_us_date_jo_ff39bb_idx'),
+    ]
+
+    # The FTS5 table / trigram index is created after migrate by accounts.search.ensure_index
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=600),
+        ),
+        migrations.RunPython(backfill_search_name, migrations.RunPython.noop),
+    ]
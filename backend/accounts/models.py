@@ -1,7 +1,17 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
+import datetime
 import uuid
+from .geo import encode_geohash
+from .search import search_name
+
+# Denormalised User columns recomputed in save(), keyed by the fields they derive from
+DERIVED_FIELDS = {
+    'latitude': 'geohash', 'longitude': 'geohash',
+    'first_name': 'search_name', 'last_name': 'search_name', 'email': 'search_name',
+}
+
 
 class User(AbstractUser):
     """
@@ -31,6 +41,8 @@ class User(AbstractUser):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     location_updated_at = models.DateTimeField(null=True, blank=True)
+    # Geohash of latitude/longitude (see accounts.geo); maintained by save()
+    geohash = models.CharField(max_length=12, blank=True, default="", editable=False)
     
     # Doctor assignment for patients
     doctor = models.ForeignKey(
@@ -49,12 +61,38 @@ class User(AbstractUser):
     bio = models.TextField(blank=True, default="")
     is_verified = models.BooleanField(default=False)
 
+    # Normalized name and email for people search (see accounts.search); maintained by save()
+    search_name = models.CharField(max_length=600, blank=True, default="", editable=False)
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Proximity search: geohash prefix ranges per role
+            models.Index(fields=['role', 'geohash']),
+            # Live registration counts on the admin dashboard (accounts.analytics)
+            models.Index(fields=['date_joined']),
+        ]
+
     def __str__(self):
         return f"{self.email} ({self.role})"
 
+    def save(self, *args, **kwargs):
+        # Keep the spatial index in step with the coordinates
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ""
+        # ... and the search column with the name and email
+        self.search_name = search_name(self.first_name, self.last_name, self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {
+                *update_fields, *(DERIVED_FIELDS[field] for field in update_fields if field in DERIVED_FIELDS),
+            }
+        super().save(*args, **kwargs)
+
 
 class EmailVerificationToken(models.Model):
     """
@@ -116,3 +154,70 @@ class VerificationDocument(models.Model):
 
     def __str__(self):
         return f"VerificationDocument(user={self.user_id}, uploaded_at={self.uploaded_at})"
+
+
+class LocationPing(models.Model):
+    """
+    Append-only location history (visit verification, travel tracks).
+    Rows are bucketed by UTC day: old buckets are dropped a day at a time
+    through the day index (see accounts.location_history), and tracks are read
+    through (user, recorded_at).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='location_pings')
+    recorded_at = models.DateTimeField()
+    day = models.DateField(editable=False)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recorded_at']),
+            models.Index(fields=['day']),
+        ]
+
+    @staticmethod
+    def bucket(recorded_at):
+        """Day bucket of a timestamp."""
+        return recorded_at.astimezone(datetime.timezone.utc).date()
+
+    def save(self, *args, **kwargs):
+        self.day = self.bucket(self.recorded_at)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"LocationPing(user={self.user_id}, {self.recorded_at}: {self.latitude}, {self.longitude})"
+
+
+class DailyMetrics(models.Model):
+    """
+    Per-day analytics rollup behind the admin dashboard (see accounts.analytics).
+    Counts are keyed by the day of the source row: registrations by date_joined,
+    appointments by their date (per status) and by created_at (booked),
+    medications, vitals, symptoms and labs by created_at. avg_compliance is
+    the medication compliance average when the day was first rolled up after
+    it closed (null for backfilled days).
+    """
+    date = models.DateField(unique=True)
+    new_users = models.IntegerField(default=0)
+    new_patients = models.IntegerField(default=0)
+    new_doctors = models.IntegerField(default=0)
+    new_caregivers = models.IntegerField(default=0)
+    new_admins = models.IntegerField(default=0)
+    appointments = models.IntegerField(default=0)
+    appointments_scheduled = models.IntegerField(default=0)
+    appointments_in_progress = models.IntegerField(default=0)
+    appointments_cancelled = models.IntegerField(default=0)
+    appointments_completed = models.IntegerField(default=0)
+    appointments_booked = models.IntegerField(default=0)
+    new_medications = models.IntegerField(default=0)
+    vitals_recorded = models.IntegerField(default=0)
+    symptoms_logged = models.IntegerField(default=0)
+    labs_recorded = models.IntegerField(default=0)
+    avg_compliance = models.FloatField(null=True, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"DailyMetrics({self.date})"
@@ -0,0 +1,167 @@
+"""
+Indexed people search over first name, last name and email.
+
+User.search_name holds the searched text, normalized by normalize(): accents
+stripped, lowercased, and split into words on anything that is not a letter
+or digit ("Zoë O'Neil", "zoe.oneil@example.com" -> "zoe o neil zoe oneil
+example com"). User.save keeps it in sync. A query is normalized the same way
+and every query word must be the start of a word of the name (prefix
+autocomplete: "jo do" finds "John Doe").
+
+The lookup runs through an index, never a scan of accounts_user:
+
+- SQLite: an FTS5 shadow table (accounts_user_search) over search_name, kept
+  in step by triggers, queried with prefix terms.
+- PostgreSQL: a pg_trgm GIN index on search_name, which serves the LIKE
+  patterns of the word-prefix match.
+
+ensure_index() creates either one and runs after every migrate (see
+AccountsConfig.ready), so it is restored if a migration rebuilds the table.
+Without the index (FTS5 or pg_trgm unavailable, other backends) the same
+matches are found with a scan.
+
+Results are ranked by match quality: names starting with the query, then
+names with a word starting with the query, then the other matches; ties by
+trigram similarity on PostgreSQL, then alphabetically.
+"""
+import logging
+import re
+import unicodedata
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'accounts_user_search'
+TRIGRAM_INDEX = 'accounts_user_search_name_trgm'
+# Query words beyond this are ignored
+MAX_TERMS = 6
+
+_WORD_SEPARATOR = re.compile(r'[\W_]+')
+# Per database alias: whether ensure_index found the index in place
+_indexed = {}
+
+_SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON accounts_user BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, search_name) VALUES (new.id, new.search_name);
+        END""",
+    f'{FTS_TABLE}_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON accounts_user BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_name) VALUES ('delete', old.id, old.search_name);
+        END""",
+    f'{FTS_TABLE}_update': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF search_name ON accounts_user BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_name) VALUES ('delete', old.id, old.search_name);
+            INSERT INTO {FTS_TABLE}(rowid, search_name) VALUES (new.id, new.search_name);
+        END""",
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accent-free words of text separated by single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return ' '.join(_WORD_SEPARATOR.split(stripped)).strip()
+
+
+def search_name(first_name, last_name, email) -> str:
+    """User.search_name for these fields."""
+    return normalize(f'{first_name} {last_name} {email}')
+
+
+def _sqlite_has_index(cursor):
+    names = {f'{FTS_TABLE}', *_SQLITE_TRIGGERS}
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name IN (%s)" % ', '.join(['%s'] * len(names)), list(names),
+    )
+    return cursor.fetchone()[0] == len(names)
+
+
+def _ensure_sqlite(cursor):
+    if _sqlite_has_index(cursor):
+        return
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"search_name, content='accounts_user', content_rowid='id', prefix='1 2 3')"
+    )
+    for sql in _SQLITE_TRIGGERS.values():
+        cursor.execute(sql)
+    # Rows written while a trigger was missing (e.g. a migration that rebuilt accounts_user)
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _ensure_postgresql(cursor):
+    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    cursor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON accounts_user USING gin (search_name gin_trgm_ops)'
+    )
+
+
+def ensure_index(using='default', **kwargs):
+    """Create the search index of the using database if it is missing (post_migrate receiver)."""
+    connection = connections[using]
+    create = {'sqlite': _ensure_sqlite, 'postgresql': _ensure_postgresql}.get(connection.vendor)
+    _indexed.pop(using, None)
+    if create is None or 'accounts_user' not in connection.introspection.table_names():
+        return
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            create(cursor)
+    except DatabaseError as exc:
+        logger.warning('People search index unavailable on %s, searching by scan: %s', using, exc)
+
+
+def _has_index(using):
+    if using not in _indexed:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                _indexed[using] = _sqlite_has_index(cursor)
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [TRIGRAM_INDEX])
+                _indexed[using] = cursor.fetchone() is not None
+            else:
+                _indexed[using] = False
+    return _indexed[using]
+
+
+def _word_prefix(text) -> Q:
+    """search_name has a word starting with text."""
+    return Q(search_name__startswith=text) | Q(search_name__contains=f' {text}')
+
+
+def matching(queryset, query):
+    """
+    Users of queryset matching query, best matches first (see the module
+    docstring). An empty query matches nothing.
+    """
+    terms = normalize(query).split()[:MAX_TERMS]
+    if not terms:
+        return queryset.none()
+    phrase = ' '.join(terms)
+    using = queryset.db
+    vendor = connections[using].vendor
+    if vendor == 'sqlite' and _has_index(using):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        queryset = queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]),
+        )
+    else:
+        # On PostgreSQL these LIKE patterns are served by the trigram index
+        for term in terms:
+            queryset = queryset.filter(_word_prefix(term))
+    queryset = queryset.annotate(search_rank=Case(
+        When(search_name__startswith=phrase, then=Value(0)),
+        When(search_name__contains=f' {phrase}', then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    ))
+    order = ['search_rank', 'search_name', 'id']
+    if vendor == 'postgresql' and _has_index(using):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        queryset = queryset.annotate(search_similarity=TrigramWordSimilarity(phrase, 'search_name'))
+        order.insert(1, '-search_similarity')
+    return queryset.order_by(*order)
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from .models import EmailVerificationToken, PasswordResetToken, VerificationDocument
+from .usernames import create_with_username
 
 User = get_user_model()
 
@@ -72,9 +73,19 @@ class UserSerializer(serializers.ModelSerializer):
             return 'Recently Active'
         return 'Contact for availability'
 
+    def _latest_document(self, obj):
+        """
+        Most recently uploaded verification document, from the list views'
+        prefetch (with_user_relations) or looked up once per object otherwise.
+        """
+        docs = getattr(obj, 'latest_verification_documents', None)
+        if docs is None:
+            docs = obj.latest_verification_documents = list(obj.verification_documents.order_by('-uploaded_at')[:1])
+        return docs[0] if docs else None
+
     def get_latest_verification_document_url(self, obj):
         """Return the URL of the most recently uploaded verification document."""
-        doc = obj.verification_documents.order_by('-uploaded_at').first()
+        doc = self._latest_document(obj)
         if not doc or not getattr(doc, 'file', None):
             return None
         try:
@@ -88,10 +99,19 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_latest_verification_document_uploaded_at(self, obj):
         """Return the timestamp of the most recently uploaded verification document."""
-        doc = obj.verification_documents.order_by('-uploaded_at').first()
+        doc = self._latest_document(obj)
         return doc.uploaded_at if doc else None
 
 
+class UserSearchResultSerializer(serializers.ModelSerializer):
+    """
+    Compact user row for typeahead people search results.
+    """
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'role', 'first_name', 'last_name']
+
+
 class VerificationDocumentSerializer(serializers.ModelSerializer):
     """
     Serializer for VerificationDocument model.
@@ -157,22 +177,19 @@ class RegisterSerializer(serializers.ModelSerializer):
         last_name = validated_data.pop('last_name', '')
         phone = validated_data.pop('phone', '')
         
-        # Generate unique username if not provided
-        if 'username' not in validated_data:
-            email = validated_data.get('email')
-            base_username = email.split('@')[0]
-            username = base_username
-            counter = 1
-            while User.objects.filter(username=username).exists():
-                username = f"{base_username}{counter}"
-                counter += 1
-            validated_data['username'] = username
-
         user = User(**validated_data)
         user.set_password(password)
         user.first_name = first_name
         user.last_name = last_name
         user.phone = phone
+
+        # Generate unique username if not provided
+        if 'username' not in validated_data:
+            def save_as(username):
+                user.username = username
+                user.save()
+                return user
+            return create_with_username(user.email, save_as)
         user.save()
         return user
 
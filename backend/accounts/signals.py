@@ -0,0 +1,118 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from appointments.models import Appointment
+from requestsapp.models import CareRequest
+from .models import User
+from .stats_cache import DASHBOARD_STATS, TODAY_APPOINTMENTS
+
+# User columns the dashboard counters depend on
+DASHBOARD_USER_FIELDS = {'role', 'doctor'}
+
+
+def _doctor_of(appointment):
+    """Doctor assigned to the appointment's patient (the doctor whose dashboard counts it)."""
+    if Appointment.patient.is_cached(appointment):
+        return appointment.patient.doctor_id
+    return User.objects.filter(pk=appointment.patient_id).values_list('doctor_id', flat=True).first()
+
+
+def _dashboard_key(doctor_id):
+    return f'doctor:{doctor_id}' if doctor_id else None
+
+
+def _is_today(day):
+    # date, or an ISO string when assigned directly
+    return day is not None and str(day) == timezone.localdate().isoformat()
+
+
+def _today_keys(patient_id, doctor_id):
+    """TODAY_APPOINTMENTS keys listing appointments of this patient with this doctor."""
+    caregivers = CareRequest.objects.filter(
+        patient_id=patient_id, caregiver__isnull=False, status__in=CareRequest.ACTIVE_STATUSES,
+    ).values_list('caregiver_id', flat=True)
+    return ['all', f'patient:{patient_id}', f'doctor:{doctor_id}', *(f'caregiver:{pk}' for pk in caregivers)]
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_previous_appointment(sender, instance, raw=False, **kwargs):
+    """Keep who the edited appointment was listed for, in case its patient, doctor or date changes."""
+    if raw or instance._state.adding:
+        return
+    instance._previous = (
+        Appointment.objects.filter(pk=instance.pk)
+        .values_list('patient__doctor_id', 'patient_id', 'doctor_id', 'date').first()
+    )
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_on_appointment_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    DASHBOARD_STATS.invalidate(
+        'all',
+        _dashboard_key(_doctor_of(instance)),
+        _dashboard_key(previous[0] if previous else None),
+    )
+    # Only lists of today's appointments are cached: the (patient, doctor) it is or was listed for today
+    listed = set()
+    if _is_today(instance.date):
+        listed.add((instance.patient_id, instance.doctor_id))
+    if previous and _is_today(previous[3]):
+        listed.add(previous[1:3])
+    TODAY_APPOINTMENTS.invalidate(*(key for pair in listed for key in _today_keys(*pair)))
+    instance._previous = None
+
+
+@receiver(pre_save, sender=CareRequest)
+def remember_previous_caregiver(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_caregiver_id = (
+        CareRequest.objects.filter(pk=instance.pk).values_list('caregiver_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=CareRequest)
+@receiver(post_delete, sender=CareRequest)
+def invalidate_on_care_request_change(sender, instance, raw=False, **kwargs):
+    """A caregiver's day lists the appointments of the patients they actively care for."""
+    if raw:
+        return
+    caregivers = {instance.caregiver_id, getattr(instance, '_previous_caregiver_id', None)} - {None}
+    TODAY_APPOINTMENTS.invalidate(*(f'caregiver:{pk}' for pk in caregivers))
+    instance._previous_caregiver_id = None
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_assignment(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the stored role and doctor of an edited user, so a reassigned patient's old doctor is invalidated."""
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not DASHBOARD_USER_FIELDS.intersection(update_fields):
+        return
+    instance._previous_assignment = User.objects.filter(pk=instance.pk).values_list('role', 'doctor_id').first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_dashboard_on_assignment_change(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_assignment', None)
+    if created:
+        changed = instance.role == 'patient'
+    else:
+        changed = previous is not None and previous != (instance.role, instance.doctor_id)
+    if changed:
+        DASHBOARD_STATS.invalidate(
+            'all', _dashboard_key(instance.doctor_id), _dashboard_key(previous[1] if previous else None),
+        )
+    instance._previous_assignment = None
+
+
+@receiver(post_delete, sender=User)
+def invalidate_dashboard_on_patient_delete(sender, instance, **kwargs):
+    if instance.role == 'patient':
+        DASHBOARD_STATS.invalidate('all', _dashboard_key(instance.doctor_id))
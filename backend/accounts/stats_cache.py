@@ -0,0 +1,114 @@
+"""
+Cache for dashboard-style statistics, invalidated by model signals.
+
+A StatsCache holds computed values under keys chosen by the endpoint (e.g.
+"doctor:12" for one doctor's dashboard, "all" for the admin's). Each key has
+a version token, and a cached value is only served while the token it was
+computed under is still current. invalidate() replaces the tokens; the
+receivers in accounts.signals call it when the underlying rows change. A
+value computed while a write was in flight carries the old token and is
+never served, and tokens are replaced again when the writing transaction
+commits, so readers never see a value older than the last committed write.
+
+Writes that skip signals (queryset.update(), bulk_create, raw SQL) must call
+invalidate() themselves; settings.STATS_CACHE_SECONDS bounds how long a
+missed invalidation can show. Values live in settings.STATS_CACHE (Redis in
+deployment when AZURE_REDIS_CONNECTIONSTRING is set). The locmem fallback is
+per process, so there another worker's writes only show after the timeout.
+
+Hits, misses and invalidations are counted per cache, per process, and
+reported to admins at /api/instrumentation/.
+"""
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+_lock = threading.Lock()
+_counters = {}
+
+
+def _cache():
+    return caches[getattr(settings, 'STATS_CACHE', 'default')]
+
+
+def _count(name, event):
+    with _lock:
+        _counters.setdefault(name, Counter())[event] += 1
+
+
+class StatsCache:
+    """Named group of cached statistics; see the module docstring."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _version_key(self, key):
+        return f'stats:{self.name}:{key}:version'
+
+    def _value_key(self, key, variant):
+        return f'stats:{self.name}:{key}:{variant}'
+
+    def get(self, key, compute, variant=''):
+        """
+        The value cached under key, or compute() stored under it. variant
+        selects an entry without being invalidated separately, e.g. the date
+        for "today" figures that roll over at midnight.
+        """
+        cache = _cache()
+        version_key, value_key = self._version_key(key), self._value_key(key, variant)
+        found = cache.get_many([version_key, value_key])
+        token, entry = found.get(version_key), found.get(value_key)
+        if token is not None and entry is not None and entry[0] == token:
+            _count(self.name, 'hits')
+            return entry[1]
+        _count(self.name, 'misses')
+        if token is None:
+            cache.add(version_key, uuid.uuid4().hex, timeout=None)
+            token = cache.get(version_key)
+        value = compute()
+        cache.set(value_key, (token, value), getattr(settings, 'STATS_CACHE_SECONDS', 300))
+        return value
+
+    def invalidate(self, *keys):
+        """Drop the values cached under keys now and again when the current transaction commits."""
+        keys = [key for key in dict.fromkeys(keys) if key is not None]
+        if not keys:
+            return
+
+        def bump():
+            _cache().set_many({self._version_key(key): uuid.uuid4().hex for key in keys}, timeout=None)
+
+        _count(self.name, 'invalidations')
+        bump()
+        transaction.on_commit(bump)
+
+
+def snapshot() -> dict:
+    """``{cache name: {'hits', 'misses', 'invalidations', 'hit_rate'}}`` for this process."""
+    with _lock:
+        counters = {name: dict(counter) for name, counter in _counters.items()}
+    report = {}
+    for name, counter in sorted(counters.items()):
+        hits, misses = counter.get('hits', 0), counter.get('misses', 0)
+        report[name] = {
+            'hits': hits,
+            'misses': misses,
+            'invalidations': counter.get('invalidations', 0),
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return report
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+
+
+# Doctor and admin dashboard counters (accounts.views.dashboard_stats)
+DASHBOARD_STATS = StatsCache('dashboard-stats')
+# Each user's appointments for the day (appointments.views.TodayAppointmentsView)
+TODAY_APPOINTMENTS = StatsCache('today-appointments')
@@ -0,0 +1,584 @@
+"""
+Synthetic data generator for load testing (see the seed_synthetic command).
+
+SyntheticSeeder creates admins, doctors, patients and caregivers plus their
+appointments, vitals, medications with intake logs, care notes (comments and
+read receipts), care requests, timesheets and payouts. Rows are streamed into
+bulk_create in chunks and every user shares one precomputed password hash, so
+volumes in the millions take minutes on SQLite or Postgres.
+
+Distributions aim to look like production rather than uniform noise: doctor
+panel sizes follow a Pareto curve, locations cluster around Kenyan towns, vitals
+span several years per patient and intake logs follow each medication's dose
+schedule at a per-patient adherence rate.
+
+All generated users share a username prefix, which is how later stages find the
+rows earlier stages created (bulk_create does not return ids on every backend)
+and how a run is flushed.
+"""
+import math
+import random
+import time as clock
+from collections import defaultdict
+from datetime import time, timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Count, DateTimeField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+from django.utils import timezone
+
+from accounts.geo import encode_geohash
+from accounts.search import search_name
+from appointments.models import Appointment
+from carenotes.models import CareNote, CareNoteComment, CareNoteRead
+from health.models import VitalReading
+from medications.models import Medication, MedicationDailyAdherence, MedicationLog
+from medications.rollup import day_start, expected_doses_by_day
+from medications.schedule import parse_frequency
+from medications.utils import refresh_risk_scores
+from payments.models import Payout
+from requestsapp.models import CareRequest
+from timesheet.models import TimesheetEntry
+
+DEFAULT_VOLUMES = {
+    'admins': 1,
+    'doctors': 50,
+    'patients': 2000,
+    'caregivers': 300,
+    'appointments': 6,        # mean per patient
+    'vitals_years': 3,        # longest vitals history
+    'vitals_per_month': 2,    # mean readings per patient per month
+    'medications': 2,         # mean per patient
+    'history_days': 180,      # medication courses (and their intake logs) start within this window
+    'notes': 3,               # mean care notes per patient
+    'comments': 1.5,          # mean comments per note
+    'care_requests': 1,       # mean per patient
+    'timesheets': 40,         # mean per caregiver
+    'payouts': 6,             # mean per caregiver
+}
+
+# (latitude, longitude, spread in degrees, weight); None is rural Kenya at large
+KENYA_CLUSTERS = [
+    ((-1.2921, 36.8219), 0.08, 0.42),   # Nairobi
+    ((-4.0435, 39.6682), 0.06, 0.14),   # Mombasa
+    ((-0.0917, 34.7680), 0.05, 0.10),   # Kisumu
+    ((-0.3031, 36.0800), 0.05, 0.08),   # Nakuru
+    ((0.5143, 35.2698), 0.05, 0.07),    # Eldoret
+    ((-0.4197, 36.9476), 0.04, 0.04),   # Nyeri
+    (None, None, 0.15),
+]
+KENYA_BOUNDS = ((-4.68, 4.62), (33.91, 41.90))
+
+FIRST_NAMES = [
+    'Achieng', 'Akinyi', 'Amani', 'Atieno', 'Baraka', 'Chebet', 'Cherono', 'Faith', 'Grace', 'Imani',
+    'Jabari', 'Jelimo', 'Kamau', 'Kibet', 'Kipchoge', 'Makena', 'Mwangi', 'Njeri', 'Njoroge', 'Nyambura',
+    'Odhiambo', 'Omondi', 'Otieno', 'Wambui', 'Wanjiku', 'Wafula', 'Zawadi', 'Kendi', 'Muthoni', 'Ochieng',
+]
+LAST_NAMES = [
+    'Kariuki', 'Kimani', 'Kiprop', 'Kiptoo', 'Koech', 'Langat', 'Maina', 'Mugo', 'Mutua', 'Mwangi',
+    'Ndungu', 'Njoroge', 'Nyaga', 'Ochieng', 'Odera', 'Okoth', 'Omondi', 'Onyango', 'Otieno', 'Ruto',
+    'Wafula', 'Wairimu', 'Wambua', 'Wanyama', 'Were', 'Chege', 'Kamau', 'Macharia', 'Owino', 'Barasa',
+]
+CONDITIONS = [
+    ('Hypertension', 0.30), ('Type 2 Diabetes', 0.20), ('Asthma', 0.10), ('HIV', 0.08),
+    ('Heart Failure', 0.05), ('Chronic Kidney Disease', 0.04), ('Arthritis', 0.08), ('', 0.15),
+]
+SPECIALIZATIONS = [
+    'Elderly Care', 'Dementia Care', 'Post-operative Care', 'Palliative Care', 'Physiotherapy',
+    'Diabetes Management', 'Wound Care', 'Pediatric Care', 'Disability Support', 'Medication Management',
+]
+MEDICATIONS = [
+    ('Amlodipine', '5mg', 'once daily'), ('Metformin', '500mg', 'twice daily'),
+    ('Lisinopril', '10mg', 'once daily'), ('Atorvastatin', '20mg', 'once daily'),
+    ('Salbutamol', '100mcg', 'as needed'), ('Tenofovir/Lamivudine/Dolutegravir', '1 tablet', 'once daily'),
+    ('Furosemide', '40mg', 'twice daily'), ('Amoxicillin', '500mg', 'three times a day'),
+    ('Paracetamol', '1g', 'every 8 hours'), ('Methotrexate', '15mg', 'weekly'),
+    ('Insulin Glargine', '20 units', 'once daily'), ('Hydrochlorothiazide', '25mg', 'once daily'),
+]
+APPOINTMENT_TYPES = ['Consultation', 'Follow-up', 'Video Consultation', 'Lab Review', 'Medication Review']
+NOTE_TYPES = [
+    ('general', 0.45), ('handoff', 0.15), ('observation', 0.20), ('alert', 0.05),
+    ('medication', 0.10), ('behavior', 0.04), ('emergency', 0.01),
+]
+NOTE_PRIORITIES = [('low', 0.15), ('normal', 0.65), ('high', 0.15), ('urgent', 0.05)]
+CARE_SERVICES = ['Home visit', 'Overnight care', 'Medication supervision', 'Mobility support', 'Post-discharge care']
+CARE_REQUEST_STATUSES = [
+    ('new', 0.15), ('accepted', 0.15), ('in-progress', 0.10), ('completed', 0.45),
+    ('cancelled', 0.10), ('declined', 0.05),
+]
+TIMESHEET_STATUSES = [('draft', 0.10), ('submitted', 0.20), ('approved', 0.65), ('rejected', 0.05)]
+PAYOUT_STATUSES = [
+    (Payout.Status.SUCCESS, 0.85), (Payout.Status.FAILED, 0.07),
+    (Payout.Status.TIMEOUT, 0.03), (Payout.Status.PENDING, 0.05),
+]
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _poisson(rng, mean) -> int:
+    """Poisson sample (Knuth's method; fine for the small means used here)."""
+    if mean <= 0:
+        return 0
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+class SyntheticSeeder:
+    """Generate a synthetic population whose usernames start with `prefix`."""
+
+    def __init__(self, prefix='synthetic', seed=42, chunk_size=5000, password='Pass12345!', now=None, log=None):
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.password_hash = make_password(password)
+        self.now = now or timezone.now()
+        self.today = timezone.localdate(self.now)
+        self.log = log or (lambda message: None)
+        self.counts = {}
+
+    # -- plumbing -----------------------------------------------------------
+
+    def bulk(self, model, rows) -> int:
+        """Insert an iterable of unsaved instances in chunks; returns the row count."""
+        rows = iter(rows)
+        total = 0
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            model.objects.bulk_create(chunk, batch_size=self.chunk_size)
+            total += len(chunk)
+        return total
+
+    def users(self, role=None):
+        qs = get_user_model().objects.filter(username__startswith=f'{self.prefix}-')
+        return qs.filter(role=role) if role else qs
+
+    def exists(self) -> bool:
+        return self.users().exists()
+
+    def flush(self) -> int:
+        """Delete every user of this prefix and everything that cascades from them."""
+        users = self.users()
+        Payout.objects.filter(recipient__in=users).delete()
+        deleted, _ = users.delete()
+        return deleted
+
+    def _stage(self, name, generate):
+        started = clock.perf_counter()
+        with transaction.atomic():
+            count = generate()
+        self.counts[name] = self.counts.get(name, 0) + count
+        self.log(f'{name}: {count} rows in {clock.perf_counter() - started:.1f}s')
+
+    def run(self, **volumes) -> dict:
+        """Generate every stage; returns ``{stage: rows created}``."""
+        v = {**DEFAULT_VOLUMES, **{k: val for k, val in volumes.items() if val is not None}}
+        self._stage('admins', lambda: self.bulk(get_user_model(), self._user_rows('admin', v['admins'])))
+        self._stage('doctors', lambda: self.bulk(get_user_model(), self._user_rows('doctor', v['doctors'])))
+        self._stage('caregivers', lambda: self.bulk(get_user_model(), self._user_rows('caregiver', v['caregivers'])))
+        self._load_staff()
+        self._stage('patients', lambda: self.bulk(get_user_model(), self._patient_rows(v['patients'])))
+        self._load_patients()
+        self._stage('appointments', lambda: self.bulk(Appointment, self._appointments(v['appointments'])))
+        self._stage('vitals', lambda: self.bulk(
+            VitalReading, self._vitals(v['vitals_years'], v['vitals_per_month'])))
+        self._stage('medications', lambda: self.bulk(Medication, self._medications(v['medications'], v['history_days'])))
+        self._stage('medication_logs', self._medication_logs)
+        self._stage('care_notes', lambda: self.bulk(CareNote, self._care_notes(v['notes'])))
+        self._stage('care_note_comments', lambda: self._care_note_activity(v['comments']))
+        self._stage('care_requests', lambda: self.bulk(CareRequest, self._care_requests(v['care_requests'])))
+        self._stage('timesheets', lambda: self.bulk(TimesheetEntry, self._timesheets(v['timesheets'])))
+        self._stage('payouts', lambda: self.bulk(Payout, self._payouts(v['payouts'])))
+        started = clock.perf_counter()
+        with transaction.atomic():
+            backdated = self._backdate()
+        self.log(f'created_at: backdated {backdated} rows in {clock.perf_counter() - started:.1f}s')
+        # bulk_create skips the signals that keep risk snapshots current
+        started = clock.perf_counter()
+        medications = Medication.objects.filter(patient__in=self.users('patient')).order_by('pk')
+        refreshed = refresh_risk_scores(medications, batch_size=self.chunk_size)
+        self.log(f'risk scores: refreshed {refreshed} medications in {clock.perf_counter() - started:.1f}s')
+        return self.counts
+
+    # -- people -------------------------------------------------------------
+
+    def _location(self):
+        rng = self.rng
+        center, spread, _ = rng.choices(KENYA_CLUSTERS, weights=[c[2] for c in KENYA_CLUSTERS])[0]
+        (lat_lo, lat_hi), (lon_lo, lon_hi) = KENYA_BOUNDS
+        if center is None:
+            return round(rng.uniform(lat_lo, lat_hi), 6), round(rng.uniform(lon_lo, lon_hi), 6)
+        lat = min(max(rng.gauss(center[0], spread), lat_lo), lat_hi)
+        lon = min(max(rng.gauss(center[1], spread), lon_lo), lon_hi)
+        return round(lat, 6), round(lon, 6)
+
+    def _phone(self):
+        return f'+2547{self.rng.randrange(10 ** 8):08d}'
+
+    def _person(self, role, i, **extra):
+        rng = self.rng
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        username = f'{self.prefix}-{role}-{i}'
+        email = f'{username}@synthetic.test'
+        lat, lon = self._location()
+        return get_user_model()(
+            username=username,
+            email=email,
+            password=self.password_hash,
+            role=role,
+            first_name=first,
+            last_name=last,
+            phone=self._phone(),
+            gender=rng.choice(['female', 'male']),
+            latitude=lat,
+            longitude=lon,
+            geohash=encode_geohash(lat, lon),  # bulk_create skips User.save
+            search_name=search_name(first, last, email),
+            date_joined=self.now - timedelta(days=rng.randrange(1, 4 * 365)),
+            **extra,
+        )
+
+    def _user_rows(self, role, count):
+        rng = self.rng
+        for i in range(count):
+            if role == 'admin':
+                yield self._person(role, i, is_staff=True)
+            elif role == 'doctor':
+                yield self._person(role, i, is_verified=True, experience_years=rng.randrange(1, 35))
+            else:
+                yield self._person(
+                    role, i,
+                    is_verified=rng.random() < 0.8,
+                    experience_years=rng.randrange(0, 20),
+                    specializations=rng.sample(SPECIALIZATIONS, rng.randint(1, 3)),
+                    hourly_rate=Decimal(rng.randrange(300, 1500, 50)),
+                    location_updated_at=self.now - timedelta(minutes=rng.expovariate(1 / 240)),
+                )
+
+    def _load_staff(self):
+        self.doctor_ids = list(self.users('doctor').order_by('pk').values_list('pk', flat=True))
+        self.caregivers = list(
+            self.users('caregiver').order_by('pk').values_list('pk', 'first_name', 'last_name', 'phone', 'hourly_rate')
+        )
+        # Pareto panel weights: a few doctors carry most of the patients
+        weights = [self.rng.paretovariate(1.16) for _ in self.doctor_ids]
+        self.doctor_cum_weights = list(accumulate(weights))
+
+    def _patient_rows(self, count):
+        rng = self.rng
+        for i in range(count):
+            doctor_id = None
+            if self.doctor_ids and rng.random() < 0.95:
+                doctor_id = rng.choices(self.doctor_ids, cum_weights=self.doctor_cum_weights)[0]
+            age_days = int(365.25 * min(max(rng.gauss(52, 18), 1), 98))
+            yield self._person(
+                'patient', i,
+                doctor_id=doctor_id,
+                primary_condition=_weighted(rng, CONDITIONS),
+                date_of_birth=self.today - timedelta(days=age_days),
+            )
+
+    def _load_patients(self):
+        rng = self.rng
+        self.patients = list(
+            self.users('patient').order_by('pk').values_list('pk', 'doctor_id', 'first_name', 'last_name', 'primary_condition')
+        )
+        # Each patient gets a small care team; care requests, notes and timesheets draw from it
+        self.care_teams = {}
+        self.caregiver_clients = {}
+        for patient_id, _, first, last, _ in self.patients:
+            team = rng.sample(self.caregivers, min(len(self.caregivers), rng.choice([0, 1, 1, 2, 3])))
+            self.care_teams[patient_id] = team
+            for caregiver in team:
+                self.caregiver_clients.setdefault(caregiver[0], []).append(f'{first} {last}')
+
+    # -- clinical -----------------------------------------------------------
+
+    def _appointments(self, mean):
+        rng = self.rng
+        slots = [time(hour, minute) for hour in range(8, 17) for minute in (0, 30)]
+        for patient_id, doctor_id, *_ in self.patients:
+            if doctor_id is None:
+                continue
+            for _ in range(_poisson(rng, mean)):
+                day = self.today + timedelta(days=rng.randint(-730, 60))
+                if day > self.today:
+                    status = _weighted(rng, [('scheduled', 0.92), ('cancelled', 0.08)])
+                else:
+                    status = _weighted(rng, [('completed', 0.85), ('cancelled', 0.12), ('scheduled', 0.03)])
+                kind = rng.choice(APPOINTMENT_TYPES)
+                yield Appointment(
+                    patient_id=patient_id,
+                    doctor_id=doctor_id,
+                    date=day,
+                    time=rng.choice(slots),
+                    type=kind,
+                    status=status,
+                    video_link=f'https://meet.jit.si/{self.prefix}-{patient_id}-{rng.randrange(10 ** 6)}'
+                    if kind == 'Video Consultation' else None,
+                )
+
+    def _vitals(self, years, per_month):
+        rng = self.rng
+        mean_gap = 30.0 / per_month if per_month > 0 else None
+        for patient_id, _, _, _, condition in self.patients:
+            if mean_gap is None:
+                break
+            hypertensive = condition in ('Hypertension', 'Heart Failure', 'Chronic Kidney Disease')
+            diabetic = condition == 'Type 2 Diabetes'
+            systolic = rng.gauss(145 if hypertensive else 122, 10)
+            diastolic = systolic * rng.uniform(0.6, 0.68)
+            heart_rate = rng.gauss(76, 8)
+            weight = rng.gauss(74, 14)
+            sugar = rng.gauss(150 if diabetic else 95, 15)
+            drift = rng.gauss(0, 0.01)  # slow systolic trend per day of history
+            day = self.today - timedelta(days=rng.randint(30, max(30, int(years * 365))))
+            while day <= self.today:
+                age = (self.today - day).days
+                reading_systolic = systolic - drift * age + rng.gauss(0, 8)
+                yield VitalReading(
+                    patient_id=patient_id,
+                    date=day,
+                    blood_pressure_systolic=round(reading_systolic),
+                    blood_pressure_diastolic=round(diastolic + rng.gauss(0, 5)),
+                    heart_rate=round(heart_rate + rng.gauss(0, 6)),
+                    weight=round(weight + rng.gauss(0, 0.8), 1),
+                    blood_sugar=round(sugar + rng.gauss(0, 18)),
+                    temperature=round(rng.gauss(36.8, 0.3), 1),
+                )
+                day += timedelta(days=max(1, round(rng.expovariate(1 / mean_gap))))
+
+    def _medications(self, mean, history_days):
+        rng = self.rng
+        for patient_id, *_ in self.patients:
+            for name, dosage, frequency in rng.sample(MEDICATIONS, min(len(MEDICATIONS), _poisson(rng, mean))):
+                start = self.today - timedelta(days=rng.randint(0, history_days))
+                end = None
+                if rng.random() < 0.3:
+                    end = start + timedelta(days=rng.choice([7, 14, 30, 90, 180]))
+                total = rng.choice([30, 60, 90, 120])
+                yield Medication(
+                    patient_id=patient_id,
+                    name=name,
+                    dosage=dosage,
+                    frequency=frequency,
+                    start_date=start,
+                    end_date=end,
+                    total_quantity=total,
+                    remaining_quantity=total,
+                    refill_threshold=rng.choice([5, 7, 10]),
+                    next_due=self.today + timedelta(days=rng.randint(-5, 30)),
+                )
+
+    def _medication_logs(self) -> int:
+        """
+        Intake logs over each medication's course at the patient's adherence
+        rate, written together with the daily adherence rollup rows that
+        rebuild_daily_adherence would derive from them.
+        """
+        rng = self.rng
+        adherence = {patient_id: rng.betavariate(5, 1.5) for patient_id, *_ in self.patients}
+        medications = Medication.objects.filter(patient__in=self.users('patient')).order_by('pk')
+        rollups = []
+
+        def rows():
+            for med_id, patient_id, frequency, start, end in medications.values_list(
+                'pk', 'patient_id', 'frequency', 'start_date', 'end_date',
+            ).iterator(chunk_size=self.chunk_size):
+                schedule = parse_frequency(frequency)
+                since = day_start(start)
+                until = self.now if end is None else min(self.now, day_start(end + timedelta(days=1)))
+                if schedule.prn:
+                    days = max((until - since).total_seconds(), 0) / 86400
+                    times = sorted(since + (until - since) * rng.random() for _ in range(_poisson(rng, days / 4)))
+                else:
+                    rate = adherence[patient_id]
+                    times = [
+                        min(max(dose + timedelta(minutes=rng.gauss(0, 25)), since), self.now)
+                        for dose in schedule.expected_doses(start, since, until)
+                        if rng.random() < rate
+                    ]
+                taken = defaultdict(list)
+                for taken_at in times:
+                    taken[timezone.localdate(taken_at)].append(taken_at)
+                    yield MedicationLog(medication_id=med_id, taken_at=taken_at)
+
+                expected = expected_doses_by_day(Medication(frequency=frequency, start_date=start), start, self.today)
+                for day in sorted(set(expected) | set(taken)):
+                    day_logs = taken.get(day, [])
+                    rollups.append(MedicationDailyAdherence(
+                        medication_id=med_id,
+                        date=day,
+                        expected_doses=expected[day],
+                        taken_doses=len(day_logs),
+                        first_taken_at=min(day_logs, default=None),
+                        last_taken_at=max(day_logs, default=None),
+                    ))
+                if len(rollups) >= self.chunk_size:
+                    self.counts['daily_adherence'] = self.counts.get('daily_adherence', 0) + self.bulk(
+                        MedicationDailyAdherence, rollups)
+                    rollups.clear()
+
+        count = self.bulk(MedicationLog, rows())
+        self.counts['daily_adherence'] = self.counts.get('daily_adherence', 0) + self.bulk(
+            MedicationDailyAdherence, rollups)
+        taken = (
+            MedicationLog.objects.filter(medication=OuterRef('pk'))
+            .order_by().values('medication').annotate(n=Count('pk')).values('n')
+        )
+        medications.update(remaining_quantity=Greatest(
+            F('total_quantity') - Coalesce(Subquery(taken, output_field=IntegerField()), Value(0)), Value(0),
+        ))
+        return count
+
+    def _backdate(self) -> int:
+        """
+        Move created_at (auto_now_add, so bulk_create stamps every row with now)
+        back to when each row would have been entered: vitals and medications
+        on their date and start date, appointments booked ahead of their date
+        (60 days, the furthest they are scheduled).
+        """
+        def on(field, lead=timedelta()):
+            return Cast(ExpressionWrapper(F(field) - lead, output_field=DateTimeField()), DateTimeField())
+
+        patients = self.users('patient')
+        return (
+            Appointment.objects.filter(patient__in=patients)
+            .update(created_at=Least(on('date', timedelta(days=60)), Value(self.now)))
+            + VitalReading.objects.filter(patient__in=patients).update(created_at=on('date'))
+            + Medication.objects.filter(patient__in=patients).update(created_at=on('start_date'))
+        )
+
+    # -- care coordination --------------------------------------------------
+
+    def _care_notes(self, mean):
+        rng = self.rng
+        for patient_id, doctor_id, *_ in self.patients:
+            authors = [doctor_id] if doctor_id else []
+            authors += [caregiver[0] for caregiver in self.care_teams[patient_id]]
+            if not authors:
+                continue
+            for _ in range(_poisson(rng, mean)):
+                note_type = _weighted(rng, NOTE_TYPES)
+                yield CareNote(
+                    patient_id=patient_id,
+                    author_id=rng.choice(authors),
+                    note_type=note_type,
+                    priority=_weighted(rng, NOTE_PRIORITIES),
+                    title=f'{note_type.title()} update',
+                    content=rng.choice([
+                        'Patient comfortable, vitals stable.',
+                        'Reported mild dizziness after morning dose.',
+                        'Family requested an update on the care plan.',
+                        'Missed evening dose; reminder given.',
+                        'Mobility improving with daily exercises.',
+                    ]),
+                    is_pinned=rng.random() < 0.05,
+                    is_archived=rng.random() < 0.15,
+                )
+
+    def _care_note_activity(self, mean_comments) -> int:
+        """Comments and read receipts for the generated notes; returns the comment count."""
+        rng = self.rng
+        doctors = {patient_id: doctor_id for patient_id, doctor_id, *_ in self.patients}
+        notes = list(
+            CareNote.objects.filter(patient__in=self.users('patient')).values_list('pk', 'patient_id', 'author_id')
+        )
+
+        def team(patient_id):
+            members = [caregiver[0] for caregiver in self.care_teams.get(patient_id, [])]
+            if doctors.get(patient_id):
+                members.append(doctors[patient_id])
+            return members
+
+        def comments():
+            for note_id, patient_id, _ in notes:
+                members = team(patient_id)
+                for _ in range(_poisson(rng, mean_comments)):
+                    yield CareNoteComment(
+                        note_id=note_id,
+                        author_id=rng.choice(members),
+                        content=rng.choice(['Noted, thanks.', 'Will follow up at the next visit.', 'Seen and actioned.']),
+                    )
+
+        def receipts():
+            for note_id, patient_id, author_id in notes:
+                for user_id in team(patient_id):
+                    if user_id != author_id and rng.random() < 0.7:
+                        yield CareNoteRead(note_id=note_id, user_id=user_id)
+
+        count = self.bulk(CareNoteComment, comments())
+        self.counts['care_note_reads'] = self.bulk(CareNoteRead, receipts())
+        return count
+
+    def _care_requests(self, mean):
+        rng = self.rng
+        for patient_id, _, first, last, _ in self.patients:
+            team = self.care_teams[patient_id]
+            for _ in range(_poisson(rng, mean)):
+                status = _weighted(rng, CARE_REQUEST_STATUSES)
+                caregiver = rng.choice(team) if team and status not in ('new', 'declined') else None
+                rate = caregiver[4] if caregiver else Decimal(rng.randrange(300, 1500, 50))
+                yield CareRequest(
+                    family=f'{last} family',
+                    service=rng.choice(CARE_SERVICES),
+                    duration=rng.choice(['2 hours', '4 hours', '8 hours', '12 hours', '1 week']),
+                    rate=rate,
+                    urgent=rng.random() < 0.1,
+                    status=status,
+                    patient_id=patient_id,
+                    caregiver_id=caregiver[0] if caregiver else None,
+                    created_by_id=patient_id,
+                )
+
+    def _timesheets(self, mean):
+        rng = self.rng
+        for caregiver_id, _, _, _, hourly_rate in self.caregivers:
+            clients = self.caregiver_clients.get(caregiver_id) or ['Private client']
+            for _ in range(_poisson(rng, mean)):
+                start_hour = rng.randint(6, 14)
+                shift_minutes = rng.choice([240, 360, 480, 600])
+                break_minutes = rng.choice([0, 15, 30, 60])
+                start = time(start_hour, rng.choice([0, 15, 30, 45]))
+                end_minutes = min(start_hour * 60 + start.minute + shift_minutes, 23 * 60 + 59)
+                hours = (Decimal(end_minutes - start_hour * 60 - start.minute - break_minutes) / 60).quantize(Decimal('0.01'))
+                yield TimesheetEntry(
+                    caregiver_id=caregiver_id,
+                    date=self.today - timedelta(days=rng.randint(0, 365)),
+                    client=rng.choice(clients),
+                    start_time=start,
+                    end_time=time(end_minutes // 60, end_minutes % 60),
+                    break_minutes=break_minutes,
+                    hours=hours,
+                    rate=hourly_rate,
+                    subtotal=(hours * hourly_rate).quantize(Decimal('0.01')),
+                    status=_weighted(rng, TIMESHEET_STATUSES),
+                )
+
+    def _payouts(self, mean):
+        rng = self.rng
+        for caregiver_id, _, _, phone, _ in self.caregivers:
+            for _ in range(_poisson(rng, mean)):
+                status = _weighted(rng, PAYOUT_STATUSES)
+                conversation = f'AG_{rng.randrange(10 ** 12):012d}'
+                yield Payout(
+                    recipient_id=caregiver_id,
+                    recipient_phone=phone.lstrip('+'),
+                    amount=int(rng.lognormvariate(8.5, 0.6)),
+                    remarks='Caregiver payout',
+                    status=status,
+                    safaricom_conversation_id=conversation if status != Payout.Status.PENDING else '',
+                    result_code={'SUCCESS': '0', 'FAILED': '2001', 'TIMEOUT': '1037'}.get(status, ''),
+                    created_at=self.now - timedelta(days=rng.uniform(0, 365)),
+                )
@@ -73,7 +73,7 @@ class AccountsApiTests(APITestCase):
             'max_distance': 1000  # meters
         })
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        emails = [r['email'] for r in resp.data]
+        emails = [r['email'] for r in resp.data['results']]
         self.assertIn(self.caregiver.email, emails)
         self.assertIn(near.email, emails)
         self.assertNotIn(far.email, emails)
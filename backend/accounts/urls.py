@@ -9,7 +9,7 @@ from .views import (
     AdminAnalyticsView, AdminAppointmentListView, dashboard_stats, DoctorUpdatePatientView,
     GoogleAuthView
 )
-from .views import MeLocationView
+from .views import MeLocationView, CaregiverTrackView, PeopleSearchView
 from .views import AdminCaregiverVerifyView, AdminDoctorVerifyView, MeVerificationDocumentUploadView, AdminUserVerificationDocumentsView, AdminVerificationDocumentReviewView
 
 urlpatterns = [
@@ -47,6 +47,8 @@ urlpatterns = [
     path('patients/', PatientListView.as_view(), name='patients'),
     path('doctors/', DoctorListView.as_view(), name='doctors'),
     path('caregivers/', CaregiverListView.as_view(), name='caregivers'),
+    path('caregivers/<int:pk>/track/', CaregiverTrackView.as_view(), name='caregiver-track'),
+    path('people/search/', PeopleSearchView.as_view(), name='people-search'),
     path('email/verify/request/', EmailVerificationRequestView.as_view(), name='email-verify-request'),
     path('email/verify/confirm/', EmailVerificationConfirmView.as_view(), name='email-verify-confirm'),
     path('password/reset/request/', PasswordResetRequestView.as_view(), name='password-reset-request'),
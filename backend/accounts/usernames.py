@@ -0,0 +1,85 @@
+"""
+Unique username allocation for accounts created from an email address.
+
+Usernames are the email's local part, suffixed with a number when that is
+taken: "john", "john1", "john2", ... next_free() finds the next one with a
+single aggregate query, whatever the number of existing "john<N>" users: the
+highest numeric suffix, read through the username index (a range of usernames
+starting with the base followed by a digit).
+
+Between reading and inserting, another registration can take the same name.
+create_with_username() therefore inserts in a savepoint and, when the
+username clashes, allocates again; its last attempt uses a random suffix.
+"""
+import re
+import secrets
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import BigIntegerField, CharField, Count, Max, Q
+from django.db.models.functions import Cast, Substr
+from django.db.models.lookups import Exact
+
+# Allocation attempts per account; the last one uses a random suffix
+ATTEMPTS = 3
+# Room left for the numeric suffix within User.username's max_length
+SUFFIX_DIGITS = 10
+
+
+def base_username(email: str) -> str:
+    """The email's local part, cut to leave room for a suffix."""
+    max_length = get_user_model()._meta.get_field('username').max_length
+    return email.split('@')[0][:max_length - SUFFIX_DIGITS]
+
+
+def _suffixed(base) -> Q:
+    """Usernames starting with base followed by a digit."""
+    if connection.vendor == 'postgresql':
+        # Served by the varchar_pattern_ops index Django adds for unique CharFields
+        return Q(username__startswith=base)
+    # '0'..'9' sort between '/' and ':', so this is a range scan of the username index
+    return Q(username__gte=f'{base}0', username__lt=f'{base}:')
+
+
+def _numeric_suffix(base, suffix) -> Q:
+    """The username is base followed by a number (suffix: the expression for the rest of it)."""
+    if connection.vendor == 'sqlite':
+        # SQLite casts text that is not a number to 0 instead of failing, so compare the
+        # canonical form in SQL (no per-row Python REGEXP). "john07" is skipped, and it
+        # can never clash with a suffix generated here.
+        return Q(Exact(Cast(Cast(suffix, BigIntegerField()), CharField()), suffix))
+    # At most 18 digits, so the cast fits a bigint
+    return Q(username__regex=rf'^{re.escape(base)}[0-9]{{1,18}}$')
+
+
+def next_free(base: str) -> str:
+    """base if it is free, else base followed by one more than the highest numeric suffix in use."""
+    suffix = Substr('username', len(base) + 1)
+    taken = get_user_model().objects.filter(Q(username=base) | _suffixed(base)).aggregate(
+        base=Count('pk', filter=Q(username=base)),
+        suffix=Max(Cast(suffix, BigIntegerField()), filter=_numeric_suffix(base, suffix)),
+    )
+    if not taken['base']:
+        return base
+    return f"{base}{(taken['suffix'] or 0) + 1}"
+
+
+def create_with_username(email: str, create):
+    """
+    Call create(username) with a free username derived from email and return
+    its result, allocating again if the username was taken in the meantime.
+    """
+    User = get_user_model()
+    base = base_username(email)
+    for attempt in range(ATTEMPTS):
+        if attempt < ATTEMPTS - 1:
+            username = next_free(base)
+        else:
+            username = f'{base}{secrets.randbelow(10 ** 6)}'
+        try:
+            with transaction.atomic():
+                return create(username)
+        except IntegrityError:
+            if attempt == ATTEMPTS - 1 or not User.objects.filter(username=username).exists():
+                # Out of attempts, or another unique field (e.g. the email) clashed
+                raise
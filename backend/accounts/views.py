@@ -4,21 +4,24 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q, Count, Avg
-import math
+from django.db.models import Q, Count, Avg, Prefetch
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.http import JsonResponse
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from .serializers import (
     RegisterSerializer, UserSerializer,
     EmailVerificationRequestSerializer, EmailVerificationConfirmSerializer,
     PasswordResetRequestSerializer, PasswordResetConfirmSerializer,
-    VerificationDocumentSerializer
+    VerificationDocumentSerializer, UserSearchResultSerializer
 )
-from .models import EmailVerificationToken, PasswordResetToken, VerificationDocument
+from . import geo, location_buffer, location_history, search
+from .stats_cache import DASHBOARD_STATS
+from .usernames import create_with_username
+from .models import DailyMetrics, EmailVerificationToken, LocationPing, PasswordResetToken, VerificationDocument
 from appointments.models import Appointment
 from accounts.models import User
 
@@ -32,43 +35,36 @@ def dashboard_stats(request):
     Retrieves dashboard statistics based on the user's role.
     - Doctors see stats for their assigned patients.
     - Admins see global stats.
+
+    Cached per doctor (and once for everyone else) until an appointment or a
+    patient assignment changes; see accounts.stats_cache and accounts.signals.
     """
     today = timezone.now().date()
     user = request.user
-    
-    # For doctors, filter by their patients; admins see all
-    if user.role == 'doctor':
-        # Appointments for today for this doctor's patients
-        today_appointments = Appointment.objects.filter(
-            date=today,
-            patient__doctor=user
-        ).count()
-        # Total patients assigned to this doctor
-        total_patients = User.objects.filter(role='patient', doctor=user).count()
-        # Pending consults for this doctor's patients
-        pending_consults = Appointment.objects.filter(
-            status='in-progress',
-            patient__doctor=user
-        ).count()
-        # Completed appointments today for this doctor's patients
-        completed_today = Appointment.objects.filter(
-            date=today,
-            status='completed',
-            patient__doctor=user
-        ).count()
-    else:
-        # Admin or other roles see all stats
-        today_appointments = Appointment.objects.filter(date=today).count()
-        total_patients = User.objects.filter(role='patient').count()
-        pending_consults = Appointment.objects.filter(status='in-progress').count()
-        completed_today = Appointment.objects.filter(date=today, status='completed').count()
-    
-    return JsonResponse({
-        "todayAppointments": today_appointments,
-        "totalPatients": total_patients,
-        "pendingConsults": pending_consults,
-        "completedToday": completed_today
-    })
+
+    def compute():
+        # For doctors, filter by their patients; admins see all
+        if user.role == 'doctor':
+            appointments = Appointment.objects.filter(patient__doctor=user)
+            total_patients = User.objects.filter(role='patient', doctor=user).count()
+        else:
+            # Admin or other roles see all stats
+            appointments = Appointment.objects.all()
+            total_patients = User.objects.filter(role='patient').count()
+        counts = appointments.aggregate(
+            today=Count('id', filter=Q(date=today)),
+            pending=Count('id', filter=Q(status='in-progress')),
+            completed_today=Count('id', filter=Q(date=today, status='completed')),
+        )
+        return {
+            "todayAppointments": counts['today'],
+            "totalPatients": total_patients,
+            "pendingConsults": counts['pending'],
+            "completedToday": counts['completed_today'],
+        }
+
+    key = f'doctor:{user.pk}' if user.role == 'doctor' else 'all'
+    return JsonResponse(DASHBOARD_STATS.get(key, compute, variant=today.isoformat()))
 
 class IsAdmin(BasePermission):
     """Allows access only to admin users."""
@@ -96,6 +92,20 @@ class AdminRegisterView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(role='admin')
 
+def with_user_relations(queryset):
+    """
+    Join the assigned doctor and prefetch each user's latest verification
+    document (one query for the whole page), so UserSerializer lists cost a
+    constant number of queries.
+    """
+    return queryset.select_related('doctor').prefetch_related(
+        Prefetch(
+            'verification_documents',
+            queryset=VerificationDocument.objects.order_by('-uploaded_at')[:1],
+            to_attr='latest_verification_documents',
+        )
+    )
+
 # Admin: List all users
 class AdminUserListView(generics.ListAPIView):
     """
@@ -104,7 +114,7 @@ class AdminUserListView(generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAdmin]
     def get_queryset(self):
-        return User.objects.all().order_by('id')
+        return with_user_relations(User.objects.all().order_by('id'))
 
 # Admin: Create doctor
 class AdminDoctorCreateView(generics.CreateAPIView):
@@ -337,16 +347,19 @@ class AdminAnalyticsView(APIView):
     """
     Endpoint for retrieving system-wide analytics for the admin dashboard.
     Includes user stats, appointment stats, health metrics, and medication compliance.
+
+    Totals and appointments by status are counted live (analytics.live_totals).
+    Per-day figures sum closed days from the DailyMetrics rollup
+    (accounts.analytics); later rows (today's, upcoming appointments) and the
+    partial first day of rolling windows are counted live through indexed ranges.
     """
     permission_classes = [IsAdmin]
     
     def get(self, request):
         from appointments.models import Appointment
         from medications.models import Medication
-        from health.models import VitalReading, SymptomLog, LabResult
-        from django.db.models import Count, Q
-        from datetime import datetime, timedelta
         from django.utils.dateparse import parse_date
+        from . import analytics
         
     # Optional filters (date only)
         date_from_str = request.query_params.get('date_from')
@@ -362,83 +375,8 @@ class AdminAnalyticsView(APIView):
         if date_from and date_to and date_from > date_to:
             return Response({'detail': 'date_from must be before or equal to date_to.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Build filtered appointments by date range only
-
-        # User statistics
-        total_users = User.objects.count()
-        patient_count = User.objects.filter(role='patient').count()
-        doctor_count = User.objects.filter(role='doctor').count()
-        caregiver_count = User.objects.filter(role='caregiver').count()
-        admin_count = User.objects.filter(role='admin').count()
-        
-        # Recent registrations (last 30 days)
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        recent_registrations = User.objects.filter(date_joined__gte=thirty_days_ago).count()
-        
-        # Appointment statistics
-        base_apts = Appointment.objects.all()
-        filtered_apts = base_apts
-        if date_from:
-            filtered_apts = filtered_apts.filter(date__gte=date_from)
-        if date_to:
-            filtered_apts = filtered_apts.filter(date__lte=date_to)
-
-        total_appointments = filtered_apts.count()
-        scheduled_appointments = filtered_apts.filter(status='scheduled').count()
-        completed_appointments = filtered_apts.filter(status='completed').count()
-        cancelled_appointments = filtered_apts.filter(status='cancelled').count()
-        
-        # Today's appointments (global, not restricted by date filters)
-        today = timezone.now().date()
-        today_appointments = base_apts.filter(date=today).count()
-        
-        # This week's appointments
+        today = timezone.localdate()
         week_start = today - timedelta(days=today.weekday())
-        this_week_qs = base_apts.filter(date__gte=week_start, date__lte=today)
-        this_week_appointments = this_week_qs.count()
-        
-        # Appointments by status
-        appointments_by_status = list(
-            filtered_apts.values('status').annotate(count=Count('id'))
-        )
-
-        # Appointments trend (daily counts within selected range or last 7 days by default)
-        if date_from and date_to:
-            trend_start, trend_end = date_from, date_to
-        else:
-            trend_end = today
-            trend_start = today - timedelta(days=6)
-        trend_qs = base_apts.filter(date__gte=trend_start, date__lte=trend_end)
-        # Build a dict of date -> count
-        trend_counts = { (trend_start + timedelta(days=i)): 0 for i in range((trend_end - trend_start).days + 1) }
-        for row in trend_qs.values('date').annotate(count=Count('id')):
-            d = row['date']
-            if d in trend_counts:
-                trend_counts[d] = row['count']
-        appointments_trend = [
-            { 'date': d.isoformat(), 'count': trend_counts[d] } for d in sorted(trend_counts.keys())
-        ]
-        # Build users trend over the same window
-        # Note: using date_joined__date for date-only comparisons
-        def daterange(start_date, end_date):
-            for n in range(int((end_date - start_date).days) + 1):
-                yield start_date + timedelta(n)
-        users_trend_map = { d: 0 for d in daterange(trend_start, trend_end) }
-        # Aggregate registrations by date
-        registrations = (
-            User.objects
-            .filter(date_joined__date__gte=trend_start, date_joined__date__lte=trend_end)
-            .extra(select={"d":"date(date_joined)"})
-            .values('d')
-            .annotate(count=Count('id'))
-        )
-        from django.utils.dateparse import parse_date as _parse_date
-        for row in registrations:
-            d = row['d']
-            d_parsed = _parse_date(d) if isinstance(d, str) else d
-            if d_parsed in users_trend_map:
-                users_trend_map[d_parsed] = row['count']
-        users_trend = [ { 'date': d.isoformat(), 'count': users_trend_map[d] } for d in sorted(users_trend_map.keys()) ]
 
         # Month-to-date vs previous month-to-date deltas
         def month_ranges(ref_date):
@@ -457,45 +395,81 @@ class AdminAnalyticsView(APIView):
 
         cur_start, cur_end, prev_start, prev_end = month_ranges(today)
 
-        users_current_mtd = User.objects.filter(date_joined__date__gte=cur_start, date_joined__date__lte=cur_end).count()
-        users_prev_mtd = User.objects.filter(date_joined__date__gte=prev_start, date_joined__date__lte=prev_end).count()
-        users_mtd_delta = users_current_mtd - users_prev_mtd
+        # Trends: daily counts within selected range or last 7 days by default
+        if date_from and date_to:
+            trend_start, trend_end = date_from, date_to
+        else:
+            trend_end = today
+            trend_start = today - timedelta(days=6)
 
-        apts_current_qs = base_apts.filter(date__gte=cur_start, date__lte=cur_end)
-        apts_prev_qs = base_apts.filter(date__gte=prev_start, date__lte=prev_end)
-        apts_current_mtd = apts_current_qs.count()
-        apts_prev_mtd = apts_prev_qs.count()
-        apts_mtd_delta = apts_current_mtd - apts_prev_mtd
+        # Days up to the last rollup row are summed from it, later days (normally
+        # just today, and upcoming appointments) are counted live
+        recent_days = {'new_users': 30, 'appointments_booked': 7, 'vitals_recorded': 7}
+        window_day = {column: timezone.localdate(timezone.now() - timedelta(days=days))
+                      for column, days in recent_days.items()}
+        in_range = Q()
+        if date_from:
+            in_range &= Q(date__gte=date_from)
+        if date_to:
+            in_range &= Q(date__lte=date_to)
+        totals = analytics.live_totals(in_range)
+        covered = analytics.last_rolled_up()
+        since = covered + timedelta(days=1) if covered else None
+        live, partial = analytics.live_counts(since, recent_days)
+        live.update(analytics.appointments_from(since))
+
+        # The few stored days the rolling, week and month windows and the trend span
+        window_columns = ['new_users', 'appointments', 'appointments_booked', 'vitals_recorded', 'new_medications',
+                          'avg_compliance']
+        windows_start = min(prev_start, week_start, *window_day.values())
+        stored = {
+            row[0]: dict(zip(window_columns, row[1:])) for row in DailyMetrics.objects
+            .filter(Q(date__gte=windows_start) | Q(date__gte=trend_start, date__lte=trend_end))
+            .values_list('date', *window_columns)
+        }
+
+        def live_sum(column, first=None, last=None):
+            return sum(n for day, n in live[column].items()
+                       if (first is None or day >= first) and (last is None or day <= last))
+
+        def days_sum(column, first, last=None):
+            return live_sum(column, first, last) + sum(
+                row[column] for day, row in stored.items() if day >= first and (last is None or day <= last)
+            )
+
+        def recent(column):
+            return days_sum(column, window_day[column] + timedelta(days=1)) + partial[column]
+
+        def month(column):
+            current = days_sum(column, cur_start, cur_end)
+            previous = days_sum(column, prev_start, prev_end)
+            return {'current': current, 'previous': previous, 'delta': current - previous}
+
+        status_counts = {value: totals[column] for value, column in analytics.STATUS_FIELDS.items()}
+        appointments_by_status = [
+            {'status': value, 'count': status_counts[value]} for value in sorted(status_counts) if status_counts[value]
+        ]
+
+        def daily_trend(column):
+            return [
+                {'date': d.isoformat(), 'count': stored.get(d, {}).get(column, 0) + live[column].get(d, 0)}
+                for d in (trend_start + timedelta(days=i) for i in range((trend_end - trend_start).days + 1))
+            ]
+
+        # The rollup stops at yesterday, so today's appointments are all live
+        appointments_today = live_sum('appointments', today, today)
+        # Compliance is snapshotted as each day is rolled up; averaged live only without a recent snapshot
+        snapshot = max(
+            ((day, row['avg_compliance']) for day, row in stored.items()
+             if day >= windows_start and row['avg_compliance'] is not None),
+            default=None,
+        )
+        meds = Medication.objects.aggregate(
+            active=Count('id', filter=Q(next_due__gte=today)),
+            **({} if snapshot else {'avg_compliance': Avg('compliance')}),
+        )
+        avg_compliance = snapshot[1] if snapshot else meds['avg_compliance']
 
-        meds_current_mtd = Medication.objects.filter(created_at__date__gte=cur_start, created_at__date__lte=cur_end).count()
-        meds_prev_mtd = Medication.objects.filter(created_at__date__gte=prev_start, created_at__date__lte=prev_end).count()
-        meds_mtd_delta = meds_current_mtd - meds_prev_mtd
-        
-        # Health metrics
-        total_vitals = VitalReading.objects.count()
-        total_symptoms = SymptomLog.objects.count()
-        total_labs = LabResult.objects.count()
-        
-        # Medication statistics
-        total_medications = Medication.objects.count()
-        active_medications = Medication.objects.filter(
-            next_due__gte=today
-        ).count() if Medication.objects.filter(next_due__isnull=False).exists() else 0
-        
-        # Average medication compliance
-        avg_compliance = Medication.objects.aggregate(
-            avg_compliance=models.Avg('compliance')
-        )['avg_compliance'] or 0
-        
-        # Recent activity (last 7 days)
-        seven_days_ago = timezone.now() - timedelta(days=7)
-        recent_appointments = base_apts.filter(
-            created_at__gte=seven_days_ago
-        ).count()
-        recent_vitals = VitalReading.objects.filter(
-            created_at__gte=seven_days_ago
-        ).count()
-        
         # Top conditions (from patients)
         top_conditions = list(
             User.objects.filter(role='patient', primary_condition__isnull=False)
@@ -515,50 +489,38 @@ class AdminAnalyticsView(APIView):
         
         return Response({
             'users': {
-                'total': total_users,
-                'patients': patient_count,
-                'doctors': doctor_count,
-                'caregivers': caregiver_count,
-                'admins': admin_count,
-                'recent_registrations': recent_registrations,
-                'trend': users_trend,
-                'month': {
-                    'current': users_current_mtd,
-                    'previous': users_prev_mtd,
-                    'delta': users_mtd_delta,
-                }
+                'total': totals['new_users'],
+                'patients': totals['new_patients'],
+                'doctors': totals['new_doctors'],
+                'caregivers': totals['new_caregivers'],
+                'admins': totals['new_admins'],
+                'recent_registrations': recent('new_users'),
+                'trend': daily_trend('new_users'),
+                'month': month('new_users'),
             },
             'appointments': {
-                'total': total_appointments,
-                'scheduled': scheduled_appointments,
-                'completed': completed_appointments,
-                'cancelled': cancelled_appointments,
-                'today': today_appointments,
-                'this_week': this_week_appointments,
+                'total': totals['appointments'],
+                'scheduled': status_counts['scheduled'],
+                'completed': status_counts['completed'],
+                'cancelled': status_counts['cancelled'],
+                'today': appointments_today,
+                'this_week': days_sum('appointments', week_start, today),
                 'by_status': appointments_by_status,
-                'trend': appointments_trend,
-                'recent': recent_appointments,
-                'month': {
-                    'current': apts_current_mtd,
-                    'previous': apts_prev_mtd,
-                    'delta': apts_mtd_delta,
-                }
+                'trend': daily_trend('appointments'),
+                'recent': recent('appointments_booked'),
+                'month': month('appointments'),
             },
             'health': {
-                'total_vitals': total_vitals,
-                'total_symptoms': total_symptoms,
-                'total_labs': total_labs,
-                'recent_vitals': recent_vitals,
+                'total_vitals': totals['vitals_recorded'],
+                'total_symptoms': totals['symptoms_logged'],
+                'total_labs': totals['labs_recorded'],
+                'recent_vitals': recent('vitals_recorded'),
             },
             'medications': {
-                'total': total_medications,
-                'active': active_medications,
-                'avg_compliance': round(avg_compliance, 1),
-                'month': {
-                    'current': meds_current_mtd,
-                    'previous': meds_prev_mtd,
-                    'delta': meds_mtd_delta,
-                }
+                'total': totals['new_medications'],
+                'active': meds['active'],
+                'avg_compliance': round(avg_compliance or 0, 1),
+                'month': month('new_medications'),
             },
             'insights': {
                 'top_conditions': top_conditions,
@@ -776,12 +738,13 @@ class PatientListView(generics.ListAPIView):
             qs = qs.filter(doctor=user)
         # Admins see all patients (no additional filter needed)
         
-        # Apply search filter if provided
-        search = self.request.query_params.get('search')
-        if search:
-            qs = qs.filter(Q(first_name__icontains=search) | Q(last_name__icontains=search) | Q(email__icontains=search))
+        qs = qs.order_by('id')
+        # Apply search filter if provided (indexed, best matches first)
+        term = self.request.query_params.get('search')
+        if term:
+            qs = search.matching(qs, term)
         
-        return qs.order_by('id')
+        return with_user_relations(qs)
 
 
 class DoctorListView(generics.ListAPIView):
@@ -792,73 +755,150 @@ class DoctorListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        qs = User.objects.filter(role='doctor')
-        search = self.request.query_params.get('search')
-        if search:
-            qs = qs.filter(Q(first_name__icontains=search) | Q(last_name__icontains=search) | Q(email__icontains=search))
-        return qs.order_by('id')
+        qs = User.objects.filter(role='doctor').order_by('id')
+        term = self.request.query_params.get('search')
+        if term:
+            qs = search.matching(qs, term)
+        return with_user_relations(qs)
+
+
+class CaregiverPagination(PageNumberPagination):
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
 
 class CaregiverListView(generics.ListAPIView):
     """
-    Endpoint for listing caregivers with optional proximity filtering.
+    Endpoint for listing caregivers (paginated) with optional proximity search.
+
+    ?patient_lat=&patient_lng= orders caregivers by distance; ?max_distance=
+    (meters) limits the radius and ?k= returns only the k nearest. Candidates
+    are prefiltered in SQL through the geohash index (see accounts.geo), so
+    exact distances are computed only near the patient. With the location
+    write-behind buffer on, caregivers are ranked and shown at their latest
+    buffered positions.
     """
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CaregiverPagination
+    max_k = 500
 
-    def haversine_m(self, lat1, lon1, lat2, lon2):
-        """Return distance in meters between two lat/lon points."""
-        # convert decimal degrees to radians
-        rlat1, rlon1, rlat2, rlon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        dlon = rlon2 - rlon1
-        dlat = rlat2 - rlat1
-        a = math.sin(dlat/2)**2 + math.cos(rlat1) * math.cos(rlat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        R = 6371000.0  # meters
-        return R * c
+    def get_queryset(self):
+        qs = User.objects.filter(role='caregiver').order_by('id')
+        term = self.request.query_params.get('search')
+        if term:
+            qs = search.matching(qs, term)
+        return with_user_relations(qs)
 
     def list(self, request, *args, **kwargs):
-        qs = User.objects.filter(role='caregiver')
-        search = request.query_params.get('search')
-        if search:
-            qs = qs.filter(Q(first_name__icontains=search) | Q(last_name__icontains=search) | Q(email__icontains=search))
-
-        # Proximity filtering
-        patient_lat = request.query_params.get('patient_lat')
-        patient_lng = request.query_params.get('patient_lng')
-        max_distance = request.query_params.get('max_distance')  # meters
-
-        caregivers = list(qs)
-        if patient_lat and patient_lng:
-            try:
-                plat = float(patient_lat)
-                plng = float(patient_lng)
-            except ValueError:
-                plat = plng = None
-            if plat is not None and plng is not None:
-                # compute distances for those with known coords
-                filtered = []
-                for u in caregivers:
-                    if u.latitude is not None and u.longitude is not None:
-                        try:
-                            d = self.haversine_m(plat, plng, float(u.latitude), float(u.longitude))
-                            u._distance_meters = d
-                            filtered.append(u)
-                        except Exception:
-                            pass
-                # apply max distance if given
-                try:
-                    if max_distance is not None:
-                        md = float(max_distance)
-                        filtered = [u for u in filtered if getattr(u, '_distance_meters', 0) <= md]
-                except ValueError:
-                    pass
-                # sort by distance
-                filtered.sort(key=lambda x: getattr(x, '_distance_meters', float('inf')))
-                caregivers = filtered
-
-        serializer = self.get_serializer(caregivers, many=True)
-        return Response(serializer.data)
+        qs = self.get_queryset()
+        params = request.query_params
+        try:
+            plat = float(params.get('patient_lat'))
+            plng = float(params.get('patient_lng'))
+        except (TypeError, ValueError):
+            plat = plng = None
+        fixes = location_buffer.pending() if location_buffer.enabled() else {}
+        if plat is None or plng is None:
+            page = self._with_fixes(self.paginate_queryset(qs), fixes)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        try:
+            max_distance = float(params['max_distance']) if params.get('max_distance') else None
+        except ValueError:
+            max_distance = None
+        try:
+            k = min(int(params['k']), self.max_k) if params.get('k') else None
+        except ValueError:
+            k = None
+        if k is not None and k < 1:
+            k = None
+
+        # Rank (pk, distance) pairs, then load only the requested page of caregivers
+        moved = {pk: (lat, lng) for pk, (lat, lng, _) in fixes.items()}
+        ranked = geo.nearest(qs, plat, plng, max_distance=max_distance, k=k, moved=moved)
+        page = self.paginate_queryset(ranked)
+        caregivers = qs.in_bulk([pk for pk, _ in page])
+        results = []
+        for pk, distance in page:
+            caregiver = caregivers[pk]
+            caregiver._distance_meters = distance
+            results.append(caregiver)
+        results = self._with_fixes(results, fixes)
+        return self.get_paginated_response(self.get_serializer(results, many=True).data)
+
+    @staticmethod
+    def _with_fixes(caregivers, fixes):
+        """Show buffered (not yet saved) locations instead of the stored ones."""
+        for caregiver in caregivers:
+            if caregiver.pk in fixes:
+                caregiver.latitude, caregiver.longitude, caregiver.location_updated_at = fixes[caregiver.pk]
+        return caregivers
+
+
+class PeopleSearchPagination(PageNumberPagination):
+    """
+    Short pages with next/previous links but no total count: counting every
+    match of a one-letter query costs more than ranking the page itself.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 25
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        try:
+            self.number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except ValueError:
+            self.number = 1
+        offset = (self.number - 1) * size
+        rows = list(queryset[offset:offset + size + 1])
+        self.has_next = len(rows) > size
+        return rows[:size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data})
+
+
+class PeopleSearchView(generics.ListAPIView):
+    """
+    Typeahead search for people by name or email (?q=, optional ?role=).
+
+    Every word of q must start a word of the first name, last name or email
+    ("jo do" finds John Doe), best matches first; see accounts.search for the
+    index behind it. Results are short pages of compact rows. Admins can find
+    everyone; other users find doctors, caregivers and the patients the
+    patient list shows them (a doctor's own patients).
+    """
+    serializer_class = UserSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PeopleSearchPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = User.objects.only(*UserSearchResultSerializer.Meta.fields)
+        if user.role != 'admin':
+            patients = Q(role='patient', doctor=user) if user.role == 'doctor' else Q(role='patient')
+            qs = qs.filter(Q(role__in=['doctor', 'caregiver']) | patients)
+        role = self.request.query_params.get('role')
+        if role:
+            qs = qs.filter(role=role)
+        return search.matching(qs, self.request.query_params.get('q', ''))
 
 
 class MeLocationView(APIView):
@@ -874,16 +914,83 @@ class MeLocationView(APIView):
         lng = request.data.get('longitude')
         if lat is None or lng is None:
             return Response({'detail': 'latitude and longitude are required'}, status=status.HTTP_400_BAD_REQUEST)
+        # Only caregivers' movements are kept as location history (CaregiverTrackView)
+        track = request.user.role == 'caregiver'
         try:
+            if location_buffer.enabled():
+                # Write-behind: the fix is persisted by the next buffer flush
+                location_buffer.push(request.user.pk, float(lat), float(lng), timezone.now(), track=track)
+                return Response({'detail': 'Location updated'})
             request.user.latitude = float(lat)
             request.user.longitude = float(lng)
             request.user.location_updated_at = timezone.now()
             request.user.save(update_fields=['latitude', 'longitude', 'location_updated_at'])
+            if track:
+                LocationPing.objects.create(
+                    user=request.user, latitude=request.user.latitude, longitude=request.user.longitude,
+                    recorded_at=request.user.location_updated_at,
+                )
             return Response({'detail': 'Location updated'})
         except Exception as e:
             return Response({'detail': f'Invalid coordinates: {e}'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CaregiverTrackView(APIView):
+    """
+    A caregiver's location history, for admins and the caregiver themself.
+
+    GET /api/accounts/caregivers/<pk>/track/?start=&end=&resolution=
+    start/end are ISO datetimes or dates (default: the last 24 hours) and
+    resolution is the window per point in seconds, coarsened so a track never
+    exceeds location_history.MAX_TRACK_POINTS points.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        if request.user.role != 'admin' and request.user.pk != pk:
+            return Response({'detail': 'Not allowed'}, status=status.HTTP_403_FORBIDDEN)
+        if not User.objects.filter(pk=pk, role='caregiver').exists():
+            return Response({'detail': 'Caregiver not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        end = self._parse_moment(params.get('end')) if params.get('end') else timezone.now()
+        start = self._parse_moment(params.get('start')) if params.get('start') else end - timedelta(days=1)
+        if start is None or end is None:
+            return Response({'detail': 'Invalid start/end. Expected an ISO datetime or YYYY-MM-DD.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if start >= end:
+            return Response({'detail': 'start must be before end.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            resolution = int(params.get('resolution') or 0)
+        except ValueError:
+            return Response({'detail': 'resolution must be a number of seconds.'}, status=status.HTTP_400_BAD_REQUEST)
+        resolution = max(resolution, location_history.min_resolution(start, end))
+
+        points = location_history.track(pk, start, end, resolution)
+        return Response({
+            'caregiver': pk,
+            'start': start,
+            'end': end,
+            'resolution': resolution,
+            'count': len(points),
+            'points': points,
+        })
+
+    @staticmethod
+    def _parse_moment(value):
+        from django.utils.dateparse import parse_date, parse_datetime
+        try:
+            moment = parse_datetime(value)
+            if moment is None:
+                day = parse_date(value)
+                moment = datetime.combine(day, time()) if day else None
+        except ValueError:
+            return None
+        if moment is not None and timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+
 class ScopedRateThrottle(throttling.SimpleRateThrottle):
     """
     Base class for scoped rate throttling.
@@ -1095,23 +1202,15 @@ class GoogleAuthView(APIView):
                 user = User.objects.get(email=email)
                 # User exists, just login
             except User.DoesNotExist:
-                # Create new user
-                username = email.split('@')[0]
-                # Ensure unique username
-                base_username = username
-                counter = 1
-                while User.objects.filter(username=username).exists():
-                    username = f"{base_username}{counter}"
-                    counter += 1
-                
-                user = User.objects.create_user(
+                # Create new user with a unique username
+                user = create_with_username(email, lambda username: User.objects.create_user(
                     username=username,
                     email=email,
                     first_name=first_name,
                     last_name=last_name,
                     role=role,
                     is_active=True
-                )
+                ))
                 # Set unusable password for Google auth users
                 user.set_unusable_password()
                 user.save()
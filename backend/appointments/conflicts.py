@@ -0,0 +1,157 @@
+"""
+Double-booking checks for appointments.
+
+An appointment occupies its provider (Appointment.doctor, a doctor or a
+caregiver) from its date and time for duration_minutes. Two active
+appointments (Appointment.ACTIVE_STATUSES) of one provider must not overlap;
+back-to-back ones (09:00-09:30, then 09:30) are fine.
+
+find_conflicts() checks any number of proposed appointments at once (new
+ones, or existing ones with a changed slot):
+
+- one range query reads the providers' active bookings through the
+  (doctor, date, time) index, from MAX_DURATION_MINUTES before the earliest
+  proposal (a booking can run past midnight) to the end of the latest;
+- per provider, the bookings sorted by start are an interval index: as none
+  lasts longer than MAX_DURATION_MINUTES, the ones that can overlap a slot
+  are a bisected range of it;
+- proposals are checked the same way against each other, so a whole
+  proposed schedule can be validated in one go.
+
+Check and save inside booking_lock(), which locks the providers' user rows
+(SELECT ... FOR UPDATE) so that concurrent bookings for the same provider
+take turns and cannot both pass the check. SQLite has no row locks: there,
+writing transactions are serialized by the database lock and the second of
+two concurrent bookings fails instead.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Appointment
+
+# The fields of an appointment that decide whether it clashes
+SLOT_FIELDS = ('doctor', 'date', 'time', 'duration_minutes', 'status')
+_LONGEST = timedelta(minutes=Appointment.MAX_DURATION_MINUTES)
+
+
+class Conflict(NamedTuple):
+    """appointment (a proposal) overlaps other: a booking, or an earlier proposal."""
+    appointment: Appointment
+    other: Appointment
+
+
+def span(appointment):
+    """(start, end) datetimes of appointment."""
+    start = datetime.combine(appointment.date, appointment.time)
+    return start, start + timedelta(minutes=appointment.duration_minutes)
+
+
+class _Schedule:
+    """One provider's appointments, sorted by start."""
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []
+
+    def add(self, appointment):
+        start, end = span(appointment)
+        at = bisect_right(self.starts, start)
+        self.starts.insert(at, start)
+        self.entries.insert(at, (end, appointment))
+
+    def overlapping(self, start, end):
+        """Appointments overlapping [start, end), by start."""
+        # Starting earlier than start - _LONGEST, they end by start
+        low = bisect_right(self.starts, start - _LONGEST)
+        high = bisect_left(self.starts, end)
+        return [appointment for other_end, appointment in self.entries[low:high] if other_end > start]
+
+
+def proposed(instance, changes):
+    """
+    The appointment as it would be saved: instance (None for a new one) with
+    changes (e.g. a serializer's validated_data) applied to its slot fields.
+    """
+    slot = {name: getattr(instance, name) for name in SLOT_FIELDS} if instance else {}
+    slot.update((name, changes[name]) for name in SLOT_FIELDS if name in changes)
+    return Appointment(pk=instance.pk if instance else None, **slot)
+
+
+def takes_new_time(instance, appointment):
+    """
+    Whether saving appointment (see proposed()) over the stored instance
+    occupies time it did not hold: a new booking, a moved or longer slot, or
+    one made active again. Other edits (notes, scheduled -> in progress) are
+    not checked, so bookings that overlapped before this check existed stay
+    editable.
+    """
+    if instance is None:
+        return True
+    if (instance.doctor_id, instance.date, instance.time, instance.duration_minutes) != (
+            appointment.doctor_id, appointment.date, appointment.time, appointment.duration_minutes):
+        return True
+    active = Appointment.ACTIVE_STATUSES
+    return appointment.status in active and instance.status not in active
+
+
+def find_conflicts(appointments):
+    """
+    Conflicts of the proposed appointments with their providers' active
+    bookings and with each other, in proposal order. Bookings being changed
+    (proposals with a pk) count at their proposed slot only.
+    """
+    active = [appointment for appointment in appointments if appointment.status in Appointment.ACTIVE_STATUSES]
+    if not active:
+        return []
+    spans = [span(appointment) for appointment in active]
+    booked = (
+        Appointment.objects
+        .filter(
+            doctor_id__in={appointment.doctor_id for appointment in active},
+            date__range=(
+                (min(start for start, _ in spans) - _LONGEST).date(),
+                max(end for _, end in spans).date(),
+            ),
+            status__in=Appointment.ACTIVE_STATUSES,
+        )
+        .exclude(pk__in=[appointment.pk for appointment in appointments if appointment.pk])
+        .only(*SLOT_FIELDS)
+        .order_by()
+    )
+    schedules = defaultdict(_Schedule)
+    for appointment in booked:
+        schedules[appointment.doctor_id].add(appointment)
+    earlier = defaultdict(_Schedule)
+    conflicts = []
+    for appointment, (start, end) in zip(active, spans):
+        for schedule in (schedules[appointment.doctor_id], earlier[appointment.doctor_id]):
+            conflicts.extend(Conflict(appointment, other) for other in schedule.overlapping(start, end))
+        earlier[appointment.doctor_id].add(appointment)
+    return conflicts
+
+
+def describe(conflict):
+    """A message for a conflict, for API errors."""
+    start, end = span(conflict.other)
+    return f'Already booked on {start:%Y-%m-%d} from {start:%H:%M} to {end:%H:%M}.'
+
+
+@contextmanager
+def booking_lock(provider_ids):
+    """
+    A transaction holding the row locks of the providers' users; check and
+    save bookings for them inside it.
+    """
+    with transaction.atomic():
+        # In id order, so that two multi-provider bookings cannot deadlock
+        list(
+            get_user_model().objects.select_for_update()
+            .filter(pk__in=set(provider_ids)).order_by('pk').values_list('pk', flat=True)
+        )
+        yield
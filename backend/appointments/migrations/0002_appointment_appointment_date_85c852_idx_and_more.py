@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-17 06:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date'], name='appointment_date_85c852_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['created_at'], name='appointment_created_5f1d98_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-17 07:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_appointment_appointment_date_85c852_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'time'], name='appointment_doctor__111942_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'date', 'time'], name='appointment_patient_2fc0fe_idx'),
+        ),
+    ]
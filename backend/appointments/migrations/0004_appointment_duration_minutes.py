@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-17 07:06
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_appointment_appointment_doctor__111942_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=60, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(720)]),
+        ),
+    ]
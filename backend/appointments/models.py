@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 
 User = settings.AUTH_USER_MODEL
 
@@ -13,10 +14,18 @@ class Appointment(models.Model):
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
     ]
+    # Appointments that occupy their doctor's (or caregiver's) time; see appointments.conflicts
+    ACTIVE_STATUSES = ('scheduled', 'in-progress')
+    DEFAULT_DURATION_MINUTES = 60
+    MAX_DURATION_MINUTES = 12 * 60
     patient = models.ForeignKey(User, related_name='patient_appointments', on_delete=models.CASCADE)
     doctor = models.ForeignKey(User, related_name='doctor_appointments', on_delete=models.CASCADE)
     date = models.DateField()
     time = models.TimeField()
+    duration_minutes = models.PositiveSmallIntegerField(
+        default=DEFAULT_DURATION_MINUTES,
+        validators=[MinValueValidator(5), MaxValueValidator(MAX_DURATION_MINUTES)],
+    )
     type = models.CharField(max_length=100)
     notes = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
@@ -25,6 +34,14 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            # Live "today onwards" and "booked today" counts on the admin dashboard (accounts.analytics)
+            models.Index(fields=['date']),
+            models.Index(fields=['created_at']),
+            # A doctor's or patient's day in time order (appointments.views.TodayAppointmentsView)
+            models.Index(fields=['doctor', 'date', 'time']),
+            models.Index(fields=['patient', 'date', 'time']),
+        ]
 
     def __str__(self):
         return f"{self.date} {self.time} {self.patient} with {self.doctor}"
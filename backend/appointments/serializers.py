@@ -1,6 +1,9 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from .models import Appointment
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -24,4 +27,49 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
-        fields = ['id', 'date', 'time', 'type', 'notes', 'status', 'patient', 'doctor', 'patient_id', 'doctor_id', 'video_link']
+        fields = ['id', 'date', 'time', 'duration_minutes', 'type', 'notes', 'status', 'patient', 'doctor', 'patient_id', 'doctor_id', 'video_link']
+
+
+class ScheduleSlotSerializer(serializers.Serializer):
+    """
+    One slot of a proposed schedule (POST /api/appointments/validate-schedule/).
+    id: an existing appointment to move to this slot; omitted for a new booking.
+    """
+    id = serializers.IntegerField(required=False)
+    doctor_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(role__in=['doctor', 'caregiver']), source='doctor')
+    date = serializers.DateField()
+    time = serializers.TimeField()
+    duration_minutes = serializers.IntegerField(
+        min_value=5, max_value=Appointment.MAX_DURATION_MINUTES, default=Appointment.DEFAULT_DURATION_MINUTES,
+    )
+
+
+class FreeSlotQuerySerializer(serializers.Serializer):
+    """Query parameters of GET /api/appointments/free-slots/ (appointments.slots)."""
+    MAX_DAYS = 31
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    duration = serializers.IntegerField(
+        min_value=5, max_value=Appointment.MAX_DURATION_MINUTES, default=Appointment.DEFAULT_DURATION_MINUTES,
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    doctor = serializers.ListField(child=serializers.IntegerField(), required=False)
+    specialization = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('start', timezone.localdate())
+        attrs.setdefault('end', attrs['start'] + timedelta(days=13))
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({'end': 'Must not be before start.'})
+        if (attrs['end'] - attrs['start']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({'end': f'Search at most {self.MAX_DAYS} days at a time.'})
+        return attrs
+
+
+class FreeSlotSerializer(serializers.Serializer):
+    """A free slot; date, time and duration_minutes can be posted as a booking."""
+    doctor = UserSimpleSerializer()
+    date = serializers.DateField()
+    time = serializers.TimeField()
+    duration_minutes = serializers.IntegerField()
@@ -0,0 +1,159 @@
+"""
+Free-slot search across doctors.
+
+A free slot is a start time on the settings.APPOINTMENT_SLOT_MINUTES grid,
+within the bookable hours of a bookable weekday (APPOINTMENT_DAY_START/_END,
+APPOINTMENT_WEEKDAYS), from which the doctor has no active booking for the
+requested duration (the same overlap rule as appointments.conflicts).
+
+free_slots() reads the bookings of all candidate doctors with one query
+grouped by doctor, through the (doctor, date, time) index: each doctor's
+bookings come back as a single text of "date time minutes" items, so a
+few hundred doctors cost a few hundred rows, however busy their calendars.
+Per doctor, the items are sorted, then parsed and merged into busy
+intervals lazily by a sweep that walks the days and yields the grid starts
+in the gaps. The doctors' sweeps are merged with a heap, so finding the
+earliest N slots only parses each calendar as far as needed.
+
+Bookings are read in windows of days from the start of the range, each
+twice as long as the one before: the next window is only read (and swept)
+when the days so far did not have N free slots, so a search over a long
+horizon usually costs one query for its first days, and at most a few
+queries reading each booking about once.
+"""
+import heapq
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import Aggregate, CharField, TextField, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .models import Appointment
+
+# Days of bookings read by the first query; each further window is twice as long
+FIRST_WINDOW_DAYS = 7
+_LONGEST = timedelta(minutes=Appointment.MAX_DURATION_MINUTES)
+
+
+class Slot(NamedTuple):
+    doctor_id: int
+    start: datetime
+    end: datetime
+
+
+class _Joined(Aggregate):
+    """The group's values joined by commas (GROUP_CONCAT; STRING_AGG on PostgreSQL)."""
+    function = 'GROUP_CONCAT'
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function='STRING_AGG', template="%(function)s(%(expressions)s, ',')",
+            **extra_context,
+        )
+
+
+def _booking_items(doctor_ids, first: date, last: date):
+    """Active bookings of doctor_ids dated first..last: doctor id -> "date time minutes" items."""
+    rows = (
+        Appointment.objects
+        .filter(doctor_id__in=doctor_ids, date__range=(first, last), status__in=Appointment.ACTIVE_STATUSES)
+        .values('doctor_id')
+        .annotate(items=_Joined(Concat(
+            Cast('date', CharField()), Value(' '), Cast('time', CharField()), Value(' '),
+            Cast('duration_minutes', CharField()), output_field=TextField(),
+        )))
+        .order_by()
+    )
+    return {row['doctor_id']: row['items'].split(',') for row in rows}
+
+
+def _intervals(items):
+    """(start, end) datetimes of booking items, parsed as they are consumed."""
+    for item in items:
+        at, _, minutes = item.rpartition(' ')
+        start = datetime.fromisoformat(at)
+        yield start, start + timedelta(minutes=int(minutes))
+
+
+def _busy(intervals):
+    """Merge (start, end) pairs in start order into disjoint busy intervals."""
+    start = end = None
+    for next_start, next_end in intervals:
+        if end is not None and next_start <= end:
+            end = max(end, next_end)
+            continue
+        if end is not None:
+            yield start, end
+        start, end = next_start, next_end
+    if end is not None:
+        yield start, end
+
+
+def _sweep(busy, days, duration, not_before):
+    """Free grid starts on days, in time order, around the busy intervals (in time order)."""
+    step = timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+    opens, closes = time.fromisoformat(settings.APPOINTMENT_DAY_START), time.fromisoformat(settings.APPOINTMENT_DAY_END)
+    busy = iter(busy)
+    current = next(busy, None)
+    for day in days:
+        day_open, close = datetime.combine(day, opens), datetime.combine(day, closes)
+        cursor = day_open
+        if cursor < not_before:
+            cursor += -((day_open - not_before) // step) * step
+        while cursor + duration <= close:
+            while current is not None and current[1] <= cursor:
+                current = next(busy, None)
+            if current is not None and current[0] < cursor + duration:
+                # To the first grid start at or after the end of this interval
+                cursor += -((cursor - current[1]) // step) * step
+                continue
+            yield cursor
+            cursor += step
+
+
+def _bookable_days(first, last):
+    weekdays = set(settings.APPOINTMENT_WEEKDAYS)
+    day = first
+    while day <= last:
+        if day.weekday() in weekdays:
+            yield day
+        day += timedelta(days=1)
+
+
+def _tagged(doctor_id, starts):
+    for start in starts:
+        yield start, doctor_id
+
+
+def _window_slots(doctor_ids, first, last, duration, limit, not_before):
+    """The earliest limit free slots starting on the dates first..last; one query."""
+    # Bookings running into the first day start up to _LONGEST before it
+    items = _booking_items(doctor_ids, (datetime.combine(first, time.min) - _LONGEST).date(), last)
+    days = list(_bookable_days(first, last))
+    merged = heapq.merge(*(
+        _tagged(doctor_id, _sweep(_busy(_intervals(sorted(items.get(doctor_id, ())))), days, duration, not_before))
+        for doctor_id in doctor_ids
+    ))
+    return [Slot(doctor_id, start, start + duration) for start, doctor_id in islice(merged, limit)]
+
+
+def free_slots(doctor_ids, first, last, duration_minutes, limit):
+    """
+    The earliest limit free slots of duration_minutes of any of doctor_ids,
+    starting between the dates first and last (inclusive) and not in the past,
+    by start time then doctor id.
+    """
+    doctor_ids = sorted(doctor_ids)
+    duration = timedelta(minutes=duration_minutes)
+    not_before = timezone.localtime().replace(tzinfo=None)
+    found = []
+    window_first, window_days = first, FIRST_WINDOW_DAYS
+    while doctor_ids and window_first <= last and len(found) < limit:
+        window_last = min(last, window_first + timedelta(days=window_days - 1))
+        found += _window_slots(doctor_ids, window_first, window_last, duration, limit - len(found), not_before)
+        window_first, window_days = window_last + timedelta(days=1), window_days * 2
+    return found
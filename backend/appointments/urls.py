@@ -12,5 +12,6 @@ router.register(r'', AppointmentViewSet, basename='appointment')
 
 # urlpatterns = 
 urlpatterns = [
-    path('today/', views.today_appointments, name='today-appointments'),
+    path('today/', views.TodayAppointmentsView.as_view(), name='today-appointments'),
+    path('free-slots/', views.FreeSlotsView.as_view(), name='free-slots'),
 ] + router.urls
\ No newline at end of file
@@ -1,29 +1,104 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from datetime import date
+from rest_framework.views import APIView
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from accounts.stats_cache import TODAY_APPOINTMENTS
+from requestsapp.models import CareRequest
+from . import slots
 from .models import Appointment
-from .serializers import AppointmentSerializer
+from .serializers import AppointmentSerializer, FreeSlotQuerySerializer, FreeSlotSerializer
 
-# ...existing code...
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def today_appointments(request):
+class TodayAppointmentsView(generics.ListAPIView):
     """
-    Returns a list of today's appointments for the authenticated doctor.
+    The caller's appointments for today, by time (paginated).
+    - Doctors see the appointments they hold, patients their own.
+    - Caregivers see those of the patients they have an active care request for.
+    - Admins see every appointment of the day.
+
+    The list is cached per user for the day and dropped when one of its
+    appointments (or a caregiver's care request) changes; see
+    accounts.stats_cache and accounts.signals.
+    """
+    serializer_class = AppointmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = Appointment.objects.filter(date=timezone.localdate()).select_related('patient', 'doctor')
+        # Read through the (doctor, date, time) and (patient, date, time) indexes
+        if user.role == 'doctor':
+            qs = qs.filter(doctor=user)
+        elif user.role == 'patient':
+            qs = qs.filter(patient=user)
+        elif user.role == 'caregiver':
+            qs = qs.filter(patient__in=CareRequest.objects.filter(
+                caregiver=user, status__in=CareRequest.ACTIVE_STATUSES,
+            ).values('patient'))
+        elif user.role != 'admin':
+            return qs.none()
+        return qs.order_by('time', 'id')
+
+    def list(self, request, *args, **kwargs):
+        user = request.user
+        key = 'all' if user.role == 'admin' else f'{user.role}:{user.pk}'
+        rows = TODAY_APPOINTMENTS.get(
+            key,
+            lambda: list(self.get_serializer(self.get_queryset(), many=True).data),
+            variant=timezone.localdate().isoformat(),
+        )
+        return self.get_paginated_response(self.paginate_queryset(rows))
+
+
+class FreeSlotsView(APIView):
     """
-    user = request.user
-    today = date.today()
-    # Filter by doctor if your model has a doctor field, otherwise return all
-    qs = Appointment.objects.filter(date=today)
-    # If you want to filter by doctor:
-    # qs = Appointment.objects.filter(date=today, doctor=user)
-    serializer = AppointmentSerializer(qs, many=True)
-    return Response(serializer.data)
+    The earliest free slots across doctors (appointments.slots).
+
+    Query parameters: start and end dates (default: today and the next 13
+    days, at most 31 days), duration in minutes, limit, and optionally the
+    doctors to search (doctor=1&doctor=2 or doctor=1,2) and/or a
+    specialization; by default every active doctor.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        data = params.dict()
+        if 'doctor' in params:
+            data['doctor'] = [pk for value in params.getlist('doctor') for pk in value.split(',') if pk]
+        query = FreeSlotQuerySerializer(data=data)
+        query.is_valid(raise_exception=True)
+        options = query.validated_data
+        doctors = self.doctors(options.get('doctor'), options.get('specialization'))
+        found = slots.free_slots(doctors, options['start'], options['end'], options['duration'], options['limit'])
+        results = [
+            {'doctor': doctors[slot.doctor_id], 'date': slot.start.date(), 'time': slot.start.time(),
+             'duration_minutes': options['duration']}
+            for slot in found
+        ]
+        return Response({'results': FreeSlotSerializer(results, many=True).data})
+
+    def doctors(self, ids, specialization):
+        """Active doctors by id, limited to ids and to those listing specialization (case-insensitive)."""
+        qs = get_user_model().objects.filter(role='doctor', is_active=True).only(
+            'id', 'email', 'role', 'first_name', 'last_name', 'specializations',
+        )
+        if ids is not None:
+            qs = qs.filter(pk__in=ids)
+        if specialization:
+            # Narrowed on the JSON text, then matched exactly against the list
+            wanted = specialization.strip().casefold()
+            qs = qs.filter(specializations__icontains=wanted)
+            return {doctor.pk: doctor for doctor in qs
+                    if any(str(name).strip().casefold() == wanted for name in doctor.specializations or [])}
+        return {doctor.pk: doctor for doctor in qs}
 from rest_framework import viewsets, permissions
+from rest_framework.exceptions import ValidationError
+from . import conflicts
 from .models import Appointment
-from .serializers import AppointmentSerializer
+from .serializers import AppointmentSerializer, ScheduleSlotSerializer
 from .permissions import IsDoctorOrOwner
 
 class IsParticipant(permissions.BasePermission):
@@ -81,7 +156,29 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def join_video(self, request, pk=None):
         return self.join_video(request, pk)
-    queryset = Appointment.objects.all()
+
+    @action(detail=False, methods=['post'], url_path='validate-schedule')
+    def validate_schedule(self, request):
+        """
+        Check a whole proposed schedule (a list of slots) against the bookings
+        and itself in one go; nothing is saved. Each conflict names the slot
+        (its index) and what it overlaps: a booking or an earlier slot.
+        """
+        slots = ScheduleSlotSerializer(data=request.data, many=True)
+        slots.is_valid(raise_exception=True)
+        proposals = [Appointment(pk=slot.get('id'), **{name: value for name, value in slot.items() if name != 'id'})
+                     for slot in slots.validated_data]
+        index = {id(appointment): i for i, appointment in enumerate(proposals)}
+        found = []
+        for conflict in conflicts.find_conflicts(proposals):
+            other = conflict.other
+            if id(other) in index:
+                clash = {'index': index[id(other)]}
+            else:
+                clash = {'id': other.pk, 'date': other.date, 'time': other.time, 'duration_minutes': other.duration_minutes}
+            found.append({'index': index[id(conflict.appointment)], 'conflicts_with': clash})
+        return Response({'valid': not found, 'conflicts': found})
+    queryset = Appointment.objects.select_related('patient', 'doctor')
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated, IsDoctorOrOwner]
     filterset_fields = ['date', 'status']
@@ -108,4 +205,19 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         # Expect patient_id & doctor_id provided; enforced by serializer fields already.
-        serializer.save()
+        self._save_without_conflicts(serializer)
+
+    def perform_update(self, serializer):
+        self._save_without_conflicts(serializer)
+
+    def _save_without_conflicts(self, serializer):
+        """Save the appointment unless its slot overlaps another booking of its doctor (appointments.conflicts)."""
+        appointment = conflicts.proposed(serializer.instance, serializer.validated_data)
+        if not conflicts.takes_new_time(serializer.instance, appointment):
+            serializer.save()
+            return
+        with conflicts.booking_lock([appointment.doctor_id]):
+            found = conflicts.find_conflicts([appointment])
+            if found:
+                raise ValidationError({'time': [conflicts.describe(conflict) for conflict in found]})
+            serializer.save()
@@ -1,9 +1,18 @@
+from datetime import datetime, time, timedelta
+
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from appointments.models import Appointment
 from .models import SpecificDateAvailability
 
 
+def _end_time(appointment):
+    """When the appointment ends, capped at the end of its day (the block is for that date)."""
+    start = datetime.combine(appointment.date, appointment.time)
+    end = start + timedelta(minutes=appointment.duration_minutes)
+    return end.time() if end.date() == appointment.date else time.max
+
+
 @receiver(post_save, sender=Appointment)
 def create_unavailability_on_appointment(sender, instance, created, **kwargs):
     """
@@ -15,7 +24,7 @@ def create_unavailability_on_appointment(sender, instance, created, **kwargs):
         return
     
     # Only for scheduled or in-progress appointments
-    if instance.status not in ['scheduled', 'in-progress']:
+    if instance.status not in Appointment.ACTIVE_STATUSES:
         return
     
     caregiver = instance.doctor
@@ -29,25 +38,17 @@ def create_unavailability_on_appointment(sender, instance, created, **kwargs):
         # Update existing unavailability
         existing.date = instance.date
         existing.start_time = instance.time
-        # Assume 1-hour appointments if no end time specified
-        from datetime import datetime, timedelta
-        start_dt = datetime.combine(instance.date, instance.time)
-        end_dt = start_dt + timedelta(hours=1)
-        existing.end_time = end_dt.time()
+        existing.end_time = _end_time(instance)
         existing.is_available = False
         existing.reason = f"Appointment: {instance.type}"
         existing.save()
     elif created:
         # Create new unavailability block
-        from datetime import datetime, timedelta
-        start_dt = datetime.combine(instance.date, instance.time)
-        end_dt = start_dt + timedelta(hours=1)
-        
         SpecificDateAvailability.objects.create(
             caregiver=caregiver,
             date=instance.date,
             start_time=instance.time,
-            end_time=end_dt.time(),
+            end_time=_end_time(instance),
             is_available=False,
             reason=f"Appointment: {instance.type}",
             appointment=instance
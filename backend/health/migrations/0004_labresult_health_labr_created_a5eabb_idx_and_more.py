@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-17 06:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0003_alter_vitalreading_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labresult',
+            index=models.Index(fields=['created_at'], name='health_labr_created_a5eabb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='symptomlog',
+            index=models.Index(fields=['created_at'], name='health_symp_created_4b7b45_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitalreading',
+            index=models.Index(fields=['created_at'], name='health_vita_created_a2705f_idx'),
+        ),
+    ]
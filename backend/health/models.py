@@ -23,6 +23,10 @@ class VitalReading(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            # Live "today" counts on the admin dashboard (accounts.analytics)
+            models.Index(fields=['created_at']),
+        ]
 
 class SymptomLog(models.Model):
     """
@@ -37,6 +41,11 @@ class SymptomLog(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
 class LabResult(models.Model):
     """
     Represents a lab test result for a patient.
@@ -48,3 +57,8 @@ class LabResult(models.Model):
     status = models.CharField(max_length=50)
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Medication, MedicationLog, ComplianceFollowUp
+from .models import Medication, MedicationLog, MedicationDailyAdherence, ComplianceFollowUp, ComplianceEvaluationRun
 
 
 class MedicationLogInline(admin.TabularInline):
@@ -11,17 +11,19 @@ class MedicationLogInline(admin.TabularInline):
 
 @admin.register(Medication)
 class MedicationAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'patient', 'frequency', 'remaining_quantity', 'refill_threshold', 'start_date', 'end_date', 'created_at')
+    list_display = ('id', 'name', 'patient', 'frequency', 'remaining_quantity', 'refill_threshold', 'risk_score', 'start_date', 'end_date', 'created_at')
     list_filter = ('frequency', 'start_date', 'end_date', 'created_at')
     search_fields = ('name', 'patient__email', 'patient__username')
     ordering = ('-start_date',)
     date_hierarchy = 'start_date'
     inlines = [MedicationLogInline]
+    readonly_fields = ('risk_score', 'adherence', 'last_taken_at', 'risk_updated_at')
 
     fieldsets = (
         (None, {'fields': ('patient', 'name', 'dosage', 'frequency')}),
         ('Tracking', {'fields': ('total_quantity', 'remaining_quantity', 'refill_threshold', 'start_date', 'end_date')}),
         ('Compliance', {'fields': ('compliance', 'next_due')}),
+        ('Risk snapshot', {'fields': ('risk_score', 'adherence', 'last_taken_at', 'risk_updated_at')}),
     )
 
 
@@ -45,4 +47,19 @@ class ComplianceFollowUpAdmin(admin.ModelAdmin):
         (None, {'fields': ('patient', 'medication', 'reason', 'status')}),
         ('Schedule', {'fields': ('due_at', 'completed_at')}),
         ('Details', {'fields': ('notes', 'risk_score_snapshot', 'appointment', 'created_by')}),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(ComplianceEvaluationRun)
+class ComplianceEvaluationRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'mode', 'started_at', 'finished_at', 'medications_evaluated', 'followups_created')
+    list_filter = ('mode',)
+    ordering = ('-started_at',)
+
+
+@admin.register(MedicationDailyAdherence)
+class MedicationDailyAdherenceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'medication', 'date', 'expected_doses', 'taken_doses', 'first_taken_at', 'last_taken_at')
+    search_fields = ('medication__name', 'medication__patient__email')
+    ordering = ('-date',)
+    date_hierarchy = 'date'
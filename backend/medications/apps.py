@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MedicationsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'medications'
+
+    def ready(self):
+        import medications.signals
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from medications.models import Medication
+from medications.rollup import rebuild_daily_adherence
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the daily adherence rollup from intake logs (migration 0009 fills it for the logs '
+        'stored before the rollup). Run after bulk log imports or schedule changes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient-id', type=int, help='Limit to a specific patient ID')
+        parser.add_argument('--medication-id', type=int, help='Limit to a specific medication ID')
+        parser.add_argument('--days', type=int, help='Only rebuild the last N days (default: full history)')
+
+    def handle(self, *args, **options):
+        qs = Medication.objects.order_by('pk')
+        if options.get('patient_id'):
+            qs = qs.filter(patient_id=options['patient_id'])
+        if options.get('medication_id'):
+            qs = qs.filter(pk=options['medication_id'])
+        start = end = None
+        if options.get('days'):
+            end = timezone.localdate()
+            start = end - timedelta(days=options['days'] - 1)
+
+        medications = rows = 0
+        for medication in qs.iterator(chunk_size=500):
+            rows += rebuild_daily_adherence(medication, start=start, end=end)
+            medications += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rows} daily adherence rows for {medications} medications.'
+        ))
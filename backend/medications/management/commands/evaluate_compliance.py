@@ -1,7 +1,40 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from medications.models import Medication
-from medications.utils import evaluate_and_create_followups_for_medications
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from medications.models import Medication, ComplianceEvaluationRun
+from medications.utils import evaluate_and_create_followups_for_medications, medications_due_for_evaluation
+
+DEFAULT_CHECKPOINT = os.path.join(tempfile.gettempdir(), 'telemed_evaluate_compliance.checkpoint.json')
+
+
+def _init_worker():
+    """Pool initializer: make sure Django is set up in spawned (non-fork) workers."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def evaluate_patient_range(bounds):
+    """
+    Evaluate all medications of patients with lo <= patient_id <= hi.
+    Runs inside a pool worker (or in-process when --workers 1) and returns
+    (bounds, medication count, per-reason counts, elapsed seconds).
+    """
+    lo, hi = bounds
+    started = time.monotonic()
+    qs = Medication.objects.filter(patient_id__gte=lo, patient_id__lte=hi).order_by('patient_id', 'pk')
+    meds = list(qs)
+    counts = evaluate_and_create_followups_for_medications(meds)
+    return bounds, len(meds), counts, time.monotonic() - started
 
 
 class Command(BaseCommand):
@@ -9,11 +42,125 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('--patient-id', type=int, help='Limit to a specific patient ID')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (default: 1, in-process)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Patients per chunk (default: 200)')
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='Checkpoint file used to resume interrupted runs')
+        parser.add_argument('--resume', action='store_true', help='Skip chunks already completed in the checkpoint file')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only evaluate medications changed or crossing a time boundary since the last finished run',
+        )
 
     def handle(self, *args, **options):
-        qs = Medication.objects.select_related('patient')
         if options.get('patient_id'):
-            qs = qs.filter(patient_id=options['patient_id'])
-        result = evaluate_and_create_followups_for_medications(qs)
+            qs = Medication.objects.filter(patient_id=options['patient_id'])
+            result = evaluate_and_create_followups_for_medications(qs)
+            created_total = sum(result.values())
+            self.stdout.write(self.style.SUCCESS(f'Compliance evaluation complete. Created {created_total} follow-ups. Details: {result}'))
+            return
+
+        last_run = (
+            ComplianceEvaluationRun.objects.filter(finished_at__isnull=False)
+            .order_by('-started_at')
+            .first()
+        )
+        if options['incremental'] and last_run is not None:
+            self._handle_incremental(last_run.started_at)
+            return
+        if options['incremental']:
+            self.stdout.write('No finished run recorded yet; running a full evaluation.')
+
+        checkpoint_path = options['checkpoint']
+        state = self._load_checkpoint(checkpoint_path) if options['resume'] else None
+        if state is None:
+            state = {'started_at': timezone.now().isoformat(), 'completed': [], 'counts': {}}
+        done = [tuple(b) for b in state['completed']]
+
+        chunks = [
+            bounds for bounds in self._patient_chunks(options['chunk_size'])
+            if not any(lo <= bounds[0] and bounds[1] <= hi for lo, hi in done)
+        ]
+        if done:
+            self.stdout.write(f'Resuming run started {state["started_at"]}: {len(done)} chunks already done.')
+        self.stdout.write(f'Evaluating {len(chunks)} chunks with {options["workers"]} worker(s).')
+
+        run = ComplianceEvaluationRun.objects.create(
+            mode=ComplianceEvaluationRun.Mode.FULL,
+            started_at=parse_datetime(state['started_at']) or timezone.now(),
+        )
+        evaluated = 0
+        started = time.monotonic()
+        for i, (bounds, n_meds, counts, elapsed) in enumerate(self._run(chunks, options['workers']), start=1):
+            for reason, n in counts.items():
+                state['counts'][reason] = state['counts'].get(reason, 0) + n
+            evaluated += n_meds
+            state['completed'].append(list(bounds))
+            self._write_checkpoint(checkpoint_path, state)
+            self.stdout.write(
+                f'  chunk {i}/{len(chunks)} patients {bounds[0]}-{bounds[1]}: '
+                f'{n_meds} medications, {sum(counts.values())} follow-ups in {elapsed:.2f}s'
+            )
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        result = state['counts']
         created_total = sum(result.values())
-        self.stdout.write(self.style.SUCCESS(f'Compliance evaluation complete. Created {created_total} follow-ups. Details: {result}'))
+        self._finish_run(run, evaluated, created_total)
+        self.stdout.write(self.style.SUCCESS(
+            f'Compliance evaluation complete in {time.monotonic() - started:.2f}s. '
+            f'Created {created_total} follow-ups. Details: {result}'
+        ))
+
+    def _handle_incremental(self, since):
+        """Evaluate only what may have changed since the previous run's high-water mark."""
+        now = timezone.now()
+        run = ComplianceEvaluationRun.objects.create(mode=ComplianceEvaluationRun.Mode.INCREMENTAL, started_at=now)
+        started = time.monotonic()
+        meds = list(medications_due_for_evaluation(since, now=now).order_by('patient_id', 'pk'))
+        result = evaluate_and_create_followups_for_medications(meds)
+        created_total = sum(result.values())
+        self._finish_run(run, len(meds), created_total)
+        self.stdout.write(self.style.SUCCESS(
+            f'Incremental compliance evaluation since {since.isoformat()} complete in '
+            f'{time.monotonic() - started:.2f}s. Evaluated {len(meds)} medications, '
+            f'created {created_total} follow-ups. Details: {result}'
+        ))
+
+    def _finish_run(self, run, evaluated, created_total):
+        run.finished_at = timezone.now()
+        run.medications_evaluated = evaluated
+        run.followups_created = created_total
+        run.save(update_fields=['finished_at', 'medications_evaluated', 'followups_created'])
+
+    def _patient_chunks(self, chunk_size):
+        """Split the patients that have medications into contiguous patient_id ranges."""
+        patient_ids = list(
+            Medication.objects.order_by('patient_id').values_list('patient_id', flat=True).distinct()
+        )
+        return [
+            (patient_ids[i], patient_ids[min(i + chunk_size, len(patient_ids)) - 1])
+            for i in range(0, len(patient_ids), chunk_size)
+        ]
+
+    def _run(self, chunks, workers):
+        if workers <= 1:
+            for bounds in chunks:
+                yield evaluate_patient_range(bounds)
+            return
+        # Forked workers must not share the parent's open database connections
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            yield from pool.imap_unordered(evaluate_patient_range, chunks)
+
+    def _load_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_checkpoint(self, path, state):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from medications.models import Medication
+from medications.utils import refresh_risk_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored non-compliance risk snapshot (time-based decay). Run periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient-id', type=int, help='Limit to a specific patient ID')
+        parser.add_argument('--batch-size', type=int, default=500, help='Medications per bulk update')
+
+    def handle(self, *args, **options):
+        qs = Medication.objects.order_by('pk')
+        if options.get('patient_id'):
+            qs = qs.filter(patient_id=options['patient_id'])
+        refreshed = refresh_risk_scores(qs, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed risk scores for {refreshed} medications.'))
@@ -0,0 +1,43 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand
+from medications.population import FEATURE_COLUMNS, score_population
+from medications.utils import risk_level_for_score
+
+
+class Command(BaseCommand):
+    help = 'Score every active prescription with the vectorised risk model and export CSV or JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv', help='Output format (default: csv)')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--min-score', type=float, default=0.0, help='Only include scores at or above this value')
+
+    def handle(self, *args, **options):
+        scores = score_population()
+        keep = scores['risk_score'] >= options['min_score']
+        columns = ['medication_id', 'patient_id', 'risk_score', *FEATURE_COLUMNS]
+        rows = []
+        for i in keep.nonzero()[0]:
+            row = {col: scores[col][i].item() for col in columns}
+            row['risk_score'] = round(row['risk_score'], 6)
+            row['risk_level'] = risk_level_for_score(row['risk_score'])
+            rows.append(row)
+
+        out = open(options['output'], 'w', newline='') if options.get('output') else self.stdout
+        try:
+            if options['format'] == 'json':
+                out.write(json.dumps(rows, indent=2))
+                out.write('\n')
+            else:
+                writer = csv.DictWriter(out, fieldnames=[*columns[:3], 'risk_level', *FEATURE_COLUMNS])
+                writer.writeheader()
+                writer.writerows(rows)
+        finally:
+            if out is not self.stdout:
+                out.close()
+        if options.get('output'):
+            self.stdout.write(self.style.SUCCESS(
+                f"Scored {len(scores['risk_score'])} prescriptions; wrote {len(rows)} rows to {options['output']}."
+            ))
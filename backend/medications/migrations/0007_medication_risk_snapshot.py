@@ -0,0 +1,43 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0006_compliancefollowup_appointment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='adherence',
+            field=models.FloatField(default=0.0, help_text='14-day adherence ratio (0-1) at risk_updated_at'),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='last_taken_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='risk_score',
+            field=models.FloatField(default=0.0, help_text='Non-compliance risk (0-1) at risk_updated_at'),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='risk_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['-risk_score'], name='medications_risk_sc_9843ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['patient', '-risk_score'], name='medications_patient_13bf8d_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        ('medications', '0007_medication_risk_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplianceEvaluationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('medications_evaluated', models.IntegerField(default=0)),
+                ('followups_created', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='compliancefollowup',
+            index=models.Index(fields=['status', 'created_at'], name='medications_status_4e61ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compliancefollowup',
+            index=models.Index(fields=['completed_at'], name='medications_complet_b08310_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['updated_at'], name='medications_updated_d61e5a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['last_taken_at'], name='medications_last_ta_4cd0b3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicationlog',
+            index=models.Index(fields=['medication', '-taken_at'], name='medications_medicat_76e218_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicationlog',
+            index=models.Index(fields=['taken_at'], name='medications_taken_a_9e1047_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:43
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_daily_adherence(apps, schema_editor):
+    """
+    Roll up the intake logs already stored, as rollup.rebuild_daily_adherence
+    does (historical models: the MedicationLog signals only cover new logs).
+    Without it existing medications would read no intakes and be flagged.
+    """
+    from django.db.models import Count, Max, Min
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+    from medications.schedule import parse_frequency
+    Medication = apps.get_model('medications', 'Medication')
+    MedicationLog = apps.get_model('medications', 'MedicationLog')
+    MedicationDailyAdherence = apps.get_model('medications', 'MedicationDailyAdherence')
+
+    def day_start(day):
+        return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+    today = timezone.localdate()
+    medications = list(Medication.objects.order_by('pk').values_list('pk', 'frequency', 'start_date'))
+    for i in range(0, len(medications), 500):
+        chunk = medications[i:i + 500]
+        per_day = {}
+        logged = (
+            MedicationLog.objects.filter(medication_id__in=[pk for pk, _, _ in chunk])
+            .annotate(day=TruncDate('taken_at'))
+            .order_by()
+            .values('medication_id', 'day')
+            .annotate(taken=Count('id'), first=Min('taken_at'), last=Max('taken_at'))
+        )
+        for row in logged:
+            per_day.setdefault(row['medication_id'], {})[row['day']] = row
+        rows = []
+        for pk, frequency, start_date in chunk:
+            logs = per_day.get(pk, {})
+            start = min([start_date, *logs])
+            end = max([today, *logs])
+            until = day_start(end + timedelta(days=1)) - timedelta(microseconds=1)
+            expected_by_day = Counter(
+                timezone.localdate(dose)
+                for dose in parse_frequency(frequency).expected_doses(start_date, day_start(start), until)
+            )
+            for day in sorted(set(expected_by_day) | set(logs)):
+                stats = logs.get(day)
+                rows.append(MedicationDailyAdherence(
+                    medication_id=pk,
+                    date=day,
+                    expected_doses=expected_by_day[day],
+                    taken_doses=stats['taken'] if stats else 0,
+                    first_taken_at=stats['first'] if stats else None,
+                    last_taken_at=stats['last'] if stats else None,
+                ))
+        MedicationDailyAdherence.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0008_incremental_compliance_evaluation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicationDailyAdherence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('expected_doses', models.IntegerField(default=0)),
+                ('taken_doses', models.IntegerField(default=0)),
+                ('first_taken_at', models.DateTimeField(blank=True, null=True)),
+                ('last_taken_at', models.DateTimeField(blank=True, null=True)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_adherence', to='medications.medication')),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='medicationdailyadherence',
+            constraint=models.UniqueConstraint(fields=('medication', 'date'), name='unique_medication_daily_adherence'),
+        ),
+        migrations.RunPython(backfill_daily_adherence, migrations.RunPython.noop),
+    ]
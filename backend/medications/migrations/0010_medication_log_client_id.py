@@ -0,0 +1,22 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0009_daily_adherence_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicationlog',
+            name='client_id',
+            field=models.CharField(blank=True, help_text='Client-generated idempotency key for offline intake sync', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='medicationlog',
+            constraint=models.UniqueConstraint(fields=('medication', 'client_id'), name='unique_medication_log_client_id'),
+        ),
+    ]
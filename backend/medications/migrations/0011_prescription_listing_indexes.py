@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0010_medication_log_client_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['patient', '-id'], name='medications_patient_5378b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['patient', 'end_date'], name='medications_patient_3eeb02_idx'),
+        ),
+    ]
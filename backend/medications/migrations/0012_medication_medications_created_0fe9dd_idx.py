@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-17 06:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0011_prescription_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['created_at'], name='medications_created_0fe9dd_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+from .schedule import parse_frequency
 
 User = settings.AUTH_USER_MODEL
 
@@ -24,6 +25,28 @@ class Medication(models.Model):
     end_date = models.DateField(null=True, blank=True, help_text="Expected end date of prescription")
     
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on edits, refills and intake log writes; drives incremental compliance evaluation
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Persisted risk snapshot, kept current by medications.signals on writes
+    # and by the refresh_risk_scores command for time-based decay
+    risk_score = models.FloatField(default=0.0, help_text="Non-compliance risk (0-1) at risk_updated_at")
+    adherence = models.FloatField(default=0.0, help_text="14-day adherence ratio (0-1) at risk_updated_at")
+    last_taken_at = models.DateTimeField(null=True, blank=True)
+    risk_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-risk_score']),
+            models.Index(fields=['patient', '-risk_score']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['last_taken_at']),
+            # Keyset-paginated, per-patient prescription listings
+            models.Index(fields=['patient', '-id']),
+            models.Index(fields=['patient', 'end_date']),
+            # Live "prescribed today" counts on the admin dashboard (accounts.analytics)
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.patient})"
@@ -38,6 +61,11 @@ class Medication(models.Model):
         """Check if medication is completely out"""
         return self.remaining_quantity <= 0
 
+    @property
+    def dose_schedule(self):
+        """Compiled DoseSchedule for `frequency` (parsed once per distinct string)"""
+        return parse_frequency(self.frequency)
+
 
 class MedicationLog(models.Model):
     """Track when patients take their medications"""
@@ -45,14 +73,49 @@ class MedicationLog(models.Model):
     taken_at = models.DateTimeField(default=timezone.now)
     doses_taken = models.IntegerField(default=1, help_text="Number of doses taken")
     notes = models.TextField(blank=True, null=True)
+    client_id = models.CharField(
+        max_length=64, blank=True, null=True,
+        help_text="Client-generated idempotency key for offline intake sync",
+    )
     
     class Meta:
         ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['medication', '-taken_at']),
+            models.Index(fields=['taken_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['medication', 'client_id'], name='unique_medication_log_client_id'),
+        ]
     
     def __str__(self):
         return f"{self.medication.name} - {self.taken_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+class MedicationDailyAdherence(models.Model):
+    """
+    Per-medication, per-day intake rollup.
+    taken_doses counts intake logs on that date; expected_doses is what the
+    dose schedule expected that day. Maintained by medications.signals and
+    rebuilt by the backfill_daily_adherence command.
+    """
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='daily_adherence')
+    date = models.DateField()
+    expected_doses = models.IntegerField(default=0)
+    taken_doses = models.IntegerField(default=0)
+    first_taken_at = models.DateTimeField(null=True, blank=True)
+    last_taken_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['medication', 'date'], name='unique_medication_daily_adherence'),
+        ]
+
+    def __str__(self):
+        return f"{self.medication_id} {self.date}: {self.taken_doses}/{self.expected_doses}"
+
+
 class ComplianceFollowUp(models.Model):
     """A follow-up task created when a patient is at risk of non-compliance, missing doses, or needs a refill."""
     class Status(models.TextChoices):
@@ -88,8 +151,33 @@ class ComplianceFollowUp(models.Model):
 
     class Meta:
         ordering = ['status', 'due_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['completed_at']),
+        ]
 
     def __str__(self):
         med = f" for {self.medication.name}" if self.medication else ""
         return f"Follow-up({self.get_reason_display()}{med}) -> {self.get_status_display()} due {self.due_at:%Y-%m-%d %H:%M}"
 
+
+class ComplianceEvaluationRun(models.Model):
+    """
+    One run of the evaluate_compliance command.
+    The started_at of the last finished run is the high-water mark for incremental runs.
+    """
+    class Mode(models.TextChoices):
+        FULL = 'full', 'Full'
+        INCREMENTAL = 'incremental', 'Incremental'
+
+    mode = models.CharField(max_length=20, choices=Mode.choices)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    medications_evaluated = models.IntegerField(default=0)
+    followups_created = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"ComplianceEvaluationRun({self.mode} @ {self.started_at:%Y-%m-%d %H:%M})"
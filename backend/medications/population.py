@@ -0,0 +1,127 @@
+"""
+Vectorised non-compliance risk scoring for a whole prescription population.
+
+Feature columns are pulled with three queries (medication columns plus the two
+grouped daily-rollup/log aggregates of rollup.log_window_stats) and scored with NumPy using the same weights and rules as
+utils.compute_noncompliance_risk, so results agree with the scalar scorer.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Medication
+from .rollup import log_window_stats
+from .schedule import FIRST_DOSE_TIME, parse_frequency
+from .utils import RISK_WINDOW_DAYS, as_date
+
+_DAY_US = 86_400_000_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+FEATURE_COLUMNS = (
+    'expected_doses', 'actual_logs', 'days_since_last_log',
+    'remaining_quantity', 'refill_threshold', 'days_overdue',
+)
+
+
+def _us(dt) -> int:
+    """Microseconds since the epoch for an aware datetime (exact integer arithmetic)."""
+    delta = dt - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def active_prescriptions(now=None):
+    """Medications that have not passed their end_date."""
+    now = now or timezone.now()
+    return Medication.objects.exclude(end_date__lt=now.date())
+
+
+def population_features(queryset=None, now=None) -> dict:
+    """
+    Return the risk feature columns for every medication in queryset as NumPy arrays
+    (``medication_id``, ``patient_id`` and FEATURE_COLUMNS), in medication id order.
+    """
+    now = now or timezone.now()
+    if queryset is None:
+        queryset = active_prescriptions(now)
+    since = now - timedelta(days=RISK_WINDOW_DAYS)
+
+    rows = list(queryset.order_by('pk').values_list(
+        'pk', 'patient_id', 'frequency', 'start_date', 'remaining_quantity', 'refill_threshold', 'next_due',
+    ))
+    stats = log_window_stats(Q(medication__in=queryset.values('pk')), (RISK_WINDOW_DAYS,), now)
+
+    n = len(rows)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+    patient_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)
+
+    # Expected doses: count of k >= 0 with since <= first + k*interval <= now
+    tz = timezone.get_current_timezone()
+    first_dose_us = {}
+    for start in {as_date(r[3]) for r in rows}:
+        first_dose_us[start] = _us(timezone.make_aware(datetime.combine(start, FIRST_DOSE_TIME), tz))
+    schedules = [parse_frequency(r[2]) for r in rows]
+    prn = np.fromiter((s.prn for s in schedules), dtype=bool, count=n)
+    interval_us = np.fromiter((s.interval // timedelta(microseconds=1) for s in schedules), dtype=np.int64, count=n)
+    first = np.fromiter((first_dose_us[as_date(r[3])] for r in rows), dtype=np.int64, count=n)
+    k_lo = np.maximum(0, -((first - _us(since)) // interval_us))
+    k_hi = (_us(now) - first) // interval_us
+    expected = np.where(prn, 0, np.maximum(0, k_hi - k_lo + 1))
+
+    actual = np.fromiter((stats.get(r[0], {}).get(RISK_WINDOW_DAYS, 0) for r in rows), dtype=np.int64, count=n)
+    last_taken = [stats.get(r[0], {}).get('last_taken_at') for r in rows]
+    has_log = np.fromiter((t is not None for t in last_taken), dtype=bool, count=n)
+    last_us = np.fromiter((_us(t) if t is not None else 0 for t in last_taken), dtype=np.int64, count=n)
+    days_since_last = np.where(has_log, (_us(now) - last_us) // _DAY_US, RISK_WINDOW_DAYS + 1)
+
+    today = now.date().toordinal()
+    days_overdue = np.fromiter(
+        (today - r[6].toordinal() if r[6] else 0 for r in rows), dtype=np.int64, count=n,
+    )
+    return {
+        'medication_id': ids,
+        'patient_id': patient_ids,
+        'expected_doses': expected,
+        'actual_logs': actual,
+        'days_since_last_log': days_since_last,
+        'remaining_quantity': np.fromiter((r[4] for r in rows), dtype=np.int64, count=n),
+        'refill_threshold': np.fromiter((r[5] for r in rows), dtype=np.int64, count=n),
+        'days_overdue': days_overdue,
+    }
+
+
+def score_features(features: dict):
+    """Weighted risk score (0-1) over feature arrays, mirroring utils._risk_from_features."""
+    expected = features['expected_doses'].astype(float)
+    actual = features['actual_logs'].astype(float)
+    adherence = np.where(expected <= 0, 1.0, np.minimum(actual / np.maximum(expected, 1.0), 1.0))
+    adherence_risk = 1 - adherence
+
+    staleness_risk = np.minimum(features['days_since_last_log'] / (RISK_WINDOW_DAYS * 1.5), 1.0)
+
+    remaining = features['remaining_quantity'].astype(float)
+    threshold = features['refill_threshold']
+    refill_risk = np.where(
+        remaining <= 0,
+        1.0,
+        np.clip(1 - (remaining / np.maximum(1, threshold * 2)), 0.0, 1.0),
+    )
+
+    overdue = features['days_overdue']
+    overdue_risk = np.where(overdue > 0, np.minimum(overdue / 7.0, 1.0), 0.0)
+
+    score = (
+        0.4 * adherence_risk +
+        0.3 * staleness_risk +
+        0.2 * refill_risk +
+        0.1 * overdue_risk
+    )
+    return np.clip(score, 0.0, 1.0)
+
+
+def score_population(queryset=None, now=None) -> dict:
+    """Feature arrays for queryset (default: all active prescriptions) plus a ``risk_score`` array."""
+    features = population_features(queryset, now=now)
+    features['risk_score'] = score_features(features)
+    return features
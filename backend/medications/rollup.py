@@ -0,0 +1,164 @@
+"""
+Daily adherence rollup (MedicationDailyAdherence).
+
+One row per medication per local calendar date holds the number of intake logs,
+the first/last intake time and the doses the schedule expected that day. Rows
+are kept current by the MedicationLog signals and rebuilt by the
+backfill_daily_adherence command.
+
+Windowed log counts read whole days from the rollup and only the window's
+partial first day from MedicationLog, so they equal a raw count over
+[now - days, ...] while touching at most `days` rollup rows per medication.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateTimeField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
+from django.utils import timezone
+
+from .models import MedicationDailyAdherence, MedicationLog
+from .utils import as_date
+
+
+def day_start(day) -> datetime:
+    """Aware datetime for local midnight at the start of day."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def expected_doses_on(medication, day) -> int:
+    """Doses the medication's schedule expects on the given local date."""
+    start = day_start(day)
+    until = day_start(day + timedelta(days=1)) - timedelta(microseconds=1)
+    return medication.dose_schedule.count_expected(as_date(medication.start_date), start, until)
+
+
+def expected_doses_by_day(medication, start, end) -> Counter:
+    """Expected doses per local date for dates in [start, end], in one pass over the schedule."""
+    until = day_start(end + timedelta(days=1)) - timedelta(microseconds=1)
+    doses = medication.dose_schedule.expected_doses(as_date(medication.start_date), day_start(start), until)
+    return Counter(timezone.localdate(dose) for dose in doses)
+
+
+def record_intake(medication, taken_at):
+    """
+    Add one intake log to its day's rollup row: an in-place increment when the
+    row exists, otherwise an insert (retried as an increment if a concurrent
+    intake created the row first).
+    """
+    day = timezone.localdate(taken_at)
+    rows = MedicationDailyAdherence.objects.filter(medication_id=medication.pk, date=day)
+    value = Value(taken_at, output_field=DateTimeField())
+    increment = {
+        'taken_doses': F('taken_doses') + 1,
+        'first_taken_at': Least(Coalesce('first_taken_at', value), value),
+        'last_taken_at': Greatest(Coalesce('last_taken_at', value), value),
+    }
+    if rows.update(**increment):
+        return
+    try:
+        with transaction.atomic():
+            MedicationDailyAdherence.objects.create(
+                medication_id=medication.pk,
+                date=day,
+                expected_doses=expected_doses_on(medication, day),
+                taken_doses=1,
+                first_taken_at=taken_at,
+                last_taken_at=taken_at,
+            )
+    except IntegrityError:
+        rows.update(**increment)
+
+
+def rebuild_daily_adherence(medication, start=None, end=None) -> int:
+    """
+    Recompute the rollup rows of one medication for dates in [start, end]
+    (default: from its start_date or first log through today) from its logs.
+    Days with expected doses or logs get a row; returns the number of rows written.
+    """
+    today = timezone.localdate()
+    logs = medication.logs.order_by()
+    if start is None:
+        first_log = logs.order_by('taken_at').values_list('taken_at', flat=True).first()
+        start = as_date(medication.start_date)
+        if first_log is not None:
+            start = min(start, timezone.localdate(first_log))
+    if end is None:
+        end = max(today, timezone.localdate(logs.aggregate(last=Max('taken_at'))['last'] or timezone.now()))
+
+    per_day = {
+        row['day']: row
+        for row in logs.filter(taken_at__gte=day_start(start), taken_at__lt=day_start(end + timedelta(days=1)))
+        .annotate(day=TruncDate('taken_at'))
+        .values('day')
+        .annotate(taken=Count('id'), first=Min('taken_at'), last=Max('taken_at'))
+    }
+    expected_by_day = expected_doses_by_day(medication, start, end)
+    rows = []
+    day = start
+    while day <= end:
+        stats = per_day.get(day)
+        expected = expected_by_day[day]
+        if stats or expected:
+            rows.append(MedicationDailyAdherence(
+                medication_id=medication.pk,
+                date=day,
+                expected_doses=expected,
+                taken_doses=stats['taken'] if stats else 0,
+                first_taken_at=stats['first'] if stats else None,
+                last_taken_at=stats['last'] if stats else None,
+            ))
+        day += timedelta(days=1)
+    with transaction.atomic():
+        MedicationDailyAdherence.objects.filter(medication_id=medication.pk, date__gte=start, date__lte=end).delete()
+        MedicationDailyAdherence.objects.bulk_create(rows)
+    return len(rows)
+
+
+def log_window_stats(medication_filter: Q, windows, now=None) -> dict:
+    """
+    Per-medication log counts for each window (in days) ending now, plus the
+    latest intake time: ``{medication_id: {'last_taken_at': ..., days: count}}``.
+
+    medication_filter selects medications through the ``medication`` relation
+    (e.g. ``Q(medication_id=pk)`` or ``Q(medication__in=queryset)``). Uses two
+    queries: rollup sums for whole days and raw counts for each window's first,
+    partial day.
+    """
+    now = now or timezone.now()
+    starts = {days: now - timedelta(days=days) for days in windows}
+    first_days = {days: timezone.localdate(since) for days, since in starts.items()}
+    partial = {
+        days: Q(taken_at__gte=since, taken_at__lt=day_start(first_days[days] + timedelta(days=1)))
+        for days, since in starts.items()
+    }
+
+    stats = {}
+    rows = (
+        MedicationDailyAdherence.objects.filter(medication_filter)
+        .order_by()
+        .values('medication_id')
+        .annotate(
+            last_taken_at=Max('last_taken_at'),
+            **{f'w{days}': Sum('taken_doses', filter=Q(date__gt=first_days[days])) for days in windows},
+        )
+    )
+    for row in rows:
+        entry = stats.setdefault(row['medication_id'], {'last_taken_at': row['last_taken_at']})
+        for days in windows:
+            entry[days] = row[f'w{days}'] or 0
+    rows = (
+        MedicationLog.objects.filter(medication_filter)
+        .filter(reduce(or_, partial.values()))
+        .order_by()
+        .values('medication_id')
+        .annotate(**{f'w{days}': Count('id', filter=q) for days, q in partial.items()})
+    )
+    for row in rows:
+        entry = stats.setdefault(row['medication_id'], {'last_taken_at': None})
+        for days in windows:
+            entry[days] = entry.get(days, 0) + row[f'w{days}']
+    return stats
@@ -0,0 +1,216 @@
+"""
+Dose schedules compiled from the free-text Medication.frequency.
+
+A schedule is parsed once per distinct frequency string (lru_cache) and then
+used to generate expected dose times, count expected doses in a window and
+match intake logs against those doses in a single pass.
+
+Compliance and adherence divide the intakes logged in a window by
+count_expected(), which is closed-form so that it costs the same for any
+window and can be mirrored by the vectorised population scorer; match_doses()
+gives the missed doses and next_dose_at reported per medication.
+Medication.next_due is entered with the prescription and is not derived here.
+
+Schedules more frequent than MIN_DOSE_INTERVAL are rejected when a frequency
+is saved (is_too_frequent) and clamped to it when parsed, so that rows stored
+before the check cannot make dose generation unbounded.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional
+
+from django.utils import timezone
+
+DAY = timedelta(days=1)
+# First dose of the day; later doses follow every `interval`
+FIRST_DOSE_TIME = time(8, 0)
+MIN_DOSE_INTERVAL = timedelta(minutes=15)
+
+_WORD_NUMBERS = {
+    'once': 1, 'one': 1, 'twice': 2, 'two': 2, 'thrice': 3, 'three': 3,
+    'four': 4, 'five': 5, 'six': 6,
+}
+_ABBREVIATIONS = {
+    'qd': 1, 'od': 1, 'bid': 2, 'bd': 2, 'tid': 3, 'tds': 3, 'qid': 4, 'qds': 4,
+}
+_PRN_PHRASES = ('prn', 'as needed', 'when needed', 'if needed', 'as required')
+_COUNT = r'\b(\d+|' + '|'.join(_WORD_NUMBERS) + r')'
+_NUMBER = r'(\d+(?:\.\d+)?)'
+# Ranges such as "6-8" (hyphens are normalised to spaces), "6 to 8" or "1 or 2"
+_OR = r'(?:\s(?:(?:to|or)\s)?'
+_NUMBER_RANGE = _NUMBER + _OR + _NUMBER + r')?'
+_COUNT_RANGE = _COUNT + _OR + _COUNT + r')?'
+
+
+@dataclass(frozen=True)
+class DoseSchedule:
+    """Compiled dosing frequency: evenly spaced doses every `interval`, or as-needed (PRN)."""
+    times_per_day: float
+    interval: timedelta
+    prn: bool = False
+
+    def expected_doses(self, start_date, since: datetime, until: datetime) -> Iterator[datetime]:
+        """
+        Yield expected dose times in [since, until] for a course that began on start_date.
+        PRN schedules have no expected doses.
+        """
+        if self.prn:
+            return
+        first = self._first_dose(start_date)
+        # Jump straight to the first dose at or after `since`
+        t = first + self.interval * self._doses_before(first, since)
+        while t <= until:
+            yield t
+            t += self.interval
+
+    def count_expected(self, start_date, since: datetime, until: datetime) -> int:
+        """Number of expected_doses() in [since, until], without generating them."""
+        if self.prn:
+            return 0
+        first = self._first_dose(start_date)
+        if until < first:
+            return 0
+        return max(0, (until - first) // self.interval + 1 - self._doses_before(first, since))
+
+    @staticmethod
+    def _first_dose(start_date) -> datetime:
+        return timezone.make_aware(datetime.combine(start_date, FIRST_DOSE_TIME), timezone.get_current_timezone())
+
+    def _doses_before(self, first: datetime, since: datetime) -> int:
+        """Doses from `first` that fall before `since` (ceil of the elapsed intervals)."""
+        return max(0, -((first - since) // self.interval))
+
+
+@dataclass
+class DoseMatch:
+    """Result of matching intake logs against expected doses."""
+    expected: int
+    taken: int
+    missed: List[datetime]
+    next_dose_at: Optional[datetime]
+
+
+def _count(token: str) -> float:
+    return float(_WORD_NUMBERS.get(token, token))
+
+
+def _longest(match) -> float:
+    """Upper end of a matched _NUMBER_RANGE: the longest interval expects the fewest doses."""
+    return max(float(n) for n in match.groups() if n)
+
+
+def _fewest(match) -> float:
+    """Lower end of a matched _COUNT_RANGE."""
+    return min(_count(n) for n in match.groups() if n)
+
+
+def _every(n: float, unit: timedelta) -> DoseSchedule:
+    return DoseSchedule(times_per_day=DAY / unit / n, interval=unit * n)
+
+
+def _per_day(n: float) -> DoseSchedule:
+    return DoseSchedule(times_per_day=n, interval=DAY / n)
+
+
+@lru_cache(maxsize=1024)
+def parse_frequency(frequency: str) -> DoseSchedule:
+    """
+    Parse a free-text frequency such as "twice daily", "every 12 hours", "q8h",
+    "4 hourly", "every 6-8 hours", "3 times a day", "BID", "weekly" or "as needed".
+    Ranges expect the fewest doses they allow. Unknown text means once daily;
+    intervals shorter than MIN_DOSE_INTERVAL are clamped to it.
+    """
+    schedule = _parse(frequency)
+    if not schedule.prn and schedule.interval < MIN_DOSE_INTERVAL:
+        return _every(1, MIN_DOSE_INTERVAL)
+    return schedule
+
+
+def is_too_frequent(frequency: str) -> bool:
+    """Whether frequency asks for doses less than MIN_DOSE_INTERVAL apart."""
+    schedule = _parse(frequency)
+    return not schedule.prn and schedule.interval < MIN_DOSE_INTERVAL
+
+
+def _parse(frequency: str) -> DoseSchedule:
+    f = ' '.join((frequency or '').lower().replace('-', ' ').split())
+
+    if any(phrase in f for phrase in _PRN_PHRASES):
+        return DoseSchedule(times_per_day=0, interval=DAY, prn=True)
+
+    m = re.search(r'(?:every|q)\s*' + _NUMBER_RANGE + r'\s*(?:hours?|hrs?|h)\b', f)
+    if m is None:
+        # "4 hourly", "4 6 hourly"
+        m = re.search(r'\b' + _NUMBER_RANGE + r'\s*(?:hourly|hly)\b', f)
+    if m and _longest(m) > 0:
+        return _every(_longest(m), timedelta(hours=1))
+    if re.search(r'\bhourly\b', f):
+        return _every(1, timedelta(hours=1))
+    m = re.search(r'(?:every|q)\s*' + _NUMBER_RANGE + r'\s*(?:minutes?|mins?)\b', f)
+    if m and _longest(m) > 0:
+        return _every(_longest(m), timedelta(minutes=1))
+    m = re.search(r'every\s*' + _NUMBER_RANGE + r'\s*days?\b', f)
+    if m and _longest(m) > 0:
+        return _every(_longest(m), DAY)
+    if 'every other day' in f or 'alternate day' in f:
+        return _every(2, DAY)
+    m = re.search(r'every\s*' + _NUMBER_RANGE + r'\s*weeks?\b', f)
+    if m and _longest(m) > 0:
+        return _every(7 * _longest(m), DAY)
+    m = re.search(_COUNT_RANGE + r'\s*(?:times|x)?\s*(?:a|per|/)?\s*week', f)
+    if m and _fewest(m) > 0:
+        return _every(7 / _fewest(m), DAY)
+    if 'weekly' in f or re.search(r'\b(?:a|per|every)\s*week\b', f):
+        return _every(7, DAY)
+
+    m = re.search(_COUNT_RANGE + r'\s*(?:times|x)?\s*(?:a|per|/)?\s*(?:day|daily)\b', f)
+    if m and _fewest(m) > 0:
+        return _per_day(_fewest(m))
+    for word, n in _WORD_NUMBERS.items():
+        if re.search(rf'\b{word}\b', f):
+            return _per_day(n)
+    for abbreviation, n in _ABBREVIATIONS.items():
+        if re.search(rf'\b{abbreviation}\b', f):
+            return _per_day(n)
+    m = re.search(r'\b(\d+)\b', f)
+    if m and int(m.group(1)) > 0:
+        return _per_day(int(m.group(1)))
+    return _per_day(1)
+
+
+def match_doses(schedule: DoseSchedule, start_date, taken_at: Iterable[datetime],
+                since: datetime, now: datetime) -> DoseMatch:
+    """
+    Match intake times against the expected doses in [since, now] in one pass.
+
+    A log counts for a dose when it falls within half an interval of it; each log
+    is used at most once. Doses whose tolerance has elapsed without a log are
+    missed. next_dose_at is the earliest dose still open (not taken, tolerance
+    not elapsed) or the next one after now.
+    """
+    if schedule.prn:
+        return DoseMatch(expected=0, taken=0, missed=[], next_dose_at=None)
+    tolerance = schedule.interval / 2
+    logs = sorted(t for t in taken_at if t >= since - tolerance)
+    expected = taken = 0
+    missed = []
+    next_dose_at = None
+    i = 0
+    for dose in schedule.expected_doses(start_date, since, now + schedule.interval * 2):
+        while i < len(logs) and logs[i] < dose - tolerance:
+            i += 1  # early/extra log that belongs to no dose
+        matched = i < len(logs) and logs[i] <= dose + tolerance
+        if matched:
+            i += 1
+        if dose <= now:
+            expected += 1
+            taken += matched
+        if matched:
+            continue
+        if dose + tolerance < now:
+            missed.append(dose)
+        elif next_dose_at is None:
+            next_dose_at = dose
+    return DoseMatch(expected=expected, taken=taken, missed=missed, next_dose_at=next_dose_at)
@@ -4,7 +4,8 @@ from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
 import datetime as _datetime
-from .utils import compute_noncompliance_risk
+from .schedule import MIN_DOSE_INTERVAL, is_too_frequent
+from .utils import compute_compliance_rate, compute_dose_match, compute_noncompliance_risk, risk_level_for_score
 
 class MedicationLogSerializer(serializers.ModelSerializer):
     """
@@ -12,14 +13,35 @@ class MedicationLogSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = MedicationLog
-        fields = ['id', 'medication', 'taken_at', 'doses_taken', 'notes']
+        fields = ['id', 'medication', 'taken_at', 'doses_taken', 'notes', 'client_id']
         read_only_fields = ['id']
 
 
+class IntakeEventSerializer(serializers.Serializer):
+    """
+    One intake recorded on a device, possibly while offline.
+    client_id is generated by the device and makes re-uploads idempotent.
+    """
+    medication = serializers.IntegerField()
+    client_id = serializers.CharField(max_length=64)
+    taken_at = serializers.DateTimeField(required=False)
+    doses_taken = serializers.IntegerField(min_value=1, default=1)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class IntakeBatchSerializer(serializers.Serializer):
+    """Batch of offline intake events uploaded in one request."""
+    events = serializers.ListField(child=IntakeEventSerializer(), allow_empty=False, max_length=500)
+
+
 class MedicationSerializer(serializers.ModelSerializer):
     """
     Serializer for Medication model.
     Includes computed fields for compliance and risk.
+
+    List views pass ``medication_metrics`` (from ``compute_medication_metrics``)
+    in the serializer context and prefetch ``recent_logs_prefetched`` so rows
+    don't issue their own queries; without them each field is computed per object.
     """
     patient_id = serializers.IntegerField(write_only=True, required=False)
     needs_refill = serializers.ReadOnlyField()
@@ -29,6 +51,8 @@ class MedicationSerializer(serializers.ModelSerializer):
     noncompliance_risk = serializers.SerializerMethodField()
     risk_level = serializers.SerializerMethodField()
     pending_followups_count = serializers.SerializerMethodField()
+    missed_doses = serializers.SerializerMethodField()
+    next_dose_at = serializers.SerializerMethodField()
     
     class Meta:
         model = Medication
@@ -37,64 +61,80 @@ class MedicationSerializer(serializers.ModelSerializer):
             'compliance', 'next_due', 'total_quantity', 'remaining_quantity',
             'refill_threshold', 'start_date', 'end_date', 'created_at',
             'needs_refill', 'is_depleted', 'recent_logs', 'compliance_rate',
-            'noncompliance_risk', 'risk_level', 'pending_followups_count'
+            'noncompliance_risk', 'risk_level', 'pending_followups_count',
+            'missed_doses', 'next_dose_at'
         ]
         read_only_fields = ['patient', 'id', 'created_at', 'needs_refill', 'is_depleted']
+
+    def validate_frequency(self, value):
+        if is_too_frequent(value):
+            minutes = int(MIN_DOSE_INTERVAL.total_seconds() // 60)
+            raise serializers.ValidationError(f'Doses must be at least {minutes} minutes apart.')
+        return value
     
+    def _metrics(self, obj):
+        """Precomputed batch metrics for obj, if the view supplied them."""
+        metrics = self.context.get('medication_metrics')
+        if metrics is None:
+            return None
+        return metrics.get(obj.pk)
+
     def get_recent_logs(self, obj):
         """Get last 5 medication logs"""
-        logs = obj.logs.all()[:5]
+        logs = getattr(obj, 'recent_logs_prefetched', None)
+        if logs is None:
+            logs = obj.logs.all()[:5]
         return MedicationLogSerializer(logs, many=True).data
     
     def get_compliance_rate(self, obj):
         """Calculate compliance rate based on logs in last 30 days"""
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        
-        # Parse frequency to determine expected doses per day
-        frequency_lower = obj.frequency.lower()
-        if 'once' in frequency_lower or '1' in frequency_lower:
-            expected_per_day = 1
-        elif 'twice' in frequency_lower or '2' in frequency_lower:
-            expected_per_day = 2
-        elif 'three' in frequency_lower or '3' in frequency_lower:
-            expected_per_day = 3
-        elif 'four' in frequency_lower or '4' in frequency_lower:
-            expected_per_day = 4
-        else:
-            expected_per_day = 1  # default
-        
-        # Calculate days since start (max 30)
-        days_on_medication = min((timezone.now().date() - obj.start_date).days, 30)
-        if days_on_medication <= 0:
-            return 100  # Just started
-        
-        expected_doses = days_on_medication * expected_per_day
-        actual_logs = obj.logs.filter(taken_at__gte=thirty_days_ago).count()
-        
-        if expected_doses == 0:
-            return 100
-        
-        compliance_rate = min((actual_logs / expected_doses) * 100, 100)
-        return round(compliance_rate, 1)
+        metrics = self._metrics(obj)
+        if metrics is not None:
+            return metrics['compliance_rate']
+
+        return compute_compliance_rate(obj, days=30)
+
+    def _risk_score(self, obj):
+        metrics = self._metrics(obj)
+        if metrics is not None:
+            return metrics['noncompliance_risk']
+        return compute_noncompliance_risk(obj)
 
     def get_noncompliance_risk(self, obj):
-        score = compute_noncompliance_risk(obj)
+        score = self._risk_score(obj)
         return round(score, 3)
 
     def get_risk_level(self, obj):
-        score = compute_noncompliance_risk(obj)
-        if score >= 0.7:
-            return 'high'
-        if score >= 0.4:
-            return 'medium'
-        return 'low'
+        return risk_level_for_score(self._risk_score(obj))
 
     def get_pending_followups_count(self, obj):
+        metrics = self._metrics(obj)
+        if metrics is not None:
+            return metrics['pending_followups_count']
         try:
             return obj.followups.filter(status='pending').count()
         except Exception:
             return 0
 
+    def _dose_match(self, obj):
+        """Expected-dose matching for objects serialized without batch metrics (cached per object)."""
+        match = getattr(obj, '_dose_match', None)
+        if match is None:
+            match = obj._dose_match = compute_dose_match(obj)
+        return match
+
+    def get_missed_doses(self, obj):
+        """Expected doses in the last 14 days with no matching intake log"""
+        metrics = self._metrics(obj)
+        if metrics is not None:
+            return metrics['missed_doses']
+        return len(self._dose_match(obj).missed)
+
+    def get_next_dose_at(self, obj):
+        metrics = self._metrics(obj)
+        next_dose_at = metrics['next_dose_at'] if metrics is not None else self._dose_match(obj).next_dose_at
+        return serializers.DateTimeField().to_representation(next_dose_at) if next_dose_at else None
+
     def to_representation(self, instance):
         """
         Ensure DateField representations receive date objects/strings even if the
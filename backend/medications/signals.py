@@ -0,0 +1,71 @@
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Medication, MedicationLog
+from .rollup import record_intake, rebuild_daily_adherence
+from .utils import refresh_medication_risk
+
+# Medication columns that feed compute_noncompliance_risk
+RISK_INPUT_FIELDS = {'frequency', 'start_date', 'remaining_quantity', 'refill_threshold', 'next_due'}
+
+
+@receiver(post_save, sender=Medication)
+def refresh_risk_on_medication_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Keep the persisted risk snapshot current when a medication is created or
+    one of its scoring inputs (quantity, threshold, schedule) changes.
+    """
+    if raw:
+        return
+    if update_fields is not None and not RISK_INPUT_FIELDS.intersection(update_fields):
+        return
+    refresh_medication_risk(instance)
+
+
+@receiver(pre_save, sender=MedicationLog)
+def remember_previous_log_time(sender, instance, raw=False, **kwargs):
+    """Keep the stored taken_at of an edited log so its old rollup day can be rebuilt."""
+    if raw or instance.pk is None:
+        return
+    instance._previous_taken_at = (
+        MedicationLog.objects.filter(pk=instance.pk).values_list('taken_at', flat=True).first()
+    )
+
+
+def _deleted_with_medication(origin) -> bool:
+    """
+    Whether a log deletion cascades from its medication (or the patient): a
+    log's only parent is its medication, so a delete that did not start from
+    logs removes the medication and its rollup rows as well.
+    """
+    if isinstance(origin, QuerySet):
+        return origin.model is not MedicationLog
+    return origin is not None and not isinstance(origin, MedicationLog)
+
+
+@receiver(post_save, sender=MedicationLog)
+@receiver(post_delete, sender=MedicationLog)
+def refresh_risk_on_log_change(sender, instance, raw=False, created=False, origin=None, **kwargs):
+    """
+    Intake logs change adherence and staleness: update the daily adherence
+    rollup, then rescore their medication and mark it as changed for
+    incremental compliance evaluation. Nothing is done for logs deleted along
+    with their medication.
+    """
+    if raw or _deleted_with_medication(origin):
+        return
+    medication = Medication.objects.filter(pk=instance.medication_id).first()
+    if medication is None:
+        return
+    if created:
+        record_intake(medication, instance.taken_at)
+    else:
+        # Edits and deletes are rare: rebuild the affected day(s) from the logs
+        days = {timezone.localdate(instance.taken_at)}
+        previous = getattr(instance, '_previous_taken_at', None)
+        if previous is not None:
+            days.add(timezone.localdate(previous))
+        for day in days:
+            rebuild_daily_adherence(medication, start=day, end=day)
+    refresh_medication_risk(medication, touch=True)
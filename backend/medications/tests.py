@@ -1,8 +1,15 @@
+from django.test import SimpleTestCase, TestCase
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from datetime import datetime, time, timedelta
 from tests.factories import create_patient, create_doctor, create_caregiver
-from .models import Medication
+from .models import Medication, MedicationLog, ComplianceFollowUp
+from .population import score_population
+from .utils import compute_medication_metrics, compute_noncompliance_risk, compute_compliance_rate
+from .schedule import MIN_DOSE_INTERVAL, is_too_frequent, parse_frequency, match_doses
 
 
 class MedicationApiTests(APITestCase):
@@ -26,7 +33,10 @@ class MedicationApiTests(APITestCase):
 		self.auth_as(self.doctor)
 		rlist = self.client.get('/api/medications/prescriptions/')
 		self.assertEqual(rlist.status_code, status.HTTP_200_OK)
-		self.assertTrue(any(m['name'] == 'MedA' for m in rlist.data))
+		self.assertTrue(any(m['name'] == 'MedA' for m in rlist.data['results']))
+		r = self.client.patch(f"/api/medications/{r.data['id']}/", {'frequency': 'every 0.0001 hours'}, format='json')
+		self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn('frequency', r.data)
 
 	def test_log_intake_and_risk(self):
 		self.auth_as(self.doctor)
@@ -55,3 +65,385 @@ class MedicationApiTests(APITestCase):
 		rf = self.client.post('/api/medications/scan-and-followups/')
 		self.assertEqual(rf.status_code, status.HTTP_200_OK)
 		self.assertIn('created', rf.data)
+
+	def _make_meds(self, n):
+		meds = []
+		for i in range(n):
+			m = Medication.objects.create(
+				patient=self.patient, name=f'Batch{i}', dosage='5mg', frequency='twice daily',
+				total_quantity=30, remaining_quantity=i * 3, refill_threshold=7,
+				start_date=timezone.now().date() - timedelta(days=5 + i),
+			)
+			for d in range(i % 4):
+				MedicationLog.objects.create(medication=m, taken_at=timezone.now() - timedelta(days=d * 5))
+			if i % 2:
+				ComplianceFollowUp.objects.create(patient=self.patient, medication=m, reason='refill_needed')
+			meds.append(m)
+		return meds
+
+	def test_batch_metrics_match_scalar(self):
+		meds = self._make_meds(6)
+		metrics = compute_medication_metrics(Medication.objects.all())
+		for m in meds:
+			self.assertAlmostEqual(metrics[m.id]['noncompliance_risk'], compute_noncompliance_risk(m), places=6)
+			self.assertEqual(metrics[m.id]['compliance_rate'], compute_compliance_rate(m, days=30))
+			self.assertEqual(metrics[m.id]['pending_followups_count'], m.followups.filter(status='pending').count())
+
+	def test_prescriptions_query_count_is_constant(self):
+		self.auth_as(self.doctor)
+		self._make_meds(2)
+		with CaptureQueriesContext(connection) as few:
+			self.client.get('/api/medications/prescriptions/')
+		self._make_meds(8)
+		with CaptureQueriesContext(connection) as many:
+			r = self.client.get('/api/medications/prescriptions/')
+		self.assertEqual(len(r.data['results']), 10)
+		self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+	def test_prescriptions_scoped_filtered_and_cursor_paginated(self):
+		from requestsapp.models import CareRequest
+		today = timezone.now().date()
+		other_doctor = create_doctor('doc4@example.com')
+		stranger = create_patient('pat6@example.com', doctor=other_doctor)
+		for i in range(5):
+			Medication.objects.create(
+				patient=self.patient, name=f'Mine{i}', dosage='5mg', frequency='once daily',
+				remaining_quantity=i * 5, refill_threshold=7,
+				end_date=today - timedelta(days=1) if i == 0 else None,
+			)
+		Medication.objects.create(patient=stranger, name='Theirs', dosage='5mg', frequency='once daily')
+
+		self.auth_as(self.doctor)
+		names, url = [], '/api/medications/prescriptions/?page_size=2'
+		while url:
+			r = self.client.get(url)
+			self.assertEqual(r.status_code, status.HTTP_200_OK)
+			self.assertLessEqual(len(r.data['results']), 2)
+			names += [m['name'] for m in r.data['results']]
+			url = r.data['next']
+		self.assertEqual(names, [f'Mine{i}' for i in range(4, -1, -1)])
+
+		r = self.client.get('/api/medications/prescriptions/?status=active&needs_refill=true')
+		self.assertEqual([m['name'] for m in r.data['results']], ['Mine1'])
+		r = self.client.get('/api/medications/prescriptions/?status=ended')
+		self.assertEqual([m['name'] for m in r.data['results']], ['Mine0'])
+		r = self.client.get(f'/api/medications/prescriptions/?patient={stranger.id}')
+		self.assertEqual(r.data['results'], [])
+		self.assertEqual(self.client.get('/api/medications/prescriptions/?status=x').status_code, 400)
+
+		self.auth_as(self.caregiver)
+		self.assertEqual(self.client.get('/api/medications/prescriptions/').data['results'], [])
+		care = CareRequest.objects.create(
+			family='F', service='S', duration='1h', rate=10, patient=stranger, caregiver=self.caregiver, status='accepted',
+		)
+		r = self.client.get('/api/medications/prescriptions/')
+		self.assertEqual([m['name'] for m in r.data['results']], ['Theirs'])
+		theirs = r.data['results'][0]['id']
+		self.assertEqual(self.client.get(f'/api/medications/{theirs}/risk/').status_code, status.HTTP_200_OK)
+		# Once the care request is completed the caregiver no longer sees the patient
+		care.status = 'completed'
+		care.save()
+		self.assertEqual(self.client.get('/api/medications/prescriptions/').data['results'], [])
+		self.assertEqual(self.client.get(f'/api/medications/{theirs}/risk/').status_code, status.HTTP_404_NOT_FOUND)
+
+		# Every action is scoped, not just the prescription listing
+		self.auth_as(self.doctor)
+		self.assertEqual(self.client.get(f'/api/medications/{theirs}/').status_code, status.HTTP_404_NOT_FOUND)
+		r = self.client.post(f'/api/medications/{theirs}/refill/', {'quantity': 5}, format='json')
+		self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+		self.assertNotIn('Theirs', [m['name'] for m in self.client.get('/api/medications/').data['results']])
+
+	def test_risk_snapshot_maintained_on_writes(self):
+		med = Medication.objects.create(
+			patient=self.patient, name='Snap', dosage='5mg', frequency='once daily', total_quantity=30,
+			remaining_quantity=30, start_date=timezone.now().date() - timedelta(days=3),
+		)
+		med.refresh_from_db()
+		self.assertAlmostEqual(med.risk_score, compute_noncompliance_risk(med), places=6)
+		before = med.risk_score
+		self.auth_as(self.patient)
+		self.client.post(f'/api/medications/{med.id}/log-intake/', {'doses_taken': 1}, format='json')
+		med.refresh_from_db()
+		self.assertLess(med.risk_score, before)
+		self.assertIsNotNone(med.last_taken_at)
+		self.assertAlmostEqual(med.risk_score, compute_noncompliance_risk(med), places=6)
+
+	def test_refresh_risk_scores_command(self):
+		from django.core.management import call_command
+		from io import StringIO
+		meds = self._make_meds(3)
+		Medication.objects.update(risk_score=0.0)
+		call_command('refresh_risk_scores', stdout=StringIO())
+		for m in meds:
+			m.refresh_from_db()
+			self.assertAlmostEqual(m.risk_score, compute_noncompliance_risk(m), places=6)
+
+	def test_evaluate_compliance_resumes_from_checkpoint(self):
+		import json, os, tempfile
+		from django.core.management import call_command
+		from io import StringIO
+		other = create_patient('pat4@example.com')
+		for p in (self.patient, other):
+			Medication.objects.create(
+				patient=p, name='Resume', dosage='5mg', frequency='once daily', total_quantity=10,
+				remaining_quantity=0, start_date=timezone.now().date(),
+			)
+		fd, path = tempfile.mkstemp(suffix='.json')
+		with os.fdopen(fd, 'w') as f:
+			json.dump({'started_at': timezone.now().isoformat(), 'completed': [[self.patient.id, self.patient.id]], 'counts': {}}, f)
+		call_command('evaluate_compliance', '--chunk-size', '1', '--checkpoint', path, '--resume', stdout=StringIO())
+		self.assertFalse(ComplianceFollowUp.objects.filter(patient=self.patient).exists())
+		self.assertTrue(ComplianceFollowUp.objects.filter(patient=other, reason='refill_needed').exists())
+		self.assertFalse(os.path.exists(path))
+
+	def test_incremental_evaluation_selects_changed_and_boundary_crossing(self):
+		from .models import ComplianceEvaluationRun
+		from .utils import medications_due_for_evaluation
+		now = timezone.now()
+		since = now - timedelta(hours=1)
+		quiet, crossing, edited = [
+			Medication.objects.create(patient=self.patient, name=n, dosage='5mg', frequency='once daily')
+			for n in ('quiet', 'crossing', 'edited')
+		]
+		MedicationLog.objects.create(medication=quiet, taken_at=now - timedelta(days=3, hours=2))
+		MedicationLog.objects.create(medication=crossing, taken_at=now - timedelta(days=7, minutes=30))
+		Medication.objects.filter(pk__in=[quiet.pk, crossing.pk, edited.pk]).update(
+			updated_at=now - timedelta(days=1), start_date=now.date() - timedelta(days=60),
+		)
+		Medication.objects.filter(pk=edited.pk).update(updated_at=now - timedelta(minutes=5))
+		due = set(medications_due_for_evaluation(since, now=now).values_list('pk', flat=True))
+		self.assertEqual(due, {crossing.pk, edited.pk})
+
+		from django.core.management import call_command
+		from io import StringIO
+		ComplianceEvaluationRun.objects.create(mode='full', started_at=since, finished_at=since)
+		call_command('evaluate_compliance', '--incremental', stdout=StringIO())
+		run = ComplianceEvaluationRun.objects.first()
+		self.assertEqual(run.mode, 'incremental')
+		self.assertIsNotNone(run.finished_at)
+
+
+	def test_daily_adherence_rollup_tracks_logs(self):
+		from django.core.management import call_command
+		from django.db.models import Q
+		from io import StringIO
+		from .models import MedicationDailyAdherence
+		from .rollup import log_window_stats
+		now = timezone.now()
+		med = Medication.objects.create(
+			patient=self.patient, name='Roll', dosage='5mg', frequency='twice daily', total_quantity=90,
+			remaining_quantity=90, start_date=now.date() - timedelta(days=40),
+		)
+		logs = [
+			MedicationLog.objects.create(medication=med, taken_at=now - timedelta(hours=h))
+			for h in (1, 13, 30, 31, 24 * 14 + 2, 24 * 20, 24 * 30 - 1, 24 * 30 + 5, 24 * 35)
+		]
+		self.auth_as(self.patient)
+		self.client.post(f'/api/medications/{med.id}/log-intake/', {'doses_taken': 1}, format='json')
+		logs[1].taken_at = now - timedelta(days=10)
+		logs[1].save()
+		logs[2].delete()
+
+		def snapshot():
+			return {
+				r.date: (r.taken_doses, r.first_taken_at, r.last_taken_at)
+				for r in MedicationDailyAdherence.objects.filter(medication=med, taken_doses__gt=0)
+			}
+		expected = {}
+		for t in med.logs.order_by('taken_at').values_list('taken_at', flat=True):
+			n, first, _ = expected.get(timezone.localdate(t), (0, t, t))
+			expected[timezone.localdate(t)] = (n + 1, first, t)
+		self.assertEqual(snapshot(), expected)
+
+		stats = log_window_stats(Q(medication_id=med.pk), (14, 30), now)[med.pk]
+		for days in (14, 30):
+			self.assertEqual(stats[days], med.logs.filter(taken_at__gte=now - timedelta(days=days)).count())
+
+		MedicationDailyAdherence.objects.filter(medication=med).delete()
+		call_command('backfill_daily_adherence', stdout=StringIO())
+		self.assertEqual(snapshot(), expected)
+		today = MedicationDailyAdherence.objects.get(medication=med, date=timezone.localdate())
+		self.assertEqual(today.expected_doses, 2)
+
+		r = self.client.get(f'/api/medications/{med.id}/adherence-trend/?days=7')
+		self.assertEqual(r.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(r.data['days']), 7)
+		self.assertEqual(r.data['days'][-1]['taken_doses'], expected.get(timezone.localdate(), (0,))[0])
+
+	def test_deleting_medication_or_patient_with_logs(self):
+		from .models import MedicationDailyAdherence
+		now = timezone.now()
+		meds = []
+		for name in ('Gone', 'Orphaned'):
+			med = Medication.objects.create(
+				patient=self.patient, name=name, dosage='5mg', frequency='twice daily',
+				start_date=now.date() - timedelta(days=10),
+			)
+			MedicationLog.objects.bulk_create(
+				MedicationLog(medication=med, taken_at=now - timedelta(hours=12 * i)) for i in range(20)
+			)
+			MedicationLog.objects.filter(medication=med).first().save()  # rolls up one day
+			meds.append(med)
+
+		# The logs go with their medication: no rollup rebuild or rescore per log
+		with CaptureQueriesContext(connection) as ctx:
+			meds[0].delete()
+		self.assertLess(len(ctx.captured_queries), 20)
+		self.patient.delete()
+		self.assertFalse(Medication.objects.exists())
+		self.assertFalse(MedicationDailyAdherence.objects.exists())
+		connection.check_constraints()
+
+	def test_log_intake_is_idempotent_per_client_id(self):
+		med = Medication.objects.create(
+			patient=self.patient, name='Idem', dosage='5mg', frequency='once daily', total_quantity=10,
+			remaining_quantity=2, start_date=timezone.now().date(),
+		)
+		self.auth_as(self.patient)
+		url = f'/api/medications/{med.id}/log-intake/'
+		r = self.client.post(url, {'doses_taken': 3, 'client_id': 'dev-1'}, format='json')
+		self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(r.data['remaining_quantity'], 0)
+		r = self.client.post(url, {'doses_taken': 3, 'client_id': 'dev-1'}, format='json')
+		self.assertEqual(r.status_code, status.HTTP_200_OK)
+		self.assertEqual(med.logs.count(), 1)
+		r = self.client.post(url, {'doses_taken': 'x'}, format='json')
+		self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_sync_intake_batch(self):
+		from .models import MedicationDailyAdherence
+		now = timezone.now()
+		med = Medication.objects.create(
+			patient=self.patient, name='Sync', dosage='5mg', frequency='twice daily', total_quantity=30,
+			remaining_quantity=10, start_date=now.date() - timedelta(days=10),
+		)
+		other = Medication.objects.create(
+			patient=create_patient('pat5@example.com'), name='Other', dosage='5mg', frequency='once daily',
+		)
+		events = [
+			{'medication': med.id, 'client_id': f'e{i}', 'taken_at': (now - timedelta(days=i)).isoformat()}
+			for i in range(4)
+		]
+		events.append({'medication': med.id, 'client_id': 'e0', 'taken_at': now.isoformat()})
+		events.append({'medication': other.id, 'client_id': 'x1'})
+		self.auth_as(self.patient)
+		r = self.client.post('/api/medications/sync-intake/', {'events': events}, format='json')
+		self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(r.data['created'], ['e0', 'e1', 'e2', 'e3'])
+		self.assertEqual(r.data['duplicates'], ['e0'])
+		self.assertEqual(r.data['rejected'], ['x1'])
+		med.refresh_from_db()
+		self.assertEqual(med.remaining_quantity, 6)
+		self.assertEqual(med.logs.count(), 4)
+		self.assertAlmostEqual(med.risk_score, compute_noncompliance_risk(med), places=6)
+		self.assertEqual(
+			sum(MedicationDailyAdherence.objects.filter(medication=med).values_list('taken_doses', flat=True)), 4,
+		)
+		# Retrying the whole upload applies nothing
+		r = self.client.post('/api/medications/sync-intake/', {'events': events[:4]}, format='json')
+		self.assertEqual(r.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(r.data['duplicates']), 4)
+		med.refresh_from_db()
+		self.assertEqual(med.remaining_quantity, 6)
+
+		# Staff can only upload for the patients they see
+		self.auth_as(self.caregiver)
+		r = self.client.post('/api/medications/sync-intake/', {'events': [{'medication': med.id, 'client_id': 'c1'}]}, format='json')
+		self.assertEqual(r.data['rejected'], ['c1'])
+		self.auth_as(self.doctor)
+		r = self.client.post('/api/medications/sync-intake/', {'events': [
+			{'medication': med.id, 'client_id': 'd1'}, {'medication': other.id, 'client_id': 'd2'},
+		]}, format='json')
+		self.assertEqual((r.data['created'], r.data['rejected']), (['d1'], ['d2']))
+		self.assertFalse(other.logs.exists())
+
+class DoseScheduleTests(SimpleTestCase):
+	def test_parse_frequency(self):
+		self.assertEqual(parse_frequency('every 12 hours').times_per_day, 2)
+		self.assertEqual(parse_frequency('q8h').times_per_day, 3)
+		self.assertEqual(parse_frequency('Twice daily').times_per_day, 2)
+		self.assertEqual(parse_frequency('3 times a day').times_per_day, 3)
+		self.assertEqual(parse_frequency('every other day').interval, timedelta(days=2))
+		self.assertTrue(parse_frequency('as needed').prn)
+		self.assertEqual(parse_frequency('').times_per_day, 1)
+
+	def test_parse_hourly_forms(self):
+		self.assertEqual(parse_frequency('12 hourly').times_per_day, 2)
+		self.assertEqual(parse_frequency('4-hourly').times_per_day, 6)
+		self.assertEqual(parse_frequency('Hourly').interval, timedelta(hours=1))
+		self.assertEqual(parse_frequency('q30min').interval, timedelta(minutes=30))
+
+	def test_parse_ranges_expect_fewest_doses(self):
+		self.assertEqual(parse_frequency('Every 6-8 hours').interval, timedelta(hours=8))
+		self.assertEqual(parse_frequency('q4-6h').interval, timedelta(hours=6))
+		self.assertEqual(parse_frequency('every 4 to 6 hours').times_per_day, 4)
+		self.assertEqual(parse_frequency('6-8 hourly').interval, timedelta(hours=8))
+		self.assertEqual(parse_frequency('every 2-3 days').interval, timedelta(days=3))
+		self.assertEqual(parse_frequency('2-3 times a day').times_per_day, 2)
+		self.assertEqual(parse_frequency('one or two times daily').times_per_day, 1)
+
+	def test_minimum_interval(self):
+		self.assertTrue(is_too_frequent('every 0.0001 hours'))
+		self.assertTrue(is_too_frequent('every 5 minutes'))
+		self.assertFalse(is_too_frequent('every 15 minutes'))
+		self.assertFalse(is_too_frequent('as needed'))
+		# Stored before the check: clamped instead of generating a dose every 0.36s
+		self.assertEqual(parse_frequency('every 0.0001 hours').interval, MIN_DOSE_INTERVAL)
+
+	def test_count_expected_matches_generated_doses(self):
+		now = timezone.now()
+		start = now.date() - timedelta(days=20)
+		for frequency in ('q8h', 'every 7 hours', '3 times a week', 'every 15 minutes'):
+			schedule = parse_frequency(frequency)
+			for since, until in [
+				(now - timedelta(days=30), now),
+				(now - timedelta(days=3, hours=5), now - timedelta(days=1)),
+				(now, now - timedelta(hours=1)),
+				(now - timedelta(days=40), now - timedelta(days=25)),
+			]:
+				self.assertEqual(schedule.count_expected(start, since, until),
+								 len(list(schedule.expected_doses(start, since, until))), (frequency, since, until))
+		# Closed form: a year of the shortest interval is not generated dose by dose
+		self.assertEqual(parse_frequency('every 0.0001 hours').count_expected(start, now - timedelta(days=365), now),
+						 len(list(parse_frequency('every 15 minutes').expected_doses(start, now - timedelta(days=365), now))))
+
+	def test_match_doses_single_pass(self):
+		schedule = parse_frequency('twice daily')
+		start = timezone.now().date() - timedelta(days=2)
+		first = timezone.make_aware(datetime.combine(start, time(8, 0)))
+		doses = list(schedule.expected_doses(start, first, first + timedelta(days=1)))
+		self.assertEqual([d - first for d in doses], [timedelta(0), timedelta(hours=12), timedelta(hours=24)])
+		# Take the first dose late (within tolerance), skip the second, take the third on time
+		logs = [first + timedelta(hours=2), first + timedelta(hours=24)]
+		match = match_doses(schedule, start, logs, first, first + timedelta(days=1, hours=1))
+		self.assertEqual((match.expected, match.taken), (3, 2))
+		self.assertEqual(match.missed, [first + timedelta(hours=12)])
+		self.assertEqual(match.next_dose_at, first + timedelta(hours=36))
+
+
+class PopulationScoringTests(TestCase):
+	def setUp(self):
+		self.patient = create_patient('pop@example.com')
+
+	def test_vectorised_population_scores_match_scalar(self):
+		import random
+		rng = random.Random(42)
+		now = timezone.now()
+		frequencies = ['once daily', 'twice daily', 'every 8 hours', 'q6h', 'weekly', 'every other day', 'as needed', 'three times a day']
+		for i in range(40):
+			m = Medication.objects.create(
+				patient=self.patient, name=f'Pop{i}', dosage='5mg', frequency=rng.choice(frequencies),
+				total_quantity=30, remaining_quantity=rng.randint(-2, 40), refill_threshold=rng.randint(0, 10),
+				start_date=now.date() - timedelta(days=rng.randint(-3, 60)),
+				next_due=rng.choice([None, now.date() - timedelta(days=rng.randint(-5, 12))]),
+			)
+			for _ in range(rng.randint(0, 30)):
+				MedicationLog.objects.create(medication=m, taken_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 40)))
+		scores = score_population(Medication.objects.all(), now=now)
+		from .utils import _risk_from_features, RISK_WINDOW_DAYS
+		for med_id, score in zip(scores['medication_id'], scores['risk_score']):
+			m = Medication.objects.get(pk=med_id)
+			logs = m.logs.filter(taken_at__gte=now - timedelta(days=RISK_WINDOW_DAYS)).count()
+			last = m.logs.first()
+			expected = _risk_from_features(m, logs, last.taken_at if last else None, now)
+			self.assertAlmostEqual(float(score), expected, delta=1e-9)
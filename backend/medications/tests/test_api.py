@@ -26,7 +26,7 @@ class MedicationApiTests(APITestCase):
         self.auth_as(self.doctor)
         rlist = self.client.get('/api/medications/prescriptions/')
         self.assertEqual(rlist.status_code, status.HTTP_200_OK)
-        self.assertTrue(any(m['name'] == 'MedA' for m in rlist.data))
+        self.assertTrue(any(m['name'] == 'MedA' for m in rlist.data['results']))
 
     def test_log_intake_and_risk(self):
         self.auth_as(self.doctor)
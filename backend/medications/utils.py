@@ -1,32 +1,48 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, QuerySet, Value, When
+from django.db.models.functions import Greatest
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, datetime, timedelta
+from .schedule import match_doses
+
+RISK_WINDOW_DAYS = 14
+COMPLIANCE_WINDOW_DAYS = 30
+# Keep IN (...) lists comfortably below SQLite's bound-parameter limit
+_ID_CHUNK_SIZE = 500
+# Medication columns holding the persisted risk snapshot
+RISK_SNAPSHOT_FIELDS = ['risk_score', 'adherence', 'last_taken_at', 'risk_updated_at']
+
+
+def as_date(value) -> date:
+    """
+    The date of a DateField value. Model defaults (timezone.now) can leave a
+    datetime on unsaved/unreloaded instances, e.g. Medication.start_date.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    return value
 
 
 def compute_compliance_rate(medication, days: int = 30) -> float:
     """Return compliance percentage (0-100) over a window of days based on logs vs expected doses."""
+    from .rollup import log_window_stats
     now = timezone.now()
-    since = now - timedelta(days=days)
-    expected_per_day = _expected_doses_per_day(medication.frequency)
-    days_on_medication = max(0, min(days, (now.date() - medication.start_date).days))
-    if days_on_medication <= 0:
+    stats = log_window_stats(Q(medication_id=medication.pk), (days,), now).get(medication.pk, {})
+    return _compliance_rate_from_count(medication, stats.get(days, 0), now, days)
+
+
+def _compliance_rate_from_count(medication, actual_logs: int, now, days: int) -> float:
+    """Compliance percentage given the number of logs already counted inside the window."""
+    expected_doses = _expected_doses(medication, now - timedelta(days=days), now)
+    if expected_doses <= 0:
         return 100.0
-    expected_doses = max(1, days_on_medication * expected_per_day)
-    actual_logs = medication.logs.filter(taken_at__gte=since).count()
     compliance_rate = min((actual_logs / expected_doses) * 100, 100)
     return round(compliance_rate, 1)
 
 
-def _expected_doses_per_day(frequency: str) -> int:
-    f = (frequency or '').lower()
-    if 'once' in f or '1' in f:
-        return 1
-    if 'twice' in f or '2' in f:
-        return 2
-    if 'three' in f or '3' in f:
-        return 3
-    if 'four' in f or '4' in f:
-        return 4
-    return 1
+def _expected_doses(medication, since, now) -> int:
+    """Number of doses the medication's schedule expects in [since, now] (0 for PRN)."""
+    return medication.dose_schedule.count_expected(as_date(medication.start_date), since, now)
 
 
 def compute_noncompliance_risk(medication) -> float:
@@ -41,22 +57,27 @@ def compute_noncompliance_risk(medication) -> float:
     - Start/end recency
     - Next due date passed
     """
+    from .rollup import log_window_stats
     now = timezone.now()
+    stats = log_window_stats(Q(medication_id=medication.pk), (RISK_WINDOW_DAYS,), now).get(medication.pk, {})
+    return _risk_from_features(medication, stats.get(RISK_WINDOW_DAYS, 0), stats.get('last_taken_at'), now)
+
+
+def _risk_from_features(medication, actual_logs: int, last_taken_at, now) -> float:
+    """
+    Score a medication from pre-fetched log features.
+    `actual_logs` is the number of logs in the last RISK_WINDOW_DAYS and
+    `last_taken_at` the most recent log time (None when there are no logs).
+    """
+    window_days = RISK_WINDOW_DAYS
 
     # 1) Recent adherence
-    window_days = 14
-    since = now - timedelta(days=window_days)
-    expected_per_day = _expected_doses_per_day(medication.frequency)
-    days_on = max(0, min(window_days, (now.date() - medication.start_date).days))
-    expected_doses = max(1, days_on * expected_per_day)
-    actual_logs = medication.logs.filter(taken_at__gte=since).count()
-    adherence = min(actual_logs / expected_doses, 1.0)
+    adherence = _adherence_from_count(medication, actual_logs, now)
     adherence_risk = 1 - adherence  # lower adherence -> higher risk
 
     # 2) Staleness: days since last log
-    last_log = medication.logs.first()
-    if last_log:
-        days_since_last = (now - last_log.taken_at).days
+    if last_taken_at:
+        days_since_last = (now - last_taken_at).days
     else:
         days_since_last = window_days + 1  # no logs -> stale
     staleness_risk = min(days_since_last / (window_days * 1.5), 1.0)
@@ -89,6 +110,245 @@ def compute_noncompliance_risk(medication) -> float:
     return max(0.0, min(1.0, float(score)))
 
 
+def _adherence_from_count(medication, actual_logs: int, now) -> float:
+    """Ratio (0-1) of logs to expected doses over the last RISK_WINDOW_DAYS."""
+    expected_doses = _expected_doses(medication, now - timedelta(days=RISK_WINDOW_DAYS), now)
+    if expected_doses <= 0:
+        return 1.0
+    return min(actual_logs / expected_doses, 1.0)
+
+
+def compute_dose_match(medication, days: int = RISK_WINDOW_DAYS, now=None):
+    """
+    Match the medication's logs against its expected doses over the last `days`.
+    Returns a schedule.DoseMatch with expected/taken counts, missed dose times and next_dose_at.
+    """
+    now = now or timezone.now()
+    schedule = medication.dose_schedule
+    since = now - timedelta(days=days)
+    taken_at = medication.logs.filter(taken_at__gte=since - schedule.interval / 2).values_list('taken_at', flat=True)
+    return match_doses(schedule, as_date(medication.start_date), taken_at, since, now)
+
+
+def risk_level_for_score(score: float) -> str:
+    """Map a 0-1 risk score to the 'low' / 'medium' / 'high' buckets used by the API."""
+    if score >= 0.7:
+        return 'high'
+    if score >= 0.4:
+        return 'medium'
+    return 'low'
+
+
+def compute_medication_metrics(medications, now=None) -> dict:
+    """
+    Batch version of the per-medication compliance metrics.
+
+    Accepts a Medication queryset (or any iterable of Medication instances) and
+    returns ``{medication_id: {...}}`` with ``noncompliance_risk``, ``adherence``,
+    ``compliance_rate``, ``last_taken_at``, ``missed_doses``, ``next_dose_at``
+    and ``pending_followups_count``.
+    Windowed log counts come from the daily adherence rollup (rollup.log_window_stats);
+    recent log times (for dose matching) and pending follow-ups are fetched with
+    one query each, so the cost does not grow with the number of medications.
+    """
+    from .models import MedicationLog, ComplianceFollowUp
+    from .rollup import log_window_stats
+    now = now or timezone.now()
+
+    if isinstance(medications, QuerySet) and not medications.query.is_sliced:
+        meds = list(medications)
+        id_filters = [Q(medication__in=medications.values('pk'))]
+    else:
+        meds = list(medications)
+        ids = [m.pk for m in meds]
+        id_filters = [
+            Q(medication_id__in=ids[i:i + _ID_CHUNK_SIZE])
+            for i in range(0, len(ids), _ID_CHUNK_SIZE)
+        ]
+    if not meds:
+        return {}
+
+    match_since = now - timedelta(days=RISK_WINDOW_DAYS)
+    log_since = match_since - max(m.dose_schedule.interval for m in meds) / 2
+    log_stats = {}
+    recent_taken = {}
+    pending = {}
+    for id_filter in id_filters:
+        rows = MedicationLog.objects.filter(id_filter, taken_at__gte=log_since).order_by().values_list(
+            'medication_id', 'taken_at'
+        )
+        for medication_id, taken_at in rows:
+            recent_taken.setdefault(medication_id, []).append(taken_at)
+        log_stats.update(log_window_stats(id_filter, (RISK_WINDOW_DAYS, COMPLIANCE_WINDOW_DAYS), now))
+        rows = (
+            ComplianceFollowUp.objects.filter(id_filter, status=ComplianceFollowUp.Status.PENDING)
+            .order_by()
+            .values('medication_id')
+            .annotate(n=Count('id'))
+        )
+        for row in rows:
+            pending[row['medication_id']] = row['n']
+
+    metrics = {}
+    for m in meds:
+        stats = log_stats.get(m.pk, {})
+        last_taken_at = stats.get('last_taken_at')
+        risk_logs = stats.get(RISK_WINDOW_DAYS, 0)
+        match = match_doses(m.dose_schedule, as_date(m.start_date), recent_taken.get(m.pk, []), match_since, now)
+        metrics[m.pk] = {
+            'noncompliance_risk': _risk_from_features(m, risk_logs, last_taken_at, now),
+            'adherence': _adherence_from_count(m, risk_logs, now),
+            'compliance_rate': _compliance_rate_from_count(
+                m, stats.get(COMPLIANCE_WINDOW_DAYS, 0), now, COMPLIANCE_WINDOW_DAYS
+            ),
+            'last_taken_at': last_taken_at,
+            'missed_doses': len(match.missed),
+            'next_dose_at': match.next_dose_at,
+            'pending_followups_count': pending.get(m.pk, 0),
+        }
+    return metrics
+
+
+def refresh_medication_risk(medication, now=None, touch: bool = False) -> float:
+    """
+    Recompute the persisted risk snapshot for a single medication.
+    Reads its windowed log counts from the daily rollup and writes with a
+    column-only UPDATE, so it is cheap enough to run on every intake/refill/log write. With `touch`, updated_at is
+    bumped as well so incremental evaluation picks the medication up.
+    Returns the new score.
+    """
+    from .models import Medication
+    from .rollup import log_window_stats
+    now = now or timezone.now()
+    stats = log_window_stats(Q(medication_id=medication.pk), (RISK_WINDOW_DAYS,), now).get(medication.pk, {})
+    risk_logs = stats.get(RISK_WINDOW_DAYS, 0)
+    last_taken_at = stats.get('last_taken_at')
+    values = {
+        'risk_score': _risk_from_features(medication, risk_logs, last_taken_at, now),
+        'adherence': _adherence_from_count(medication, risk_logs, now),
+        'last_taken_at': last_taken_at,
+        'risk_updated_at': now,
+    }
+    if touch:
+        values['updated_at'] = now
+    Medication.objects.filter(pk=medication.pk).update(**values)
+    for field, value in values.items():
+        setattr(medication, field, value)
+    return values['risk_score']
+
+
+def decrement_remaining_quantity(queryset, doses_by_medication: dict):
+    """
+    Atomically subtract doses from remaining_quantity (floored at 0) for the
+    medications in doses_by_medication, in a single F()-based UPDATE.
+    """
+    queryset.filter(pk__in=doses_by_medication).update(
+        remaining_quantity=Greatest(
+            F('remaining_quantity') - Case(
+                *[When(pk=pk, then=Value(n)) for pk, n in doses_by_medication.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+    )
+
+
+def record_intake_batch(medications, events, now=None) -> dict:
+    """
+    Apply many intake events (e.g. uploaded by a device that was offline) in one transaction.
+
+    `medications` is the queryset of medications the caller may log for and
+    `events` are validated IntakeEventSerializer dicts. Events whose
+    (medication, client_id) is already stored or repeated in the batch are
+    duplicates; events for other medications are rejected. New logs are written
+    with one bulk_create and quantities with one UPDATE. bulk_create skips the
+    MedicationLog signals, so the daily rollup and risk snapshot of each touched
+    medication are refreshed here.
+    Returns the client_ids grouped as ``created``, ``duplicates`` and ``rejected``.
+    """
+    from .models import Medication, MedicationLog
+    from .rollup import rebuild_daily_adherence
+    now = now or timezone.now()
+    result = {'created': [], 'duplicates': [], 'rejected': []}
+    with transaction.atomic():
+        # Row locks serialise concurrent uploads touching the same medications
+        meds = {
+            m.pk: m for m in medications.filter(pk__in={e['medication'] for e in events}).select_for_update()
+        }
+        seen = set(
+            MedicationLog.objects.filter(
+                medication_id__in=list(meds), client_id__in={e['client_id'] for e in events},
+            ).values_list('medication_id', 'client_id')
+        )
+        new_logs = []
+        doses = {}
+        for event in events:
+            key = (event['medication'], event['client_id'])
+            if event['medication'] not in meds:
+                result['rejected'].append(event['client_id'])
+                continue
+            if key in seen:
+                result['duplicates'].append(event['client_id'])
+                continue
+            seen.add(key)
+            new_logs.append(MedicationLog(
+                medication_id=event['medication'],
+                client_id=event['client_id'],
+                # Device clocks can run ahead; never record an intake in the future
+                taken_at=min(event.get('taken_at') or now, now),
+                doses_taken=event['doses_taken'],
+                notes=event.get('notes', ''),
+            ))
+            doses[event['medication']] = doses.get(event['medication'], 0) + event['doses_taken']
+            result['created'].append(event['client_id'])
+        if not new_logs:
+            return result
+
+        MedicationLog.objects.bulk_create(new_logs)
+        decrement_remaining_quantity(Medication.objects.all(), doses)
+        for pk, n in doses.items():
+            medication = meds[pk]
+            medication.remaining_quantity = max(0, medication.remaining_quantity - n)
+            days = [timezone.localdate(log.taken_at) for log in new_logs if log.medication_id == pk]
+            rebuild_daily_adherence(medication, start=min(days), end=max(days))
+            refresh_medication_risk(medication, now=now, touch=True)
+    return result
+
+
+def refresh_risk_scores(queryset, batch_size: int = 500, now=None) -> int:
+    """
+    Recompute the persisted risk snapshot for every medication in queryset.
+    Scores decay with time (staleness, overdue next_due), so this is meant to
+    run periodically. Works in batches of `batch_size` with bulk_update.
+    Returns the number of medications refreshed.
+    """
+    from .models import Medication
+    now = now or timezone.now()
+    refreshed = 0
+    batch = []
+
+    def flush():
+        metrics = compute_medication_metrics(batch, now=now)
+        for m in batch:
+            row = metrics[m.pk]
+            m.risk_score = row['noncompliance_risk']
+            m.adherence = row['adherence']
+            m.last_taken_at = row['last_taken_at']
+            m.risk_updated_at = now
+        Medication.objects.bulk_update(batch, RISK_SNAPSHOT_FIELDS)
+        return len(batch)
+
+    for m in queryset.iterator(chunk_size=batch_size):
+        batch.append(m)
+        if len(batch) >= batch_size:
+            refreshed += flush()
+            batch = []
+    if batch:
+        refreshed += flush()
+    return refreshed
+
+
 def next_followup_time(risk_score: float) -> timezone.datetime:
     """Return a due_at based on risk score: higher risk -> sooner follow-up."""
     now = timezone.now()
@@ -101,7 +361,51 @@ def next_followup_time(risk_score: float) -> timezone.datetime:
     return now + timedelta(days=7)
 
 
-def evaluate_and_create_followups_for_medications(queryset, created_by=None):
+def medications_due_for_evaluation(since, now=None):
+    """
+    Medications whose follow-up rules may give a different answer now than at `since`.
+
+    Besides medications edited, refilled or logged since then (updated_at), this
+    selects the ones whose time-based features crossed a boundary in (since, now]:
+    - whole days since the last log changed (staleness, the 7-day NO_LOGS rule)
+    - a log dropped out of the 14-day risk or 30-day compliance window
+    - courses younger than the compliance window, which still accrue expected doses
+    - on a new calendar day: recently overdue next_due
+    - a pending follow-up aged out of the 48-hour de-duplication window, or was resolved
+    Medications past their end_date are never evaluated, so they are excluded.
+    """
+    from .models import Medication, MedicationLog, ComplianceFollowUp
+    now = now or timezone.now()
+
+    due = Q(updated_at__gt=since)
+    # Staleness counts whole days since the last log and saturates after 21 days
+    for k in range(1, int(RISK_WINDOW_DAYS * 1.5) + 1):
+        due |= Q(last_taken_at__gt=since - timedelta(days=k), last_taken_at__lte=now - timedelta(days=k))
+
+    window_exits = Q()
+    for days in (RISK_WINDOW_DAYS, COMPLIANCE_WINDOW_DAYS):
+        window_exits |= Q(taken_at__gt=since - timedelta(days=days), taken_at__lte=now - timedelta(days=days))
+    due |= Q(pk__in=MedicationLog.objects.filter(window_exits).values('medication_id'))
+
+    dedupe_window = timedelta(hours=48)
+    released = ComplianceFollowUp.objects.filter(
+        Q(status=ComplianceFollowUp.Status.PENDING,
+          created_at__gt=since - dedupe_window, created_at__lte=now - dedupe_window) |
+        Q(completed_at__gt=since),
+        medication__isnull=False,
+    )
+    due |= Q(pk__in=released.values('medication_id'))
+
+    # Expected doses keep accruing until a course is COMPLIANCE_WINDOW_DAYS old
+    due |= Q(start_date__gt=since.date() - timedelta(days=COMPLIANCE_WINDOW_DAYS + 1))
+    if since.date() < now.date():
+        # overdue_days grows daily for up to 7 days past next_due
+        due |= Q(next_due__gte=since.date() - timedelta(days=7), next_due__lt=now.date())
+
+    return Medication.objects.filter(due).exclude(end_date__lt=now.date())
+
+
+def evaluate_and_create_followups_for_medications(queryset, created_by=None, chunk_size: int = 500):
     """
     Evaluate medications in queryset and create follow-ups when rules trigger.
     Returns a dict with counts per reason.
@@ -111,87 +415,87 @@ def evaluate_and_create_followups_for_medications(queryset, created_by=None):
     - No logs in 7 days -> NO_LOGS
     - Compliance rate < 80% (30-day window) -> LOW_COMPLIANCE
     Avoid duplicate pending follow-ups for the same medication+reason created in the last 48 hours.
+
+    Medications are processed in chunks of `chunk_size`: each chunk is scored with
+    compute_medication_metrics, its recent pending follow-ups are loaded in one
+    query and new follow-ups are written with a single bulk_create.
     """
     from .models import ComplianceFollowUp
     counts = {r: 0 for r, _ in ComplianceFollowUp.Reason.choices}
     now = timezone.now()
-    recent_cutoff = now - timedelta(hours=48)
+    if isinstance(queryset, QuerySet):
+        queryset = queryset.iterator(chunk_size=chunk_size)
 
+    chunk = []
     for m in queryset:
         # Skip inactive meds (beyond end_date if specified)
         if getattr(m, 'end_date', None) and m.end_date < now.date():
             continue
+        chunk.append(m)
+        if len(chunk) >= chunk_size:
+            _evaluate_followup_chunk(chunk, created_by, now, counts)
+            chunk = []
+    if chunk:
+        _evaluate_followup_chunk(chunk, created_by, now, counts)
+    return counts
 
-        score = compute_noncompliance_risk(m)
-        comp_rate = compute_compliance_rate(m, days=30)
 
-        def already_pending(reason: str) -> bool:
-            return m.followups.filter(
-                reason=reason,
-                status=ComplianceFollowUp.Status.PENDING,
-                created_at__gte=recent_cutoff,
-            ).exists()
+def _evaluate_followup_chunk(medications, created_by, now, counts):
+    """Apply the follow-up rules to one chunk of medications, updating counts in place."""
+    from .models import ComplianceFollowUp
+    Reason = ComplianceFollowUp.Reason
+    recent_cutoff = now - timedelta(hours=48)
+    metrics = compute_medication_metrics(medications, now=now)
+    pending = set(
+        ComplianceFollowUp.objects.filter(
+            medication_id__in=[m.pk for m in medications],
+            status=ComplianceFollowUp.Status.PENDING,
+            created_at__gte=recent_cutoff,
+        ).values_list('medication_id', 'reason')
+    )
+    new_followups = []
+
+    def add(m, reason, due_at, notes, score):
+        if (m.pk, reason) in pending:
+            return
+        pending.add((m.pk, reason))
+        new_followups.append(ComplianceFollowUp(
+            patient_id=m.patient_id,
+            medication=m,
+            due_at=due_at,
+            status=ComplianceFollowUp.Status.PENDING,
+            reason=reason,
+            notes=notes,
+            created_by=created_by,
+            risk_score_snapshot=score,
+        ))
+        counts[reason] += 1
+
+    for m in medications:
+        row = metrics[m.pk]
+        score = row['noncompliance_risk']
+        comp_rate = row['compliance_rate']
 
         # High risk
-        if score >= 0.7 and not already_pending(ComplianceFollowUp.Reason.HIGH_RISK):
-            ComplianceFollowUp.objects.create(
-                patient=m.patient,
-                medication=m,
-                due_at=next_followup_time(score),
-                status=ComplianceFollowUp.Status.PENDING,
-                reason=ComplianceFollowUp.Reason.HIGH_RISK,
-                notes='Auto-generated due to high non-compliance risk.',
-                created_by=created_by,
-                risk_score_snapshot=score,
-            )
-            counts[ComplianceFollowUp.Reason.HIGH_RISK] += 1
+        if score >= 0.7:
+            add(m, Reason.HIGH_RISK, next_followup_time(score),
+                'Auto-generated due to high non-compliance risk.', score)
 
         # Refill needed
         if getattr(m, 'remaining_quantity', None) is not None and m.remaining_quantity <= max(0, m.refill_threshold):
-            if not already_pending(ComplianceFollowUp.Reason.REFILL_NEEDED):
-                ComplianceFollowUp.objects.create(
-                    patient=m.patient,
-                    medication=m,
-                    due_at=now + timedelta(hours=24),
-                    status=ComplianceFollowUp.Status.PENDING,
-                    reason=ComplianceFollowUp.Reason.REFILL_NEEDED,
-                    notes='Auto-generated refill reminder.',
-                    created_by=created_by,
-                    risk_score_snapshot=score,
-                )
-                counts[ComplianceFollowUp.Reason.REFILL_NEEDED] += 1
+            add(m, Reason.REFILL_NEEDED, now + timedelta(hours=24), 'Auto-generated refill reminder.', score)
 
         # No logs
-        last_log = m.logs.first()
         no_logs_days = 999
-        if last_log:
-            no_logs_days = (now - last_log.taken_at).days
-        if no_logs_days >= 7 and not already_pending(ComplianceFollowUp.Reason.NO_LOGS):
-            ComplianceFollowUp.objects.create(
-                patient=m.patient,
-                medication=m,
-                due_at=now + timedelta(hours=24),
-                status=ComplianceFollowUp.Status.PENDING,
-                reason=ComplianceFollowUp.Reason.NO_LOGS,
-                notes='Auto-generated due to no recent intake logs.',
-                created_by=created_by,
-                risk_score_snapshot=score,
-            )
-            counts[ComplianceFollowUp.Reason.NO_LOGS] += 1
+        if row['last_taken_at']:
+            no_logs_days = (now - row['last_taken_at']).days
+        if no_logs_days >= 7:
+            add(m, Reason.NO_LOGS, now + timedelta(hours=24),
+                'Auto-generated due to no recent intake logs.', score)
 
         # Low compliance
-        if comp_rate < 80 and not already_pending(ComplianceFollowUp.Reason.LOW_COMPLIANCE):
-            ComplianceFollowUp.objects.create(
-                patient=m.patient,
-                medication=m,
-                due_at=now + timedelta(days=2),
-                status=ComplianceFollowUp.Status.PENDING,
-                reason=ComplianceFollowUp.Reason.LOW_COMPLIANCE,
-                notes=f'Auto-generated: 30-day compliance {comp_rate}%.',
-                created_by=created_by,
-                risk_score_snapshot=score,
-            )
-            counts[ComplianceFollowUp.Reason.LOW_COMPLIANCE] += 1
-
-    return counts
+        if comp_rate < 80:
+            add(m, Reason.LOW_COMPLIANCE, now + timedelta(days=2),
+                f'Auto-generated: 30-day compliance {comp_rate}%.', score)
 
+    ComplianceFollowUp.objects.bulk_create(new_followups)
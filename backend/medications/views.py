@@ -1,15 +1,26 @@
 
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
-from .models import Medication, MedicationLog, ComplianceFollowUp
-from .serializers import MedicationSerializer, MedicationLogSerializer, ComplianceFollowUpSerializer
+from .models import Medication, MedicationLog, ComplianceFollowUp, MedicationDailyAdherence
+from .serializers import (
+    MedicationSerializer, MedicationLogSerializer, ComplianceFollowUpSerializer, IntakeBatchSerializer,
+)
 from django.utils import timezone
-from django.db.models import Prefetch
-from .utils import compute_noncompliance_risk, next_followup_time, evaluate_and_create_followups_for_medications
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch, Q
+from .utils import (
+    compute_noncompliance_risk, compute_medication_metrics, risk_level_for_score,
+    next_followup_time, evaluate_and_create_followups_for_medications,
+    decrement_remaining_quantity, record_intake_batch,
+)
+from .rollup import expected_doses_on
 from appointments.models import Appointment
+from requestsapp.models import CareRequest
 from django.contrib.auth import get_user_model
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
 
 class IsCaregiverOrPatientOrDoctor(permissions.BasePermission):
@@ -19,6 +30,16 @@ class IsCaregiverOrPatientOrDoctor(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role in ['caregiver', 'patient', 'doctor']
 
+class PrescriptionCursorPagination(CursorPagination):
+    """
+    Keyset pagination for prescription listings: newest first, seeking on the
+    primary key so each page costs the same however large the table grows.
+    """
+    ordering = '-id'
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 class MedicationViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing medications.
@@ -48,15 +69,50 @@ class MedicationViewSet(viewsets.ModelViewSet):
             serializer.save(patient=user)
 
     def get_queryset(self):
+        """
+        Medications of the viewer's own patients, for every action: a patient's
+        own, a doctor's assigned patients, or patients a caregiver currently
+        looks after (CareRequest.ACTIVE_STATUSES).
+        """
         qs = super().get_queryset()
         user = self.request.user
         if user.role == 'patient':
             return qs.filter(patient=user)
-        elif user.role in ['caregiver', 'doctor']:
-            # Caregiver and doctor can see all
-            return qs
+        elif user.role == 'doctor':
+            return qs.filter(patient__doctor=user)
+        elif user.role == 'caregiver':
+            return qs.filter(patient__in=CareRequest.objects.filter(
+                caregiver=user, status__in=CareRequest.ACTIVE_STATUSES,
+            ).values('patient'))
         return qs.none()
 
+    def _with_recent_logs(self, queryset):
+        """Prefetch the last 5 logs per medication in one query for the serializer."""
+        return queryset.prefetch_related(
+            Prefetch(
+                'logs',
+                queryset=MedicationLog.objects.order_by('-taken_at')[:5],
+                to_attr='recent_logs_prefetched',
+            )
+        )
+
+    def get_metrics_serializer(self, medications):
+        """
+        Serialize many medications with risk/compliance metrics computed in bulk,
+        so the number of queries does not depend on the number of rows.
+        """
+        medications = list(medications)
+        context = self.get_serializer_context()
+        context['medication_metrics'] = compute_medication_metrics(medications)
+        return self.get_serializer(medications, many=True, context=context)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self._with_recent_logs(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_metrics_serializer(page).data)
+        return Response(self.get_metrics_serializer(queryset).data)
+
     @action(detail=False, methods=['post', 'get'], url_path='prescriptions')
     def prescriptions(self, request):
         """
@@ -71,10 +127,37 @@ class MedicationViewSet(viewsets.ModelViewSet):
             self.perform_create(serializer)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            # List prescriptions
-            queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
+            # List prescriptions: viewer-scoped, filtered and keyset-paginated
+            paginator = PrescriptionCursorPagination()
+            page = paginator.paginate_queryset(self._with_recent_logs(self.get_prescription_queryset()), request, view=self)
+            return paginator.get_paginated_response(self.get_metrics_serializer(page).data)
+
+    def get_prescription_queryset(self):
+        """
+        The viewer's medications (get_queryset) with the optional filters
+        ?patient=<id>, ?status=active|ended and ?needs_refill=true|false.
+        """
+        qs = self.get_queryset()
+        params = self.request.query_params
+        patient_id = params.get('patient')
+        if patient_id:
+            if not patient_id.isdigit():
+                raise ValidationError({'patient': 'Must be a patient ID.'})
+            qs = qs.filter(patient_id=patient_id)
+        today = timezone.localdate()
+        state = params.get('status')
+        if state == 'active':
+            qs = qs.filter(Q(end_date__isnull=True) | Q(end_date__gte=today))
+        elif state == 'ended':
+            qs = qs.filter(end_date__lt=today)
+        elif state:
+            raise ValidationError({'status': "Must be 'active' or 'ended'."})
+        needs_refill = params.get('needs_refill', '').lower()
+        if needs_refill in ('true', '1'):
+            qs = qs.filter(remaining_quantity__lte=F('refill_threshold'))
+        elif needs_refill in ('false', '0'):
+            qs = qs.filter(remaining_quantity__gt=F('refill_threshold'))
+        return qs
     
     @action(detail=True, methods=['post'], url_path='log-intake')
     def log_intake(self, request, pk=None):
@@ -92,19 +175,38 @@ class MedicationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        doses_taken = request.data.get('doses_taken', 1)
+        try:
+            doses_taken = int(request.data.get('doses_taken', 1))
+        except (TypeError, ValueError):
+            doses_taken = 0
+        if doses_taken < 1:
+            return Response(
+                {'detail': 'doses_taken must be a positive integer.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         notes = request.data.get('notes', '')
-        
-        # Create log entry
-        log = MedicationLog.objects.create(
-            medication=medication,
-            doses_taken=doses_taken,
-            notes=notes
-        )
-        
-        # Update remaining quantity
-        medication.remaining_quantity = max(0, medication.remaining_quantity - doses_taken)
-        medication.save()
+        client_id = request.data.get('client_id') or None
+
+        if client_id and medication.logs.filter(client_id=client_id).exists():
+            return self._intake_already_logged(medication, client_id)
+
+        try:
+            with transaction.atomic():
+                # Atomic, column-only decrement so concurrent intakes cannot lose updates;
+                # the log's post_save signal then rescores the medication with the new quantity
+                decrement_remaining_quantity(Medication.objects.all(), {medication.pk: doses_taken})
+                medication.refresh_from_db(fields=['remaining_quantity'])
+
+                # Create log entry
+                log = MedicationLog.objects.create(
+                    medication=medication,
+                    doses_taken=doses_taken,
+                    notes=notes,
+                    client_id=client_id
+                )
+        except IntegrityError:
+            # A concurrent retry with the same client_id won the race
+            return self._intake_already_logged(medication, client_id)
         
         return Response({
             'message': 'Medication intake logged successfully',
@@ -112,6 +214,31 @@ class MedicationViewSet(viewsets.ModelViewSet):
             'remaining_quantity': medication.remaining_quantity,
             'needs_refill': medication.needs_refill
         }, status=status.HTTP_201_CREATED)
+
+    def _intake_already_logged(self, medication, client_id):
+        """Response for a retried intake whose client_id was already recorded."""
+        medication.refresh_from_db(fields=['remaining_quantity'])
+        return Response({
+            'message': 'Medication intake already logged',
+            'log': MedicationLogSerializer(medication.logs.get(client_id=client_id)).data,
+            'remaining_quantity': medication.remaining_quantity,
+            'needs_refill': medication.needs_refill
+        })
+
+    @action(detail=False, methods=['post'], url_path='sync-intake')
+    def sync_intake(self, request):
+        """
+        Upload many intake events at once (e.g. after a device was offline)
+        POST /medications/sync-intake/
+        Body: { "events": [{ "medication": 1, "client_id": "uuid", "taken_at": "ISO", "doses_taken": 1, "notes": "" }] }
+        Re-sending an event with the same client_id is reported as a duplicate and not applied twice.
+        Events for medications outside the viewer's scope (get_queryset, as for log-intake) are rejected.
+        """
+        serializer = IntakeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = record_intake_batch(self.get_queryset(), serializer.validated_data['events'])
+        created = bool(result['created'])
+        return Response(result, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
     
     @action(detail=True, methods=['get'], url_path='logs')
     def get_logs(self, request, pk=None):
@@ -149,7 +276,8 @@ class MedicationViewSet(viewsets.ModelViewSet):
         
         medication.remaining_quantity += quantity
         medication.total_quantity += quantity
-        medication.save()
+        # post_save signal refreshes the stored risk snapshot
+        medication.save(update_fields=['remaining_quantity', 'total_quantity', 'updated_at'])
         
         return Response({
             'message': 'Medication refilled successfully',
@@ -165,39 +293,78 @@ class MedicationViewSet(viewsets.ModelViewSet):
         """
         medication = self.get_object()
         score = compute_noncompliance_risk(medication)
-        level = 'high' if score >= 0.7 else 'medium' if score >= 0.4 else 'low'
+        level = risk_level_for_score(score)
         return Response({'risk_score': round(score, 3), 'risk_level': level})
 
+    @action(detail=True, methods=['get'], url_path='adherence-trend')
+    def adherence_trend(self, request, pk=None):
+        """
+        Daily expected vs taken doses for charting, read from the adherence rollup
+        GET /medications/{id}/adherence-trend/?days=30 (max 365)
+        """
+        medication = self.get_object()
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except (TypeError, ValueError):
+            return Response({'detail': 'days must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        rows = {
+            row.date: row
+            for row in MedicationDailyAdherence.objects.filter(medication=medication, date__gte=start, date__lte=today)
+        }
+        data = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            row = rows.get(day)
+            # Days without intake may have no row yet (before a backfill)
+            expected = row.expected_doses if row else expected_doses_on(medication, day)
+            taken = row.taken_doses if row else 0
+            data.append({
+                'date': day,
+                'expected_doses': expected,
+                'taken_doses': taken,
+                'compliance_rate': round(min(taken / expected * 100, 100), 1) if expected else None,
+            })
+        return Response({'medication': medication.id, 'days': data})
+
     @action(detail=False, methods=['get'], url_path='at-risk')
     def at_risk(self, request):
-        """List medications with medium/high non-compliance risk for current viewer scope."""
-        meds = self.get_queryset().select_related('patient')
+        """
+        List medications with medium/high non-compliance risk for current viewer scope.
+        Reads the persisted risk_score (indexed) instead of rescoring every medication.
+        """
+        meds = (
+            self.get_queryset()
+            .filter(risk_score__gte=0.4)
+            .select_related('patient')
+            .order_by('-risk_score')
+        )
         data = []
         for m in meds:
-            score = compute_noncompliance_risk(m)
-            if score >= 0.4:
-                # Compose patient display name
-                patient = m.patient
+            score = m.risk_score
+            # Compose patient display name
+            patient = m.patient
+            patient_name = None
+            try:
+                first = getattr(patient, 'first_name', '') or ''
+                last = getattr(patient, 'last_name', '') or ''
+                full = f"{first} {last}".strip()
+                patient_name = full if full else getattr(patient, 'email', None)
+            except Exception:
                 patient_name = None
-                try:
-                    first = getattr(patient, 'first_name', '') or ''
-                    last = getattr(patient, 'last_name', '') or ''
-                    full = f"{first} {last}".strip()
-                    patient_name = full if full else getattr(patient, 'email', None)
-                except Exception:
-                    patient_name = None
-                data.append({
-                    'id': m.id,
-                    'patient': m.patient_id,
-                    'patient_name': patient_name,
-                    'name': m.name,
-                    'risk_score': round(score, 3),
-                    'risk_level': 'high' if score >= 0.7 else 'medium',
-                    'remaining_quantity': m.remaining_quantity,
-                    'total_quantity': m.total_quantity,
-                    'refill_threshold': m.refill_threshold,
-                })
-        return Response(sorted(data, key=lambda x: x['risk_score'], reverse=True))
+            data.append({
+                'id': m.id,
+                'patient': m.patient_id,
+                'patient_name': patient_name,
+                'name': m.name,
+                'risk_score': round(score, 3),
+                'risk_level': risk_level_for_score(score),
+                'remaining_quantity': m.remaining_quantity,
+                'total_quantity': m.total_quantity,
+                'refill_threshold': m.refill_threshold,
+            })
+        return Response(data)
 
     @action(detail=False, methods=['post'], url_path='scan-and-followups')
     def scan_and_followups(self, request):
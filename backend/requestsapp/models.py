@@ -16,6 +16,8 @@ class CareRequest(models.Model):
         ('cancelled', 'Cancelled'),
         ('declined', 'Declined'),
     ]
+    # Requests under which the caregiver currently looks after the patient
+    ACTIVE_STATUSES = ('accepted', 'in-progress')
     family = models.CharField(max_length=255)
     service = models.CharField(max_length=255)
     duration = models.CharField(max_length=100)
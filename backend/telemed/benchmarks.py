@@ -0,0 +1,157 @@
+"""
+Endpoint benchmark harness (see the benchmark command).
+
+Requests the hot API endpoints in-process through Django's test client (no
+network; real JWT authentication, so auth queries are counted) against a data
+set generated by seed_synthetic. Each endpoint is requested as the user that
+exercises it hardest: the doctor with the largest panel, one of that doctor's
+patients, or an admin. The report holds p50/p95 latency, query and duplicate
+query counts per endpoint and is written as a JSON baseline; compare() lists
+the endpoints that regressed against a baseline.
+"""
+import platform
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from appointments.models import Appointment
+from carenotes.models import CareNote
+from health.models import VitalReading
+from medications.models import Medication, MedicationLog
+
+from .instrumentation import QueryRecorder, _percentile
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    actor: str  # 'doctor', 'patient' or 'admin'
+    path: str   # may use {lat}, {lng} and {patient_id} of the patient actor
+
+
+BENCHMARKS = (
+    Benchmark('medications', 'doctor', '/api/medications/'),
+    Benchmark('medications-at-risk', 'doctor', '/api/medications/at-risk/'),
+    Benchmark('carenotes', 'doctor', '/api/carenotes/'),
+    Benchmark('caregivers-nearby', 'patient',
+              '/api/accounts/caregivers/?patient_lat={lat}&patient_lng={lng}&max_distance=25000'),
+    Benchmark('admin-analytics', 'admin', '/api/accounts/admin/analytics/'),
+    Benchmark('health-overview', 'patient', '/api/health/overview/'),
+    Benchmark('appointments', 'doctor', '/api/appointments/'),
+    Benchmark('free-slots', 'patient', '/api/appointments/free-slots/?duration=30&limit=10'),
+)
+
+# Metrics compared against a baseline; query counts are deterministic, so any increase counts
+LATENCY_METRICS = ('p50_ms', 'p95_ms')
+COUNT_METRICS = ('queries', 'duplicate_queries')
+
+
+def pick_actors(prefix='synthetic') -> dict:
+    """The users each benchmark runs as, chosen from the seed_synthetic data set with this prefix."""
+    users = get_user_model().objects.filter(username__startswith=f'{prefix}-')
+    doctor = (
+        users.filter(role='doctor').annotate(panel=Count('patients')).order_by('-panel', 'pk').first()
+    )
+    patient = (
+        users.filter(role='patient', doctor=doctor)
+        .annotate(n=Count('medications')).order_by('-n', 'pk').first()
+    )
+    admin = users.filter(role='admin').order_by('pk').first()
+    actors = {'doctor': doctor, 'patient': patient, 'admin': admin}
+    missing = sorted(role for role, user in actors.items() if user is None)
+    if missing:
+        raise RuntimeError(
+            f"No synthetic {', '.join(missing)} with prefix '{prefix}'; run seed_synthetic first."
+        )
+    return actors
+
+
+def dataset_summary() -> dict:
+    """Row counts of the tables the benchmarks read, stored with a baseline."""
+    roles = dict(get_user_model().objects.order_by().values_list('role').annotate(n=Count('pk')))
+    return {
+        **{f'{role}s': n for role, n in sorted(roles.items())},
+        'appointments': Appointment.objects.count(),
+        'care_notes': CareNote.objects.count(),
+        'medications': Medication.objects.count(),
+        'medication_logs': MedicationLog.objects.count(),
+        'vitals': VitalReading.objects.count(),
+    }
+
+
+def run_benchmarks(actors, benchmarks=BENCHMARKS, iterations=30, warmup=2) -> dict:
+    """Time every benchmark `iterations` times after `warmup` untimed requests; returns the report."""
+    client = Client()
+    patient = actors['patient']
+    context = {'lat': patient.latitude, 'lng': patient.longitude, 'patient_id': patient.pk}
+    auth = {
+        role: f'Bearer {RefreshToken.for_user(user).access_token}' for role, user in actors.items()
+    }
+
+    endpoints = {}
+    for bench in benchmarks:
+        path = bench.path.format(**context)
+        timings, queries, duplicates = [], [], []
+        for i in range(warmup + iterations):
+            recorder = QueryRecorder()
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(recorder))
+                started = time.perf_counter()
+                response = client.get(path, HTTP_AUTHORIZATION=auth[bench.actor])
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise RuntimeError(f'{bench.name}: GET {path} returned {response.status_code}')
+            if i >= warmup:
+                timings.append(elapsed_ms)
+                queries.append(recorder.count)
+                duplicates.append(recorder.duplicates)
+        timings.sort()
+        endpoints[bench.name] = {
+            'path': path,
+            'actor': bench.actor,
+            'p50_ms': round(_percentile(timings, 0.50), 3),
+            'p95_ms': round(_percentile(timings, 0.95), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'max_ms': round(timings[-1], 3),
+            'queries': max(queries),
+            'duplicate_queries': max(duplicates),
+            'response_bytes': len(response.content),
+        }
+    return {
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'iterations': iterations,
+        'warmup': warmup,
+        'dataset': dataset_summary(),
+        'endpoints': endpoints,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold=0.25, min_delta_ms=2.0) -> list:
+    """
+    Regressions of current against baseline, as dicts with endpoint, metric,
+    baseline and current values. A latency metric regresses when it grows by
+    more than `threshold` (a fraction) and by at least `min_delta_ms`; query
+    counts regress on any increase. Endpoints missing from either side are skipped.
+    """
+    regressions = []
+    for name, now in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if now[metric] > before[metric] * (1 + threshold) and now[metric] - before[metric] >= min_delta_ms:
+                regressions.append({'endpoint': name, 'metric': metric, 'baseline': before[metric], 'current': now[metric]})
+        for metric in COUNT_METRICS:
+            if now[metric] > before[metric]:
+                regressions.append({'endpoint': name, 'metric': metric, 'baseline': before[metric], 'current': now[metric]})
+    return regressions
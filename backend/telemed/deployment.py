@@ -31,6 +31,7 @@ SECRET_KEY = os.getenv('MY_SECRET_KEY', SECRET_KEY)
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'telemed.instrumentation.InstrumentationMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -193,4 +194,10 @@ else:
             "LOCATION": "telemed",
             "TIMEOUT": 300,
         }
-    }
\ No newline at end of file
+    }
+
+# Location write-behind buffer (accounts/location_buffer.py): on Redis every worker
+# and the flush_location_buffer command share one buffer
+CACHES["locations"] = {**CACHES["default"], "KEY_PREFIX": "telemed-locations", "TIMEOUT": None}
+if CACHES["default"]["BACKEND"].endswith("LocMemCache"):
+    CACHES["locations"].update(LOCATION="telemed-locations", OPTIONS={"MAX_ENTRIES": 100_000})
@@ -0,0 +1,175 @@
+"""
+Per-endpoint request instrumentation.
+
+InstrumentationMiddleware records, for every request and keyed by the resolved
+URL name: wall time, database time, query count, duplicate queries (the same
+SQL issued more than once, the usual N+1 signature) and response size. Samples
+are kept in a rolling window per endpoint (in-process, so one window per
+worker) and exposed to admins at /api/instrumentation/ (telemed/views.py).
+
+settings.QUERY_BUDGETS maps "<METHOD> <url name>" (or a bare URL name, for every
+method) to a maximum query count. Going over a budget logs a warning; under
+telemed.test_runner.BudgetEnforcingTestRunner it raises QueryBudgetExceeded so
+the test that made the request fails.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds per metric; the last bucket is open-ended
+HISTOGRAM_BUCKETS = {
+    'wall_ms': (5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    'db_ms': (1, 5, 10, 25, 50, 100, 250, 1000),
+    'queries': (1, 2, 5, 10, 20, 50, 100),
+    'duplicate_queries': (0, 1, 5, 10, 50),
+    'response_bytes': (1_000, 10_000, 100_000, 1_000_000),
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request issued more queries than its endpoint's QUERY_BUDGETS entry allows."""
+
+
+class QueryRecorder:
+    """execute_wrapper that counts, times and fingerprints the SQL a request runs."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self) -> int:
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+
+class MetricsRegistry:
+    """Thread-safe rolling window of request samples per endpoint."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._totals = Counter()
+
+    def record(self, endpoint: str, sample: dict):
+        with self._lock:
+            if endpoint not in self._samples:
+                self._samples[endpoint] = deque(maxlen=self.window)
+            self._samples[endpoint].append(sample)
+            self._totals[endpoint] += 1
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def snapshot(self) -> dict:
+        """Per-endpoint request totals plus percentiles and histograms over the window."""
+        with self._lock:
+            samples = {endpoint: list(window) for endpoint, window in self._samples.items()}
+            totals = dict(self._totals)
+        report = {}
+        for endpoint, rows in sorted(samples.items()):
+            metrics = {}
+            for metric, bounds in HISTOGRAM_BUCKETS.items():
+                values = sorted(row[metric] for row in rows if row.get(metric) is not None)
+                if values:
+                    metrics[metric] = _summarize(values, bounds)
+            report[endpoint] = {'requests': totals[endpoint], 'window': len(rows), 'metrics': metrics}
+        return report
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _summarize(values, bounds) -> dict:
+    buckets = Counter()
+    for value in values:
+        label = next((f'<={bound}' for bound in bounds if value <= bound), f'>{bounds[-1]}')
+        buckets[label] += 1
+    labels = [f'<={bound}' for bound in bounds] + [f'>{bounds[-1]}']
+    return {
+        'p50': _percentile(values, 0.50),
+        'p95': _percentile(values, 0.95),
+        'p99': _percentile(values, 0.99),
+        'max': values[-1],
+        'mean': round(sum(values) / len(values), 3),
+        'histogram': {label: buckets[label] for label in labels},
+    }
+
+
+registry = MetricsRegistry(getattr(settings, 'INSTRUMENTATION_WINDOW', 1000))
+
+
+def endpoint_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name
+
+
+class InstrumentationMiddleware:
+    """
+    Record timing, query and size metrics per URL name, optionally add them
+    as response headers and check the endpoint's query budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.db_seconds * 1000
+
+        endpoint = endpoint_name(request)
+        registry.record(endpoint, {
+            'wall_ms': round(wall_ms, 3),
+            'db_ms': round(db_ms, 3),
+            'queries': recorder.count,
+            'duplicate_queries': recorder.duplicates,
+            'response_bytes': None if response.streaming else len(response.content),
+        })
+
+        if getattr(settings, 'INSTRUMENTATION_RESPONSE_HEADERS', False):
+            response['Server-Timing'] = f'app;dur={wall_ms:.1f}, db;dur={db_ms:.1f}'
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Duplicate-Queries'] = str(recorder.duplicates)
+
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(f'{request.method} {endpoint}', budgets.get(endpoint))
+        if budget is not None and recorder.count > budget:
+            message = (
+                f'{request.method} {request.path} ({endpoint}) ran {recorder.count} queries, '
+                f'budget is {budget} ({recorder.duplicates} duplicates)'
+            )
+            if getattr(settings, 'INSTRUMENTATION_ENFORCE_BUDGETS', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
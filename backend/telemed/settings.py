@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'telemed.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -114,6 +115,65 @@ else:
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# --- Request instrumentation (telemed/instrumentation.py) ---
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '1') == '1'
+# Add Server-Timing / X-Query-Count / X-Duplicate-Queries headers to responses
+INSTRUMENTATION_RESPONSE_HEADERS = os.environ.get('INSTRUMENTATION_RESPONSE_HEADERS', '1' if DEBUG else '0') == '1'
+# Samples kept per endpoint for the rolling histograms
+INSTRUMENTATION_WINDOW = int(os.environ.get('INSTRUMENTATION_WINDOW', '1000'))
+# Max SQL queries per request, keyed "<METHOD> <url name>" (or a bare URL name for
+# every method). Overruns are logged; under the test runner below they fail the
+# test, so N+1 regressions are caught before deploy.
+QUERY_BUDGETS = {
+    'GET medication-list': 8,
+    'GET medication-prescriptions': 7,
+    'GET medication-at-risk': 2,
+    'GET medication-adherence-trend': 3,
+    'GET appointment-list': 3,
+    'GET dashboard-stats': 3,
+    'GET admin-analytics': 9,
+    'GET admin-user-list': 4,
+    'GET patients': 4,
+    'GET doctors': 4,
+    'GET people-search': 3,
+    'GET today-appointments': 2,
+    'GET free-slots': 4,
+}
+TEST_RUNNER = 'telemed.test_runner.BudgetEnforcingTestRunner'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'telemed',
+    },
+    # Location write-behind buffer; sized so buffered fixes are not culled
+    'locations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'telemed-locations',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+# --- Caregiver location write-behind (accounts/location_buffer.py) ---
+# PATCH /api/accounts/me/location/ buffers fixes in the cache and flushes them in bulk
+LOCATION_WRITE_BEHIND = os.environ.get('LOCATION_WRITE_BEHIND', '0') == '1'
+LOCATION_BUFFER_CACHE = 'locations'
+# At most one inline flush per this many seconds (0: only flush_location_buffer flushes)
+LOCATION_BUFFER_FLUSH_SECONDS = int(os.environ.get('LOCATION_BUFFER_FLUSH_SECONDS', '5'))
+# Days of caregiver location history kept by prune_location_history
+LOCATION_HISTORY_DAYS = int(os.environ.get('LOCATION_HISTORY_DAYS', '90'))
+# Dashboard statistics cache (accounts.stats_cache); invalidated by signals,
+# the timeout only bounds writes that bypass them
+STATS_CACHE = 'default'
+STATS_CACHE_SECONDS = int(os.environ.get('STATS_CACHE_SECONDS', '300'))
+# Free-slot search (appointments/slots.py): bookable hours, weekdays (0 is
+# Monday) and the grid free slots start on
+APPOINTMENT_DAY_START = os.environ.get('APPOINTMENT_DAY_START', '09:00')
+APPOINTMENT_DAY_END = os.environ.get('APPOINTMENT_DAY_END', '17:00')
+APPOINTMENT_WEEKDAYS = [int(day) for day in os.environ.get('APPOINTMENT_WEEKDAYS', '0,1,2,3,4').split(',')]
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', '15'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
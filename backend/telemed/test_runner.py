@@ -0,0 +1,18 @@
+"""
+Test runner for `manage.py test`.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class BudgetEnforcingTestRunner(DiscoverRunner):
+    """Test runner that turns QUERY_BUDGETS overruns into test failures."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budget_override = override_settings(INSTRUMENTATION_ENFORCE_BUDGETS=True)
+        self._budget_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._budget_override.disable()
+        super().teardown_test_environment(**kwargs)
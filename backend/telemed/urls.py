@@ -10,6 +10,7 @@ from django.http import HttpResponse, JsonResponse
 from pathlib import Path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .health_check import health_check, environment_check
+from .views import InstrumentationView
 import sys
 import traceback
 
@@ -67,6 +68,7 @@ urlpatterns = [
     path('health/', health_check, name='health-check'),
     path('api/health/', health_check, name='api-health-check'),
     path('api/environment/', environment_check, name='environment-check'),
+    path('api/instrumentation/', InstrumentationView.as_view(), name='instrumentation'),
     path('admin/', admin.site.urls),
     path('api/auth/token/', DebugTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
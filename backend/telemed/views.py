@@ -0,0 +1,33 @@
+"""
+Project-level API views that do not belong to a single app.
+"""
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts import stats_cache
+from accounts.views import IsAdmin
+
+from .instrumentation import registry
+
+
+class InstrumentationView(APIView):
+    """
+    Rolling per-endpoint request metrics and stats cache hit/miss counters for admins.
+    GET /api/instrumentation/ returns the report, DELETE clears it.
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response({
+            'window': registry.window,
+            'budgets': getattr(settings, 'QUERY_BUDGETS', {}),
+            'endpoints': registry.snapshot(),
+            'caches': stats_cache.snapshot(),
+        })
+
+    def delete(self, request):
+        registry.reset()
+        stats_cache.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
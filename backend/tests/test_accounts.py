@@ -85,11 +85,37 @@ class AccountsApiTests(APITestCase):
             'max_distance': 1000  # meters
         })
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        emails = [r['email'] for r in resp.data]
+        emails = [r['email'] for r in resp.data['results']]
         self.assertIn(self.caregiver.email, emails)
         self.assertIn(near.email, emails)
         self.assertNotIn(far.email, emails)
 
+    def test_caregiver_k_nearest_is_paginated_and_uses_location_updates(self):
+        self.auth_as(self.caregiver)
+        resp = self.client.patch(reverse('me-location'), {'latitude': -1.2921, 'longitude': 36.8219}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.caregiver.refresh_from_db()
+        self.assertTrue(self.caregiver.geohash.startswith('kzf0'))
+        # Spread caregivers from ~1km to ~60km north of the patient
+        others = [
+            create_caregiver(f"ring{i}@example.com", latitude=-1.2921 + 0.01 * 2 ** i, longitude=36.8219)
+            for i in range(7)
+        ]
+        self.auth_as(self.patient)
+        url = reverse('caregivers')
+        resp = self.client.get(url, {'patient_lat': -1.2921, 'patient_lng': 36.8219, 'k': 4, 'page_size': 3})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['count'], 4)
+        self.assertEqual([r['email'] for r in resp.data['results']],
+                         [self.caregiver.email, others[0].email, others[1].email])
+        distances = [r['distance'] for r in resp.data['results']]
+        self.assertEqual(distances, sorted(distances))
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([r['email'] for r in resp.data['results']], [others[2].email])
+        # k nearest within a radius: only three caregivers are within 2.5km
+        resp = self.client.get(url, {'patient_lat': -1.2921, 'patient_lng': 36.8219, 'k': 4, 'max_distance': 2500})
+        self.assertEqual(resp.data['count'], 3)
+
     def test_verification_document_upload_and_admin_review(self):
         # upload as caregiver
         self.auth_as(self.caregiver)
@@ -136,6 +162,29 @@ class AccountsApiTests(APITestCase):
         for key in ["todayAppointments", "totalPatients", "pendingConsults", "completedToday"]:
             self.assertIn(key, resp.data)
 
+    def test_user_lists_in_constant_queries(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from accounts.models import VerificationDocument
+        for i in range(5):
+            create_patient(f"extra{i}@example.com", doctor=self.doctor)
+        for user in (self.doctor, self.caregiver):
+            for days_ago, name in [(3, 'old.pdf'), (1, 'latest.pdf'), (2, 'middle.pdf')]:
+                doc = VerificationDocument.objects.create(user=user, file=f'verification_docs/{user.pk}-{name}')
+                VerificationDocument.objects.filter(pk=doc.pk).update(uploaded_at=timezone.now() - timedelta(days=days_ago))
+        self.auth_as(self.admin)
+        # Page count, page, latest documents
+        for name in ['admin-user-list', 'patients', 'doctors', 'caregivers']:
+            with self.assertNumQueries(3):
+                resp = self.client.get(reverse(name))
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        rows = {row['email']: row for row in self.client.get(reverse('admin-user-list')).data['results']}
+        for user in (self.doctor, self.caregiver):
+            self.assertTrue(rows[user.email]['latest_verification_document_url'].endswith(f'{user.pk}-latest.pdf'))
+            self.assertIsNotNone(rows[user.email]['latest_verification_document_uploaded_at'])
+        self.assertIsNone(rows[self.patient.email]['latest_verification_document_url'])
+        self.assertEqual(rows[self.patient.email]['doctor_name'], 'Doc One')
+
     def test_admin_analytics_shape(self):
         # Seed a few cross-domain objects
         from appointments.models import Appointment
@@ -151,3 +200,37 @@ class AccountsApiTests(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         for k in ['users', 'appointments', 'health', 'medications', 'insights']:
             self.assertIn(k, resp.data)
+
+    def test_admin_analytics_counts_in_constant_queries(self):
+        from accounts import analytics
+        from appointments.models import Appointment
+        from health.models import LabResult
+        from datetime import date, time, timedelta
+        today = date.today()
+        for days_ago, apt_status in [(0, 'scheduled'), (0, 'cancelled'), (2, 'completed'), (40, 'completed')]:
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=today - timedelta(days=days_ago),
+                                       time=time(9, 0), type='Check', status=apt_status)
+        LabResult.objects.create(patient=self.patient, test='HbA1c', value='6.1', status='normal', date=today)
+        self.auth_as(self.admin)
+        url = reverse('admin-analytics')
+        # Same count whether days come from the daily rollup or are counted live
+        for rollup in (False, True):
+            if rollup:
+                analytics.sync()
+            for params in [{}, {'date_from': (today - timedelta(days=10)).isoformat(), 'date_to': today.isoformat()}]:
+                with self.assertNumQueries(8):
+                    resp = self.client.get(url, params)
+                self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        users, apts = resp.data['users'], resp.data['appointments']
+        self.assertEqual((users['total'], users['patients'], users['doctors'], users['caregivers'], users['admins']),
+                         (4, 1, 1, 1, 1))
+        self.assertEqual(users['trend'][-1], {'date': today.isoformat(), 'count': 4})
+        # Totals and statuses follow the date filter; today/this week do not
+        self.assertEqual((apts['total'], apts['scheduled'], apts['cancelled'], apts['completed']), (3, 1, 1, 1))
+        self.assertEqual(apts['by_status'], [{'status': 'cancelled', 'count': 1}, {'status': 'completed', 'count': 1},
+                                             {'status': 'scheduled', 'count': 1}])
+        self.assertEqual(apts['today'], 2)
+        self.assertEqual(len(apts['trend']), 11)
+        self.assertEqual(apts['trend'][-1]['count'], 2)
+        self.assertEqual(resp.data['health']['total_labs'], 1)
+        self.assertEqual(resp.data['health']['total_vitals'], 0)
@@ -0,0 +1,148 @@
+"""
+Tests for the admin dashboard's daily rollup (accounts.analytics) and the
+rollup_daily_metrics command.
+"""
+from datetime import time, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from accounts import analytics
+from accounts.models import DailyMetrics, User
+from appointments.models import Appointment
+from health.models import VitalReading
+from medications.models import Medication
+from medications.rollup import day_start
+from .factories import create_admin, create_doctor, create_patient
+
+
+def days_ago(n):
+    return timezone.localdate() - timedelta(days=n)
+
+
+def joined(user, n):
+    User.objects.filter(pk=user.pk).update(date_joined=day_start(days_ago(n)) + timedelta(hours=9))
+
+
+def book(patient, doctor, n, status='completed'):
+    return Appointment.objects.create(patient=patient, doctor=doctor, date=days_ago(n), time=time(9, 0),
+                                      type='Check', status=status)
+
+
+class DailyMetricsSyncTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.patient = create_patient(doctor=self.doctor)
+        joined(self.doctor, 5)
+        joined(self.patient, 3)
+        self.appointment = book(self.patient, self.doctor, 2)
+        book(self.patient, self.doctor, 0, status='scheduled')
+
+    def test_sync_writes_missing_and_changed_days_only(self):
+        self.assertEqual(analytics.sync(), 5)
+        self.assertEqual(DailyMetrics.objects.count(), 5)
+        self.assertEqual(DailyMetrics.objects.first().date, days_ago(1))
+        day = DailyMetrics.objects.get(date=days_ago(2))
+        self.assertEqual((day.appointments, day.appointments_completed), (1, 1))
+        self.assertEqual(DailyMetrics.objects.get(date=days_ago(3)).new_patients, 1)
+        self.assertEqual(analytics.sync(), 0)
+
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='cancelled')
+        self.assertEqual(analytics.sync(days_ago(2)), 1)
+        day.refresh_from_db()
+        self.assertEqual((day.appointments_completed, day.appointments_cancelled), (0, 1))
+
+        # Deleted days are refilled even outside the range rechecked
+        DailyMetrics.objects.filter(date=days_ago(4)).delete()
+        self.assertEqual(analytics.sync(days_ago(1)), 1)
+        self.assertEqual(DailyMetrics.objects.count(), 5)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('rollup_daily_metrics', stdout=out)
+        self.assertIn('Wrote 5 daily metrics rows', out.getvalue())
+        call_command('rollup_daily_metrics', days=2, stdout=out)
+        self.assertIn('Wrote 0 daily metrics rows', out.getvalue())
+        # A recheck of recent days misses older edits; --all covers the whole history
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='cancelled')
+        DailyMetrics.objects.filter(date=days_ago(5)).update(new_users=0)
+        out = StringIO()
+        call_command('rollup_daily_metrics', days=3, stdout=out)
+        self.assertIn('Wrote 1 daily metrics rows', out.getvalue())
+        out = StringIO()
+        call_command('rollup_daily_metrics', all=True, stdout=out)
+        self.assertIn('Wrote 1 daily metrics rows', out.getvalue())
+
+
+class AdminAnalyticsRollupTests(APITestCase):
+    def setUp(self):
+        self.admin = create_admin()
+        self.doctor = create_doctor()
+        self.patient = create_patient(doctor=self.doctor)
+        joined(self.doctor, 40)
+        joined(self.patient, 10)
+        for n, status in [(20, 'completed'), (3, 'completed'), (1, 'cancelled'), (0, 'scheduled'), (-5, 'scheduled')]:
+            book(self.patient, self.doctor, n, status)
+        vital = VitalReading.objects.create(patient=self.patient, heart_rate=70)
+        VitalReading.objects.filter(pk=vital.pk).update(created_at=day_start(days_ago(2)))
+        VitalReading.objects.create(patient=self.patient, heart_rate=72)
+        self.client.force_authenticate(self.admin)
+
+    def analytics(self, **params):
+        resp = self.client.get(reverse('admin-analytics'), params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_same_figures_with_or_without_rollup(self):
+        params = {'date_from': days_ago(4).isoformat(), 'date_to': days_ago(-6).isoformat()}
+        live = [self.analytics(), self.analytics(**params)]
+        analytics.sync()
+        self.assertTrue(DailyMetrics.objects.exists())
+        self.assertEqual([self.analytics(), self.analytics(**params)], live)
+        # A rollup that stops short of yesterday is topped up live
+        DailyMetrics.objects.filter(date__gte=days_ago(3)).delete()
+        self.assertEqual([self.analytics(), self.analytics(**params)], live)
+
+        users, apts, health = live[0]['users'], live[0]['appointments'], live[0]['health']
+        self.assertEqual((users['total'], users['doctors'], users['patients'], users['recent_registrations']),
+                         (3, 1, 1, 2))
+        self.assertEqual((apts['total'], apts['today'], apts['completed'], apts['scheduled']), (5, 1, 2, 2))
+        self.assertEqual((health['total_vitals'], health['recent_vitals']), (2, 2))
+        in_range = live[1]['appointments']
+        self.assertEqual((in_range['total'], in_range['cancelled']), (4, 1))
+        self.assertEqual(sum(day['count'] for day in in_range['trend']), 4)
+
+    def test_totals_follow_old_changes_without_a_resync(self):
+        leaving = create_patient('leaving@example.com')
+        joined(leaving, 15)
+        analytics.sync()
+        # Outside any bounded recheck: an old appointment cancelled, an old user deleted
+        Appointment.objects.filter(date=days_ago(20)).update(status='cancelled')
+        leaving.delete()
+        data = self.analytics()
+        self.assertEqual((data['users']['total'], data['users']['patients']), (3, 1))
+        apts = data['appointments']
+        self.assertEqual((apts['total'], apts['completed'], apts['cancelled']), (5, 1, 2))
+
+    def test_compliance_is_read_from_the_snapshot(self):
+        medication = Medication.objects.create(patient=self.patient, name='Med', dosage='5mg',
+                                               frequency='once daily', compliance=80)
+        self.assertEqual(self.analytics()['medications']['avg_compliance'], 80)
+        analytics.sync()
+        Medication.objects.filter(pk=medication.pk).update(compliance=20)
+        self.assertEqual(self.analytics()['medications']['avg_compliance'], 80)
+        DailyMetrics.objects.update(avg_compliance=None)
+        self.assertEqual(self.analytics()['medications']['avg_compliance'], 20)
+
+    def test_today_is_counted_live(self):
+        analytics.sync()
+        before = self.analytics()
+        book(self.patient, self.doctor, 0)
+        create_patient('new@example.com')
+        after = self.analytics()
+        self.assertEqual(after['appointments']['today'], before['appointments']['today'] + 1)
+        self.assertEqual(after['users']['patients'], before['users']['patients'] + 1)
+        self.assertEqual(after['users']['trend'][-1]['count'], before['users']['trend'][-1]['count'] + 1)
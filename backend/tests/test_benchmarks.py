@@ -0,0 +1,43 @@
+"""
+Tests for the endpoint benchmark harness.
+"""
+from django.test import TestCase
+
+from accounts.synthetic import SyntheticSeeder
+from telemed.benchmarks import BENCHMARKS, compare, pick_actors, run_benchmarks
+
+
+class BenchmarkHarnessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticSeeder(prefix='bench', seed=3).run(
+            doctors=2, patients=15, caregivers=4, vitals_years=1, history_days=14,
+        )
+
+    def test_every_benchmark_runs_and_reports(self):
+        report = run_benchmarks(pick_actors('bench'), iterations=2, warmup=0)
+        self.assertEqual(set(report['endpoints']), {b.name for b in BENCHMARKS})
+        self.assertEqual(report['dataset']['patients'], 15)
+        for row in report['endpoints'].values():
+            self.assertGreater(row['queries'], 0)
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+
+    def test_missing_data_set_is_reported(self):
+        with self.assertRaises(RuntimeError):
+            pick_actors('absent')
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        def report(p50, p95, queries):
+            return {'endpoints': {'medications': {
+                'p50_ms': p50, 'p95_ms': p95, 'queries': queries, 'duplicate_queries': 0,
+            }}}
+
+        baseline = report(10.0, 20.0, 8)
+        self.assertEqual(compare(baseline, report(12.0, 24.0, 8), threshold=0.25), [])
+        # Relative growth below min_delta_ms is noise
+        self.assertEqual(compare(report(1.0, 1.0, 8), report(1.5, 1.5, 8), threshold=0.25), [])
+        regressions = compare(baseline, report(10.0, 30.0, 9), threshold=0.25)
+        self.assertEqual(
+            sorted((r['metric'], r['baseline'], r['current']) for r in regressions),
+            [('p95_ms', 20.0, 30.0), ('queries', 8, 9)],
+        )
@@ -0,0 +1,122 @@
+"""
+Tests for appointment conflict detection (appointments.conflicts) on booking,
+rescheduling and schedule validation.
+"""
+from datetime import date, time
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+from appointments import conflicts
+from appointments.models import Appointment
+from .factories import create_caregiver, create_doctor, create_patient
+
+DAY = date(2030, 3, 4)
+
+
+class ConflictTests(APITestCase):
+    def setUp(self):
+        self.doctor = create_doctor('doc@example.com')
+        self.other_doctor = create_doctor('doc2@example.com')
+        self.patient = create_patient('pat@example.com', doctor=self.doctor)
+
+    def book(self, at, minutes=30, doctor=None, day=DAY, **kwargs):
+        return Appointment.objects.create(patient=self.patient, doctor=doctor or self.doctor, date=day, time=at,
+                                          duration_minutes=minutes, type='Consult', **kwargs)
+
+    def slot(self, at, minutes=30, doctor=None, day=DAY, **kwargs):
+        return Appointment(doctor=doctor or self.doctor, date=day, time=at, duration_minutes=minutes, **kwargs)
+
+    def clashes(self, *proposals):
+        return [(c.appointment.time, c.other.time) for c in conflicts.find_conflicts(proposals)]
+
+    def test_overlaps_with_bookings(self):
+        self.book(time(9, 0), 60)
+        self.book(time(11, 0), 30, status='cancelled')
+        self.book(time(9, 0), 60, doctor=self.other_doctor)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.clashes(self.slot(time(9, 30))), [(time(9, 30), time(9, 0))])
+        self.assertEqual(self.clashes(self.slot(time(8, 30), 120)), [(time(8, 30), time(9, 0))])
+        # Back to back, cancelled bookings and other doctors do not clash
+        self.assertEqual(self.clashes(self.slot(time(8, 30)), self.slot(time(10, 0)), self.slot(time(11, 0))), [])
+        self.assertEqual(self.clashes(self.slot(time(9, 0), status='cancelled')), [])
+
+    def test_across_midnight(self):
+        self.book(time(23, 0), 120, day=date(2030, 3, 3))
+        self.assertEqual(self.clashes(self.slot(time(0, 30))), [(time(0, 30), time(23, 0))])
+        self.assertEqual(self.clashes(self.slot(time(1, 0))), [])
+        late = self.slot(time(23, 30), 60)
+        self.book(time(0, 15), day=date(2030, 3, 5))
+        self.assertEqual(self.clashes(late), [(time(23, 30), time(0, 15))])
+
+    def test_bulk_schedule_in_one_query(self):
+        moved = self.book(time(9, 0))
+        self.book(time(14, 0))
+        for hour in range(20):
+            self.book(time(hour, 0), 45, doctor=self.other_doctor, day=date(2030, 3, 10))
+        proposals = [
+            self.slot(time(8, 45), pk=moved.pk),  # moving a booking frees its old slot
+            self.slot(time(9, 0)),
+            self.slot(time(13, 45)),
+            self.slot(time(9, 10), doctor=self.other_doctor, day=date(2030, 3, 10)),
+        ]
+        with self.assertNumQueries(1):
+            self.assertEqual(self.clashes(*proposals), [
+                (time(9, 0), time(8, 45)),
+                (time(13, 45), time(14, 0)),
+                (time(9, 10), time(9, 0)),
+            ])
+
+    def test_booking_and_rescheduling_through_the_api(self):
+        booked = self.book(time(10, 0))
+        self.client.force_authenticate(self.doctor)
+        payload = {'patient_id': self.patient.id, 'doctor_id': self.doctor.id, 'date': DAY.isoformat(),
+                   'time': '09:45:00', 'duration_minutes': 30, 'type': 'Consult'}
+        resp = self.client.post('/api/appointments/', payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['time'], ['Already booked on 2030-03-04 from 10:00 to 10:30.'])
+        resp = self.client.post('/api/appointments/', {**payload, 'duration_minutes': 15}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['duration_minutes'], 15)
+
+        # Moving within its own slot is fine; onto the new booking is not
+        resp = self.client.patch(f'/api/appointments/{booked.id}/', {'time': '10:10:00'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.patch(f'/api/appointments/{booked.id}/', {'time': '09:30:00'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        booked.refresh_from_db()
+        self.assertEqual(booked.time, time(10, 10))
+
+    def test_overlapping_legacy_bookings_stay_editable(self):
+        # Written before durations were checked: both got the 60-minute default
+        first = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=DAY, time=time(9, 0), type='Consult')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=DAY, time=time(9, 30), type='Consult')
+        self.client.force_authenticate(self.doctor)
+        url = f'/api/appointments/{first.id}/'
+        for change in ({'status': 'in-progress'}, {'notes': 'x'}, {'time': '09:00:00'}):
+            resp = self.client.patch(url, change, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK, change)
+        # Taking more time is still checked
+        resp = self.client.patch(url, {'duration_minutes': 90}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.notes, first.duration_minutes), ('in-progress', 'x', 60))
+
+    def test_validate_schedule_endpoint(self):
+        booked = self.book(time(10, 0))
+        caregiver = create_caregiver('care@example.com')
+        self.client.force_authenticate(self.doctor)
+        resp = self.client.post('/api/appointments/validate-schedule/', [
+            {'doctor_id': self.doctor.id, 'date': DAY.isoformat(), 'time': '10:15'},
+            {'doctor_id': caregiver.id, 'date': DAY.isoformat(), 'time': '08:00', 'duration_minutes': 240},
+            {'doctor_id': caregiver.id, 'date': DAY.isoformat(), 'time': '11:00'},
+        ], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(resp.data['valid'])
+        self.assertEqual(resp.data['conflicts'][0]['index'], 0)
+        self.assertEqual(resp.data['conflicts'][0]['conflicts_with']['id'], booked.id)
+        self.assertEqual(resp.data['conflicts'][1], {'index': 2, 'conflicts_with': {'index': 1}})
+
+        resp = self.client.post('/api/appointments/validate-schedule/', [
+            {'id': booked.id, 'doctor_id': self.doctor.id, 'date': DAY.isoformat(), 'time': '10:15'},
+        ], format='json')
+        self.assertEqual(resp.data, {'valid': True, 'conflicts': []})
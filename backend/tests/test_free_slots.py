@@ -0,0 +1,105 @@
+"""
+Tests for the free-slot search across doctors (appointments.slots) and its endpoint.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from appointments import slots
+from appointments.models import Appointment
+from .factories import create_doctor, create_patient
+
+MONDAY = date(2030, 3, 4)
+
+
+@override_settings(APPOINTMENT_DAY_START='09:00', APPOINTMENT_DAY_END='12:00',
+                   APPOINTMENT_WEEKDAYS=[0, 1, 2, 3, 4], APPOINTMENT_SLOT_MINUTES=15)
+class FreeSlotTests(APITestCase):
+    def setUp(self):
+        self.doctor = create_doctor('doc@example.com', specializations=['Cardiology'])
+        self.other_doctor = create_doctor('doc2@example.com', specializations=['Dermatology'])
+        self.patient = create_patient('pat@example.com', doctor=self.doctor)
+
+    def book(self, at, minutes=30, doctor=None, day=MONDAY, **kwargs):
+        return Appointment.objects.create(patient=self.patient, doctor=doctor or self.doctor, date=day, time=at,
+                                          duration_minutes=minutes, type='Consult', **kwargs)
+
+    def starts(self, doctors, minutes=30, limit=10, first=MONDAY, last=MONDAY):
+        return [(slot.doctor_id, slot.start) for slot in slots.free_slots([d.pk for d in doctors], first, last, minutes, limit)]
+
+    def test_gaps_between_merged_bookings(self):
+        self.book(time(9, 0))
+        self.book(time(10, 0), 60)
+        self.book(time(10, 30), 15)
+        self.book(time(9, 30), status='cancelled')
+        at = lambda hour, minute: (self.doctor.pk, datetime.combine(MONDAY, time(hour, minute)))
+        self.assertEqual(self.starts([self.doctor]), [at(9, 30), at(11, 0), at(11, 15), at(11, 30)])
+        self.assertEqual(self.starts([self.doctor], minutes=45), [at(11, 0), at(11, 15)])
+
+    def test_earliest_across_doctors_and_days(self):
+        self.book(time(9, 0), 180)
+        self.book(time(9, 0), 150, doctor=self.other_doctor)
+        # From Monday evening until 09:30 on Tuesday
+        self.book(time(23, 0), 630, doctor=self.other_doctor)
+        found = self.starts([self.doctor, self.other_doctor], limit=4, last=MONDAY + timedelta(days=1))
+        self.assertEqual(found, [
+            (self.other_doctor.pk, datetime(2030, 3, 4, 11, 30)),
+            (self.doctor.pk, datetime(2030, 3, 5, 9, 0)),
+            (self.doctor.pk, datetime(2030, 3, 5, 9, 15)),
+            (self.doctor.pk, datetime(2030, 3, 5, 9, 30)),
+        ])
+        # Searching from Tuesday still sees the booking that started the day before
+        tuesday = MONDAY + timedelta(days=1)
+        self.assertEqual(self.starts([self.other_doctor], limit=1, first=tuesday, last=tuesday),
+                         [(self.other_doctor.pk, datetime(2030, 3, 5, 9, 30))])
+
+    def test_reads_further_windows_only_when_needed(self):
+        # Fully booked for the first window, weekend days are not bookable
+        for day in range(slots.FIRST_WINDOW_DAYS):
+            self.book(time(9, 0), 180, day=MONDAY + timedelta(days=day))
+        last = MONDAY + timedelta(days=30)
+        with self.assertNumQueries(2):
+            found = self.starts([self.doctor], limit=1, last=last)
+        self.assertEqual(found, [(self.doctor.pk, datetime(2030, 3, 11, 9, 0))])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.starts([self.other_doctor], limit=3, last=last)), 3)
+
+    def test_not_in_the_past(self):
+        now = timezone.localtime().replace(tzinfo=None)
+        found = self.starts([self.doctor], first=now.date() - timedelta(days=3), last=now.date() + timedelta(days=7))
+        self.assertTrue(found)
+        self.assertTrue(all(start >= now for _, start in found))
+
+    def test_endpoint(self):
+        self.book(time(9, 0), 120)
+        self.client.force_authenticate(self.patient)
+        url = '/api/appointments/free-slots/'
+        params = {'start': MONDAY.isoformat(), 'end': MONDAY.isoformat(), 'duration': 60, 'limit': 2}
+        with self.assertNumQueries(2):
+            resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([(r['doctor']['email'], r['time']) for r in resp.data['results']],
+                         [('doc2@example.com', '09:00:00'), ('doc2@example.com', '09:15:00')])
+
+        resp = self.client.get(url, {**params, 'specialization': 'cardiology'})
+        self.assertEqual([(r['doctor']['email'], r['time']) for r in resp.data['results']],
+                         [('doc@example.com', '11:00:00')])
+        slot = resp.data['results'][0]
+        # Every slot of both doctors: 09:00 to 11:00 and 11:00
+        resp = self.client.get(url, {**params, 'doctor': f'{self.other_doctor.pk},{self.doctor.pk}', 'limit': 20})
+        self.assertEqual(len(resp.data['results']), 10)
+
+        # A slot found can be booked
+        self.client.force_authenticate(self.doctor)
+        resp = self.client.post('/api/appointments/', {
+            'patient_id': self.patient.id, 'doctor_id': slot['doctor']['id'], 'date': slot['date'], 'time': slot['time'],
+            'duration_minutes': slot['duration_minutes'], 'type': 'Follow-up',
+        }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        resp = self.client.get(url, {'start': MONDAY.isoformat(), 'end': (MONDAY + timedelta(days=31)).isoformat()})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get(url, {'start': MONDAY.isoformat(), 'end': (MONDAY - timedelta(days=1)).isoformat()})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
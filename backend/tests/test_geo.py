@@ -0,0 +1,52 @@
+"""
+Tests for the geohash spatial index behind caregiver proximity search.
+"""
+import random
+
+from django.test import TestCase
+from accounts import geo
+from accounts.models import User
+from .factories import create_caregiver
+
+
+class GeohashIndexTests(TestCase):
+    def test_encode_geohash(self):
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geo.encode_geohash(-1.2921, 36.8219, 5), 'kzf0t')
+
+    def test_save_keeps_geohash_in_sync(self):
+        caregiver = create_caregiver('geo@example.com', latitude=-4.0435, longitude=39.6682)
+        self.assertEqual(caregiver.geohash, geo.encode_geohash(-4.0435, 39.6682))
+        caregiver.latitude = caregiver.longitude = None
+        caregiver.save(update_fields=['latitude', 'longitude'])
+        caregiver.refresh_from_db()
+        self.assertEqual(caregiver.geohash, '')
+
+    def test_indexed_search_matches_brute_force(self):
+        rng = random.Random(5)
+        points = {}
+        for i in range(150):
+            lat, lon = rng.gauss(-1.29, 0.3), rng.gauss(36.82, 0.3)
+            caregiver = User.objects.create(
+                email=f'c{i}@example.com', username=f'c{i}', role='caregiver', latitude=lat, longitude=lon,
+            )
+            points[caregiver.pk] = (lat, lon)
+        qs = User.objects.filter(role='caregiver')
+        for _ in range(5):
+            lat, lon = rng.gauss(-1.29, 0.3), rng.gauss(36.82, 0.3)
+            exact = sorted((geo.haversine_m(lat, lon, *p), pk) for pk, p in points.items())
+            for radius in (1000, 8000, 30000, 120000):
+                expected = [pk for d, pk in exact if d <= radius]
+                self.assertEqual([pk for pk, _ in geo.nearest(qs, lat, lon, max_distance=radius)], expected)
+            for k in (1, 10, 149):
+                self.assertEqual([pk for pk, _ in geo.nearest(qs, lat, lon, k=k)], [pk for _, pk in exact[:k]])
+
+    def test_vectorised_ranking_is_identical_to_scalar(self):
+        rng = random.Random(11)
+        rows = [(i, rng.uniform(-1.6, -1.0), rng.uniform(36.5, 37.1)) for i in range(1, 2001)]
+        rows += [(5000 + i, lat, lon) for i, lat, lon in rows[:50]]  # exact distance ties
+        lat, lon = -1.29, 36.82
+        for radius, k in ((None, None), (15000, None), (None, 1), (None, 75), (20000, 300), (500, 10)):
+            scalar = geo._rank_rows(rows, lat, lon, radius, k)
+            vectorised = list(geo._rank_rows_vectorised(rows, lat, lon, radius, k))
+            self.assertEqual(vectorised, scalar)
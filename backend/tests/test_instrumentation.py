@@ -0,0 +1,52 @@
+"""
+Tests for the request instrumentation middleware.
+Covers per-endpoint metrics, response headers, the admin metrics endpoint
+and query budget enforcement.
+"""
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from telemed.instrumentation import QueryBudgetExceeded, registry
+from .factories import create_admin, create_doctor, create_patient
+
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.admin = create_admin('instr-admin@example.com')
+        self.doctor = create_doctor('instr-doc@example.com')
+        for i in range(3):
+            create_patient(f'instr-pat{i}@example.com', doctor=self.doctor)
+
+    @override_settings(INSTRUMENTATION_RESPONSE_HEADERS=True)
+    def test_response_headers_report_queries(self):
+        self.client.force_authenticate(self.doctor)
+        r = self.client.get('/api/accounts/patients/')
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertGreater(int(r['X-Query-Count']), 0)
+        self.assertIn('db;dur=', r['Server-Timing'])
+        self.assertIn('X-Duplicate-Queries', r)
+
+    def test_admin_metrics_endpoint(self):
+        self.client.force_authenticate(self.doctor)
+        for _ in range(2):
+            self.client.get('/api/medications/')
+        self.assertEqual(self.client.get('/api/instrumentation/').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.admin)
+        r = self.client.get('/api/instrumentation/')
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        stats = r.data['endpoints']['medication-list']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(sum(stats['metrics']['queries']['histogram'].values()), 2)
+        for metric in ('wall_ms', 'db_ms', 'duplicate_queries', 'response_bytes'):
+            self.assertIn('p95', stats['metrics'][metric])
+
+        self.assertEqual(self.client.delete('/api/instrumentation/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNotIn('medication-list', registry.snapshot())
+
+    def test_query_budget_overrun_fails(self):
+        self.client.force_authenticate(self.doctor)
+        with override_settings(QUERY_BUDGETS={'GET patients': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/accounts/patients/')
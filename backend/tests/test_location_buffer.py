@@ -0,0 +1,86 @@
+"""
+Tests for the write-behind location buffer (LOCATION_WRITE_BEHIND).
+"""
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from accounts import geo, location_buffer
+from .factories import create_caregiver, create_patient
+
+
+@override_settings(LOCATION_WRITE_BEHIND=True, LOCATION_BUFFER_FLUSH_SECONDS=0)
+class LocationBufferTests(APITestCase):
+    def setUp(self):
+        caches['locations'].clear()
+        self.addCleanup(caches['locations'].clear)
+        self.patient = create_patient('pat@example.com')
+        self.caregiver = create_caregiver('care@example.com', latitude=-4.0435, longitude=39.6682)
+
+    def move(self, user, lat, lng):
+        self.client.force_authenticate(user)
+        resp = self.client.patch(reverse('me-location'), {'latitude': lat, 'longitude': lng}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_updates_are_buffered_and_flushed_in_bulk(self):
+        other = create_caregiver('care2@example.com')
+        self.move(self.caregiver, -1.30, 36.80)
+        self.move(self.caregiver, -1.2921, 36.8219)
+        self.move(other, 0.5143, 35.2698)
+        self.caregiver.refresh_from_db()
+        self.assertEqual(self.caregiver.latitude, -4.0435)
+        self.assertEqual(set(location_buffer.pending()), {self.caregiver.pk, other.pk})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(location_buffer.flush(), 2)
+        # One bulk UPDATE of the users, one INSERT of their location history
+        writes = [q['sql'].split()[0] for q in ctx.captured_queries if q['sql'].startswith(('UPDATE', 'INSERT'))]
+        self.assertEqual(writes, ['UPDATE', 'INSERT'])
+        self.caregiver.refresh_from_db()
+        other.refresh_from_db()
+        # Only the latest fix is kept, and the geohash index follows it
+        self.assertEqual((self.caregiver.latitude, self.caregiver.longitude), (-1.2921, 36.8219))
+        self.assertEqual(self.caregiver.geohash, geo.encode_geohash(-1.2921, 36.8219))
+        self.assertIsNotNone(self.caregiver.location_updated_at)
+        self.assertEqual(other.geohash, geo.encode_geohash(0.5143, 35.2698))
+        self.assertEqual(location_buffer.pending(), {})
+        self.assertEqual(location_buffer.flush(), 0)
+
+    def test_proximity_search_reads_through_the_buffer(self):
+        self.move(self.caregiver, -1.2921, 36.8219)
+        self.client.force_authenticate(self.patient)
+        resp = self.client.get(reverse('caregivers'), {'patient_lat': -1.2921, 'patient_lng': 36.8219, 'max_distance': 1000})
+        self.assertEqual([r['email'] for r in resp.data['results']], [self.caregiver.email])
+        self.assertEqual(resp.data['results'][0]['latitude'], -1.2921)
+
+        # Moving away drops the caregiver from results before anything is flushed
+        self.move(self.caregiver, 0.5143, 35.2698)
+        self.client.force_authenticate(self.patient)
+        resp = self.client.get(reverse('caregivers'), {'patient_lat': -1.2921, 'patient_lng': 36.8219, 'k': 5})
+        self.assertEqual(resp.data['count'], 1)
+        self.assertGreater(resp.data['results'][0]['distance'], 100000)
+
+    def test_missing_slot_is_retried_once_then_skipped(self):
+        cache = caches['locations']
+        self.move(self.caregiver, -1.2921, 36.8219)
+        cache.incr(location_buffer.SEQ_KEY)  # a slot taken but never written
+        self.move(self.patient, -1.0, 36.0)
+        self.assertEqual(location_buffer.flush(), 2)
+        self.assertEqual(cache.get(location_buffer.CURSOR_KEY), 1)
+        self.assertEqual(location_buffer.flush(), 1)
+        self.assertEqual(cache.get(location_buffer.CURSOR_KEY), 3)
+        self.assertEqual(location_buffer.pending(), {})
+
+    def test_flush_command(self):
+        self.move(self.caregiver, -1.2921, 36.8219)
+        out = StringIO()
+        call_command('flush_location_buffer', stdout=out)
+        self.assertIn('1 users', out.getvalue())
+        self.caregiver.refresh_from_db()
+        self.assertEqual(self.caregiver.latitude, -1.2921)
@@ -0,0 +1,107 @@
+"""
+Tests for caregiver location history: recording, downsampled tracks and pruning.
+"""
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from accounts import location_buffer, location_history
+from accounts.models import LocationPing
+from .factories import create_admin, create_caregiver, create_patient
+
+T0 = datetime(2026, 3, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+
+class LocationHistoryTests(APITestCase):
+    def setUp(self):
+        self.admin = create_admin()
+        self.caregiver = create_caregiver('care@example.com')
+        self.url = reverse('caregiver-track', args=[self.caregiver.pk])
+
+    def ping_every_minute(self, minutes, start=T0):
+        LocationPing.objects.bulk_create(
+            location_history.build_ping(self.caregiver.pk, -1.29 + i * 1e-4, 36.82, start + timedelta(minutes=i))
+            for i in range(minutes)
+        )
+
+    def test_location_updates_are_recorded(self):
+        self.client.force_authenticate(self.caregiver)
+        self.client.patch(reverse('me-location'), {'latitude': -1.2921, 'longitude': 36.8219}, format='json')
+        ping = LocationPing.objects.get(user=self.caregiver)
+        self.assertEqual((ping.latitude, ping.longitude), (-1.2921, 36.8219))
+        self.assertEqual(ping.day, ping.recorded_at.date())
+
+    def test_only_caregivers_are_tracked(self):
+        patient = create_patient('pat@example.com')
+        self.client.force_authenticate(patient)
+        resp = self.client.patch(reverse('me-location'), {'latitude': -1.2921, 'longitude': 36.8219}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        patient.refresh_from_db()
+        self.assertEqual(patient.latitude, -1.2921)
+        self.assertFalse(LocationPing.objects.exists())
+
+    @override_settings(LOCATION_WRITE_BEHIND=True, LOCATION_BUFFER_FLUSH_SECONDS=0)
+    def test_write_behind_records_every_ping_in_one_batch(self):
+        caches['locations'].clear()
+        self.addCleanup(caches['locations'].clear)
+        self.client.force_authenticate(self.caregiver)
+        for lat in (-1.30, -1.29, -1.28):
+            self.client.patch(reverse('me-location'), {'latitude': lat, 'longitude': 36.82}, format='json')
+        self.assertFalse(LocationPing.objects.exists())
+        location_buffer.flush()
+        self.assertEqual(list(LocationPing.objects.order_by('recorded_at').values_list('latitude', flat=True)),
+                         [-1.30, -1.29, -1.28])
+        location_buffer.flush()
+        self.assertEqual(LocationPing.objects.count(), 3)
+
+        # Other roles' fixes are flushed to the user but not kept as history
+        patient = create_patient('pat@example.com')
+        self.client.force_authenticate(patient)
+        self.client.patch(reverse('me-location'), {'latitude': -1.27, 'longitude': 36.82}, format='json')
+        self.assertEqual(location_buffer.flush(), 1)
+        patient.refresh_from_db()
+        self.assertEqual(patient.latitude, -1.27)
+        self.assertEqual(LocationPing.objects.count(), 3)
+
+    def test_track_is_downsampled(self):
+        self.ping_every_minute(180)
+        self.client.force_authenticate(self.admin)
+        resp = self.client.get(self.url, {'start': T0.isoformat(), 'end': (T0 + timedelta(hours=3)).isoformat(),
+                                          'resolution': 900})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['resolution'], 900)
+        self.assertEqual(resp.data['count'], 12)
+        self.assertEqual([p['samples'] for p in resp.data['points']], [15] * 12)
+        self.assertEqual(resp.data['points'][1]['recorded_at'], T0 + timedelta(minutes=15))
+
+        # A resolution too fine for the range is coarsened to MAX_TRACK_POINTS
+        resp = self.client.get(self.url, {'start': '2026-01-01', 'end': '2026-04-01', 'resolution': 1})
+        self.assertEqual(resp.data['resolution'], location_history.min_resolution(
+            datetime(2026, 1, 1, tzinfo=dt_timezone.utc), datetime(2026, 4, 1, tzinfo=dt_timezone.utc)))
+        self.assertLessEqual(resp.data['count'], location_history.MAX_TRACK_POINTS)
+        self.assertEqual(sum(p['samples'] for p in resp.data['points']), 180)
+
+        # Windows restart at midnight (UTC)
+        late = T0.replace(hour=23) + timedelta(days=1)
+        self.ping_every_minute(120, start=late)
+        points = location_history.track(self.caregiver.pk, late, late + timedelta(hours=2), 5400)
+        self.assertEqual([(p['recorded_at'], p['samples']) for p in points],
+                         [(late, 60), (late + timedelta(hours=1), 60)])
+
+    def test_track_access(self):
+        self.client.force_authenticate(self.caregiver)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(create_patient('pat@example.com'))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(self.url, {'start': 'yesterday'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('caregiver-track', args=[self.admin.pk])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_prune_drops_old_day_buckets(self):
+        self.ping_every_minute(3 * 24 * 60, start=datetime(2026, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(location_history.prune(date(2026, 3, 3)), 2 * 24 * 60)
+        self.assertEqual(set(LocationPing.objects.values_list('day', flat=True)), {date(2026, 3, 3)})
@@ -0,0 +1,81 @@
+"""
+Tests for indexed people search (accounts.search) and the typeahead endpoint.
+"""
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from accounts import search
+from accounts.models import User
+from .factories import create_admin, create_caregiver, create_doctor, create_patient
+
+
+class PeopleSearchTests(APITestCase):
+    def setUp(self):
+        self.doctor = create_doctor('house@example.com', first_name='Gregory', last_name='House')
+        self.other_doctor = create_doctor('wilson@example.com', first_name='James', last_name='Wilson')
+        self.john = create_patient('jdoe@example.com', first_name='John', last_name='Doe', doctor=self.doctor)
+        self.joan = create_patient('joan@example.com', first_name='Joan', last_name='Johnson', doctor=self.other_doctor)
+        self.zoe = create_caregiver('zoe.oneil@example.com', first_name='Zoë', last_name="O'Neil")
+
+    def names(self, query, queryset=None):
+        return [user.first_name for user in search.matching(queryset or User.objects.all(), query)]
+
+    def test_normalized_word_prefix_matching(self):
+        self.assertEqual(self.zoe.search_name, 'zoe o neil zoe oneil example com')
+        self.assertEqual(self.names('ZOE'), ['Zoë'])
+        self.assertEqual(self.names('oneil'), ['Zoë'])
+        self.assertEqual(self.names('jo do'), ['John'])
+        self.assertEqual(self.names('doe jo'), ['John'])
+        # Inside a word is not a match
+        self.assertEqual(self.names('ohn'), [])
+        self.assertEqual(self.names(' !? '), [])
+
+    def test_ranked_by_match_quality(self):
+        # Starts with the query, then a later word starting with it
+        self.assertEqual(self.names('john'), ['John', 'Joan'])
+        self.assertEqual(self.names('jo'), ['Joan', 'John'])
+        self.assertEqual(self.names('house'), ['Gregory'])
+
+    def test_index_follows_writes(self):
+        self.john.last_name = 'Smith'
+        self.john.save(update_fields=['last_name'])
+        self.assertEqual(self.names('smi'), ['John'])
+        self.assertEqual(self.names('doe'), [])
+        self.zoe.delete()
+        self.assertEqual(self.names('zoe'), [])
+
+    def test_sqlite_uses_fts_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite FTS5 index')
+        self.assertTrue(search._has_index('default'))
+        sql = str(search.matching(User.objects.all(), 'jo').query)
+        self.assertIn(search.FTS_TABLE, sql)
+
+    def test_typeahead_scoped_paginated_and_cheap(self):
+        self.client.force_authenticate(self.doctor)
+        url = reverse('people-search')
+        resp = self.client.get(url, {'q': 'j'})
+        # Another doctor's patient is not visible; the other doctor is
+        self.assertEqual([r['email'] for r in resp.data['results']], ['wilson@example.com', 'jdoe@example.com'])
+        self.assertEqual(set(resp.data['results'][0]), {'id', 'email', 'role', 'first_name', 'last_name'})
+        resp = self.client.get(url, {'q': 'jo', 'role': 'patient'})
+        self.assertEqual([r['email'] for r in resp.data['results']], ['jdoe@example.com'])
+
+        self.client.force_authenticate(create_admin())
+        resp = self.client.get(url, {'q': 'jo', 'page_size': 1})
+        self.assertEqual([r['email'] for r in resp.data['results']], ['joan@example.com'])
+        self.assertIsNone(resp.data['previous'])
+        # One query per page: no total count
+        with self.assertNumQueries(1):
+            resp = self.client.get(resp.data['next'])
+        self.assertEqual([r['email'] for r in resp.data['results']], ['jdoe@example.com'])
+        self.assertIsNone(resp.data['next'])
+        self.assertIsNotNone(resp.data['previous'])
+        self.assertEqual(self.client.get(url).data['results'], [])
+
+    def test_list_views_search_through_the_index(self):
+        self.client.force_authenticate(self.doctor)
+        resp = self.client.get(reverse('doctors'), {'search': 'wil'})
+        self.assertEqual([r['email'] for r in resp.data['results']], ['wilson@example.com'])
+        resp = self.client.get(reverse('caregivers'), {'search': 'example zo'})
+        self.assertEqual([r['email'] for r in resp.data['results']], ['zoe.oneil@example.com'])
@@ -0,0 +1,61 @@
+"""
+Tests for the seed_synthetic load-testing data generator.
+"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from accounts.synthetic import KENYA_BOUNDS
+from appointments.models import Appointment
+from health.models import VitalReading
+from medications.models import Medication, MedicationDailyAdherence, MedicationLog
+from medications.rollup import rebuild_daily_adherence
+from .factories import create_patient
+
+
+def seed(**options):
+    volumes = {'doctors': 3, 'patients': 25, 'caregivers': 5, 'vitals_years': 1, 'history_days': 30}
+    call_command('seed_synthetic', prefix='t', seed=7, stdout=StringIO(), **{**volumes, **options})
+
+
+class SeedSyntheticTests(TestCase):
+    def test_generates_linked_population(self):
+        seed()
+        patients = User.objects.filter(username__startswith='t-', role='patient')
+        self.assertEqual(patients.count(), 25)
+        self.assertEqual(User.objects.filter(username__startswith='t-', role='doctor').count(), 3)
+        self.assertTrue(patients.filter(doctor__isnull=False).exists())
+        (lat_lo, lat_hi), (lon_lo, lon_hi) = KENYA_BOUNDS
+        for lat, lon in User.objects.filter(username__startswith='t-').values_list('latitude', 'longitude'):
+            self.assertTrue(lat_lo <= lat <= lat_hi and lon_lo <= lon <= lon_hi)
+        self.assertTrue(MedicationLog.objects.exists())
+
+        # Seeded rollup rows match what the signals/backfill would derive
+        medication = Medication.objects.filter(logs__isnull=False).first()
+        fields = ('date', 'expected_doses', 'taken_doses', 'first_taken_at', 'last_taken_at')
+        seeded = list(MedicationDailyAdherence.objects.filter(medication=medication).order_by('date').values_list(*fields))
+        rebuild_daily_adherence(medication)
+        rebuilt = list(MedicationDailyAdherence.objects.filter(medication=medication).order_by('date').values_list(*fields))
+        self.assertEqual(seeded, rebuilt)
+        medication.refresh_from_db()
+        self.assertEqual(medication.remaining_quantity, max(0, medication.total_quantity - medication.logs.count()))
+        self.assertIsNotNone(medication.risk_updated_at)
+
+        # created_at follows the generated dates rather than the time of the run
+        self.assertEqual(medication.created_at.date(), medication.start_date)
+        vital = VitalReading.objects.filter(patient__username__startswith='t-').order_by('date').first()
+        self.assertEqual(vital.created_at.date(), vital.date)
+        self.assertFalse(Appointment.objects.filter(created_at__gt=timezone.now()).exists())
+
+    def test_existing_prefix_requires_flush(self):
+        seed()
+        other = create_patient('keep@example.com')
+        with self.assertRaises(CommandError):
+            seed()
+        seed(flush=True, patients=10)
+        self.assertEqual(User.objects.filter(username__startswith='t-', role='patient').count(), 10)
+        self.assertTrue(User.objects.filter(pk=other.pk).exists())
@@ -0,0 +1,88 @@
+"""
+Tests for the signal-invalidated dashboard statistics cache (accounts.stats_cache).
+"""
+import json
+from datetime import date, time
+
+from django.core.cache import caches
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from accounts import stats_cache
+from accounts.stats_cache import DASHBOARD_STATS, StatsCache
+from appointments.models import Appointment
+from .factories import create_admin, create_doctor, create_patient
+
+
+class DashboardStatsCacheTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        stats_cache.reset()
+        self.doctor = create_doctor('doc@example.com')
+        self.other_doctor = create_doctor('doc2@example.com')
+        self.patient = create_patient('pat@example.com', doctor=self.doctor)
+
+    def stats(self, user):
+        self.client.force_authenticate(user)
+        return json.loads(self.client.get(reverse('dashboard-stats')).content)
+
+    def book(self, **fields):
+        return Appointment.objects.create(**{'patient': self.patient, 'doctor': self.doctor, 'date': date.today(),
+                                             'time': time(9, 0), 'type': 'Check', 'status': 'scheduled', **fields})
+
+    def test_cached_until_appointments_change(self):
+        self.book()
+        self.assertEqual(self.stats(self.doctor)['todayAppointments'], 1)
+        self.assertEqual(self.stats(self.other_doctor)['todayAppointments'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.stats(self.doctor)['todayAppointments'], 1)
+
+        appointment = self.book(status='in-progress')
+        stats = self.stats(self.doctor)
+        self.assertEqual((stats['todayAppointments'], stats['pendingConsults']), (2, 1))
+        appointment.status = 'completed'
+        appointment.save()
+        self.assertEqual(self.stats(self.doctor)['completedToday'], 1)
+        appointment.delete()
+        self.assertEqual(self.stats(self.doctor)['todayAppointments'], 1)
+        # The other doctor's entry was never invalidated
+        with self.assertNumQueries(0):
+            self.stats(self.other_doctor)
+
+    def test_patient_reassignment_invalidates_both_doctors(self):
+        self.book()
+        admin = create_admin()
+        self.assertEqual(self.stats(self.doctor)['totalPatients'], 1)
+        self.assertEqual(self.stats(self.other_doctor)['totalPatients'], 0)
+        self.assertEqual(self.stats(admin)['totalPatients'], 1)
+
+        self.patient.doctor = self.other_doctor
+        self.patient.save()
+        self.assertEqual(self.stats(self.doctor), {'todayAppointments': 0, 'totalPatients': 0,
+                                                   'pendingConsults': 0, 'completedToday': 0})
+        self.assertEqual(self.stats(self.other_doctor)['todayAppointments'], 1)
+        # Saves that cannot move a patient leave the cache alone
+        self.patient.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.stats(self.other_doctor)
+
+        create_patient('pat2@example.com')
+        self.assertEqual(self.stats(admin)['totalPatients'], 2)
+
+    def test_value_computed_during_a_write_is_not_served(self):
+        cache = StatsCache('test')
+        self.assertEqual(cache.get('k', lambda: 1), 1)
+
+        def racing_write():
+            cache.invalidate('k')
+            return 'stale'
+        cache.invalidate('k')
+        self.assertEqual(cache.get('k', racing_write), 'stale')
+        self.assertEqual(cache.get('k', lambda: 'fresh'), 'fresh')
+        self.assertEqual(cache.get('k', lambda: 'unused'), 'fresh')
+
+    def test_counters_are_reported(self):
+        self.stats(self.doctor)
+        self.stats(self.doctor)
+        self.client.force_authenticate(create_admin())
+        report = self.client.get(reverse('instrumentation')).data['caches'][DASHBOARD_STATS.name]
+        self.assertEqual((report['hits'], report['misses'], report['hit_rate']), (1, 1, 0.5))
@@ -0,0 +1,79 @@
+"""
+Tests for the scoped, cached "today" appointments endpoint.
+"""
+from datetime import time, timedelta
+
+from django.core.cache import caches
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from accounts import stats_cache
+from appointments.models import Appointment
+from requestsapp.models import CareRequest
+from .factories import create_admin, create_caregiver, create_doctor, create_patient
+
+
+class TodayAppointmentsTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        stats_cache.reset()
+        self.today = timezone.localdate()
+        self.doctor = create_doctor('doc@example.com')
+        self.other_doctor = create_doctor('doc2@example.com')
+        self.patient = create_patient('pat@example.com', doctor=self.doctor)
+        self.other_patient = create_patient('pat2@example.com', doctor=self.other_doctor)
+        self.caregiver = create_caregiver('care@example.com')
+        CareRequest.objects.create(family='Fam', service='Home visit', duration='2h', rate=10,
+                                   patient=self.patient, caregiver=self.caregiver, status='accepted')
+
+    def book(self, patient=None, doctor=None, day=None, at=time(9, 0)):
+        return Appointment.objects.create(patient=patient or self.patient, doctor=doctor or self.doctor,
+                                          date=day or self.today, time=at, type='Consult')
+
+    def today_ids(self, user):
+        self.client.force_authenticate(user)
+        return [row['id'] for row in self.client.get(reverse('today-appointments')).data['results']]
+
+    def test_scoped_to_the_caller(self):
+        late = self.book(at=time(15, 0))
+        early = self.book(at=time(8, 0))
+        other = self.book(patient=self.other_patient, doctor=self.other_doctor)
+        self.book(day=self.today + timedelta(days=1))
+
+        self.assertEqual(self.today_ids(self.doctor), [early.id, late.id])
+        self.assertEqual(self.today_ids(self.patient), [early.id, late.id])
+        self.assertEqual(self.today_ids(self.caregiver), [early.id, late.id])
+        self.assertEqual(self.today_ids(self.other_doctor), [other.id])
+        self.assertEqual(self.today_ids(create_admin()), [early.id, other.id, late.id])
+
+    def test_cached_with_joined_users_until_a_write(self):
+        first = self.book()
+        self.book(at=time(10, 0))
+        self.client.force_authenticate(self.doctor)
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse('today-appointments'))
+        self.assertEqual(resp.data['count'], 2)
+        self.assertEqual(resp.data['results'][0]['patient']['email'], self.patient.email)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('today-appointments'))
+
+        # Appointments on other days leave today's lists alone
+        self.book(day=self.today + timedelta(days=3))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('today-appointments'))
+
+        first.status = 'completed'
+        first.save()
+        self.assertEqual(self.client.get(reverse('today-appointments')).data['results'][0]['status'], 'completed')
+        self.assertEqual(len(self.today_ids(self.caregiver)), 2)
+        # Moving an appointment to another day drops it from every list it was in
+        first.date = self.today + timedelta(days=1)
+        first.save()
+        self.assertEqual(len(self.today_ids(self.doctor)), 1)
+        self.assertEqual(len(self.today_ids(self.caregiver)), 1)
+
+    def test_care_request_changes_update_the_caregiver(self):
+        self.book()
+        self.assertEqual(len(self.today_ids(self.caregiver)), 1)
+        CareRequest.objects.filter(caregiver=self.caregiver).get().delete()
+        self.assertEqual(self.today_ids(self.caregiver), [])
@@ -0,0 +1,62 @@
+"""
+Tests for username allocation (accounts.usernames) on registration and Google sign-in.
+"""
+from unittest.mock import patch
+
+import jwt
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from accounts.models import User
+from accounts.usernames import create_with_username, next_free
+from .factories import create_patient
+
+
+def bulk_users(usernames):
+    password = make_password('Pass12345!')
+    User.objects.bulk_create(
+        [User(username=name, email=f'{name}@bulk.test', role='patient', password=password) for name in usernames],
+        batch_size=2000,
+    )
+
+
+class UsernameAllocationTests(APITestCase):
+    def test_next_free_suffix(self):
+        self.assertEqual(next_free('john'), 'john')
+        bulk_users(['john', 'john1', 'john7', 'john2a', 'johnny', 'jo'])
+        self.assertEqual(next_free('john'), 'john8')
+        self.assertEqual(next_free('jo'), 'jo1')
+        self.assertEqual(next_free('j.o+hn'), 'j.o+hn')
+
+    def test_single_query_with_10k_collisions(self):
+        bulk_users(['john', *(f'john{i}' for i in range(1, 10001))])
+        with self.assertNumQueries(1):
+            self.assertEqual(next_free('john'), 'john10001')
+
+        resp = self.client.post(reverse('register'), {
+            'email': 'john@example.com', 'role': 'patient', 'password': 'StrongPass123!',
+            'first_name': 'John', 'last_name': 'Doe',
+        })
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.get(email='john@example.com').username, 'john10001')
+
+        credential = jwt.encode({'email': 'john@gmail.com', 'given_name': 'John'}, 'unverified', algorithm='HS256')
+        resp = self.client.post(reverse('google-auth'), {'credential': credential}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['user']['username'], 'john10002')
+
+    def test_retries_when_the_username_is_taken_meanwhile(self):
+        create_patient('ann@example.com', username='ann')
+        # A stale allocation (another registration took "ann" after it was read)
+        with patch('accounts.usernames.next_free', side_effect=['ann', 'ann1']):
+            user = create_with_username('ann@other.com', lambda username: create_patient('ann@other.com', username=username))
+        self.assertEqual(user.username, 'ann1')
+        with patch('accounts.usernames.next_free', return_value='ann'):
+            user = create_with_username('ann@third.com', lambda username: create_patient('ann@third.com', username=username))
+        self.assertRegex(user.username, r'^ann[0-9]+$')
+
+        # Clashes on other unique fields are not retried
+        with self.assertRaises(IntegrityError):
+            create_with_username('ann@example.com', lambda username: create_patient('ann@example.com', username=username))
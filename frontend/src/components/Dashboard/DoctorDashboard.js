@@ -137,7 +137,7 @@ const DoctorDashboard = () => {
             const res = await fetch(`${API_BASE}/appointments/today/`, { headers });
             if (!res.ok) throw new Error('Failed to fetch today\'s schedule');
             const data = await res.json();
-            setTodaySchedule(Array.isArray(data) ? data : []);
+            setTodaySchedule(Array.isArray(data) ? data : (data.results || []));
         } catch (e) {
             setScheduleError(e.message || 'Failed to load today\'s schedule');
         } finally {
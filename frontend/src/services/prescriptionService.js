@@ -53,12 +53,21 @@ export async function createPrescription({ patient_id, name, dosage, frequency,
 }
 
 export async function fetchPrescriptions(patientId) {
+    // The listing is cursor-paginated: follow `next` until every page is read.
     // If patientId is provided, filter by patient
-    const qs = patientId ? `?patient=${patientId}` : '';
-    const data = await api.get(`/medications/prescriptions/${qs}`);
-    if (Array.isArray(data)) return data;
-    if (data && Array.isArray(data.results)) return data.results;
-    return [];
+    const params = new URLSearchParams({ page_size: '100' });
+    if (patientId) params.set('patient', patientId);
+    let path = `/medications/prescriptions/?${params}`;
+    const rows = [];
+    while (path) {
+        const data = await api.get(path);
+        if (Array.isArray(data)) return rows.concat(data);
+        if (!data || !Array.isArray(data.results)) break;
+        rows.push(...data.results);
+        // `next` is an absolute URL; keep its query (cursor and filters) on our API base
+        path = data.next ? `/medications/prescriptions/${new URL(data.next).search}` : null;
+    }
+    return rows;
 }
 
 export async function logMedicationIntake(medicationId, data) {